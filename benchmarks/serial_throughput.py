@@ -0,0 +1,302 @@
+import itertools
+import json
+import platform
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from tap import Tap
+from wasabi import msg
+
+from labby.hw.core.serial import SerialDevice
+from labby.hw.core.stats import LatencySummary, RollingLatencies
+from labby.hw.tdklambda.emulator import ZUPEmulator
+from labby.hw.tdklambda.power_supply import ZUP
+
+
+REPORT_VERSION = 2
+# how long the emulator has to go without receiving anything for the
+# commands still on their way to it to be counted
+SETTLE_TIME_S = 0.05
+
+
+class ArgumentParser(Tap):
+    output: str = "serial_throughput.json"  # where to write the report to
+    operations: int = 100  # how many operations to time in each case
+    baseline: Optional[str] = None  # report from a previous run to compare to
+    tolerance: float = 0.1  # relative slowdown that counts as a regression
+
+
+@dataclass(frozen=True)
+class BenchmarkCase:
+    benchmark: str
+    baudrate: int = 115200
+    message_size: int = 16
+    clients: int = 1
+    wait_time_after_write_ms: float = 0.0
+    skip_wait_after_response: bool = False
+
+
+@dataclass(frozen=True)
+class BenchmarkResult:
+    case: BenchmarkCase
+    # calls made by the clients, which can be fewer than the commands that
+    # went over the wire, or more if the driver merges identical queries
+    operations: int
+    operations_per_second: float
+    wire_commands: int
+    wire_commands_per_second: float
+    latency: LatencySummary
+
+
+class BenchmarkDevice(SerialDevice):
+    def __init__(
+        self,
+        port: str,
+        baudrate: int,
+        wait_time_after_write_ms: float,
+        skip_wait_after_response: bool,
+    ) -> None:
+        super().__init__(port, baudrate, xonxoff=True, timeout_ms=2000)
+        self.WAIT_TIME_AFTER_WRITE_MS = wait_time_after_write_ms
+        self.SKIP_WAIT_AFTER_RESPONSE = skip_wait_after_response
+        self.bus_address = b":ADR01;"
+
+    def _on_open(self) -> None:
+        self._select_bus_address()
+
+    def query(self, message: bytes) -> str:
+        # clients all send the same query, which would otherwise be merged
+        # into one while they wait for the port
+        return self._wait(
+            self.serial_controller.submit_query(
+                message, address=self.bus_address, coalescible=False
+            )
+        )
+
+
+def _get_operation(
+    case: BenchmarkCase, port: str, client: int
+) -> Tuple[Callable[[], object], Callable[[], None], Callable[[], None]]:
+    if case.benchmark == "zup_getters":
+        zup: ZUP = ZUP(port, case.baudrate)
+        zup.WAIT_TIME_AFTER_WRITE_MS = case.wait_time_after_write_ms
+        zup.SKIP_WAIT_AFTER_RESPONSE = case.skip_wait_after_response
+        # the readings that experiments sample, taken in turns. clients start
+        # on different ones, although the driver may still merge some of them
+        getters: Sequence[Callable[[], object]] = (
+            zup.get_actual_voltage,
+            zup.get_actual_current,
+            zup.get_mode,
+        )
+        turns: Iterator[int] = itertools.count(client)
+        return (
+            lambda: getters[next(turns) % len(getters)](),
+            zup.open,
+            zup.close,
+        )
+
+    device: BenchmarkDevice = BenchmarkDevice(
+        port,
+        case.baudrate,
+        case.wait_time_after_write_ms,
+        case.skip_wait_after_response,
+    )
+    if case.benchmark == "query":
+        return (lambda: device.query(b":MDL?;"), device.open, device.close)
+    # the ZUP takes voltages of any length, so this makes for a write of the
+    # requested size
+    message: bytes = bytes(":VOL" + "0" * max(1, case.message_size - 5) + ";", "ascii")
+    return (lambda: device._write(message), device.open, device.close)
+
+
+def _count_commands(emulator: ZUPEmulator) -> int:
+    # writes return once the message is handed to the port, so the emulator
+    # may still be taking in the last ones
+    num_commands = emulator.num_commands
+    while True:
+        time.sleep(SETTLE_TIME_S)
+        if emulator.num_commands == num_commands:
+            return num_commands
+        num_commands = emulator.num_commands
+
+
+def run_case(case: BenchmarkCase, operations: int) -> BenchmarkResult:
+    samples: List[float] = []
+    samples_lock: threading.Lock = threading.Lock()
+
+    with ZUPEmulator(baudrate=case.baudrate, turnaround_ms=5.0) as emulator:
+        # responses to :MDL?; are as long as the model name, plus CR and LF
+        emulator.units[1].model = "Z" * max(1, case.message_size - 2)
+        clients = [
+            _get_operation(case, emulator.port, client)
+            for client in range(case.clients)
+        ]
+        for (_operation, open_client, _close) in clients:
+            open_client()
+        commands_before = _count_commands(emulator)
+
+        def _run_client(operation: Callable[[], object], count: int) -> None:
+            latencies: List[float] = []
+            for _i in range(count):
+                start_time = time.perf_counter()
+                operation()
+                latencies.append((time.perf_counter() - start_time) * 1000.0)
+            with samples_lock:
+                samples.extend(latencies)
+
+        operations_per_client = max(1, operations // case.clients)
+        threads = [
+            threading.Thread(
+                target=_run_client, args=(operation, operations_per_client)
+            )
+            for (operation, _open, _close) in clients
+        ]
+        start_time = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed_time = time.perf_counter() - start_time
+        wire_commands = _count_commands(emulator) - commands_before
+
+        for (_operation, _open, close_client) in clients:
+            close_client()
+
+    latencies = RollingLatencies(window_size=len(samples))
+    for sample in samples:
+        latencies.add(sample)
+    return BenchmarkResult(
+        case=case,
+        operations=len(samples),
+        operations_per_second=len(samples) / elapsed_time,
+        wire_commands=wire_commands,
+        wire_commands_per_second=wire_commands / elapsed_time,
+        latency=latencies.summarize(),
+    )
+
+
+def get_cases() -> List[BenchmarkCase]:
+    # every benchmark varies one dimension at a time around the defaults of
+    # BenchmarkCase, which keeps the whole suite under a few minutes
+    cases: List[BenchmarkCase] = []
+    for benchmark in ("query", "write", "zup_getters"):
+        base = BenchmarkCase(benchmark=benchmark)
+        variations: List[BenchmarkCase] = [base]
+        variations += [
+            replace(base, baudrate=baudrate) for baudrate in (9600, 19200, 57600)
+        ]
+        if benchmark != "zup_getters":
+            variations += [replace(base, message_size=size) for size in (8, 64, 256)]
+        variations += [replace(base, clients=clients) for clients in (2, 4, 8)]
+        variations += [
+            replace(base, wait_time_after_write_ms=50.0),
+            replace(base, wait_time_after_write_ms=50.0, skip_wait_after_response=True),
+        ]
+        cases += variations
+    return cases
+
+
+def _get_git_revision() -> Optional[str]:
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL
+            )
+            .decode("utf-8")
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _to_json(result: BenchmarkResult) -> Dict[str, Any]:
+    return {
+        **asdict(result.case),
+        "operations": result.operations,
+        "operations_per_second": result.operations_per_second,
+        "wire_commands": result.wire_commands,
+        "wire_commands_per_second": result.wire_commands_per_second,
+        **{f"latency_{key}": value for key, value in asdict(result.latency).items()},
+    }
+
+
+def compare(
+    results: Sequence[Dict[str, Any]],
+    baseline: Sequence[Dict[str, Any]],
+    tolerance: float,
+) -> List[str]:
+    key_names: List[str] = list(asdict(BenchmarkCase(benchmark="")).keys())
+
+    def _key(result: Dict[str, Any]) -> Tuple[object, ...]:
+        return tuple(result[name] for name in key_names)
+
+    baseline_by_key = {_key(result): result for result in baseline}
+    regressions: List[str] = []
+    for result in results:
+        previous = baseline_by_key.get(_key(result))
+        if previous is None:
+            continue
+        name = ", ".join(f"{n}={v}" for n, v in zip(key_names, _key(result)))
+        ops = float(result["operations_per_second"])
+        previous_ops = float(previous["operations_per_second"])
+        if ops < previous_ops * (1.0 - tolerance):
+            regressions.append(f"{name}: {previous_ops:.1f} -> {ops:.1f} ops/s")
+        p99 = float(result["latency_p99_ms"])
+        previous_p99 = float(previous["latency_p99_ms"])
+        if p99 > previous_p99 * (1.0 + tolerance):
+            regressions.append(f"{name}: p99 {previous_p99:.2f} -> {p99:.2f} ms")
+    return regressions
+
+
+def main() -> int:
+    args = ArgumentParser().parse_args()
+
+    results: List[Dict[str, Any]] = []
+    for case in get_cases():
+        result = run_case(case, args.operations)
+        results.append(_to_json(result))
+        msg.text(
+            f"{case.benchmark:<12} {case.baudrate:>6} baud "
+            f"{case.message_size:>4} bytes {case.clients} clients "
+            f"{case.wait_time_after_write_ms:>4.0f} ms pacing"
+            f"{' (skipped)' if case.skip_wait_after_response else '':<10} "
+            f"{result.operations_per_second:8.1f} ops/s  "
+            f"{result.wire_commands_per_second:8.1f} wire/s  "
+            f"p50 {result.latency.p50_ms:7.2f} ms  "
+            f"p99 {result.latency.p99_ms:7.2f} ms"
+        )
+
+    report = {
+        "version": REPORT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _get_git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(args.output, "w") as output_file:
+        json.dump(report, output_file, indent=2)
+    msg.good(f"Wrote report to {args.output}")
+
+    baseline_path = args.baseline
+    if baseline_path is None:
+        return 0
+    with open(baseline_path, "r") as baseline_file:
+        baseline = json.load(baseline_file)
+    regressions = compare(results, baseline["results"], args.tolerance)
+    if not regressions:
+        msg.good(f"No regressions against {baseline_path}")
+        return 0
+    msg.fail(f"{len(regressions)} regressions against {baseline_path}")
+    for regression in regressions:
+        msg.text(regression)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
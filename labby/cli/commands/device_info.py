@@ -52,6 +52,16 @@ class DeviceInfoCommand(Command[DeviceInfoArguments]):
         info.append(("Target Current", f"{power_supply.target_current:.2f}A"))
         info.append(("Actual Current", f"{power_supply.actual_current:.2f}A"))
 
+        drift_count = power_supply.setpoint_drift_count
+        info.append(
+            (
+                "Setpoint Drift",
+                render.text(f"{drift_count} detected", color="yellow")
+                if drift_count
+                else "None",
+            )
+        )
+
         return info
 
     def _render_device_info(self, device: DeviceInfoResponse) -> List[Tuple[str, str]]:
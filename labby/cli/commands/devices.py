@@ -1,13 +1,19 @@
+import time
+
 from wasabi import color, msg
 
 from labby.cli.core import BaseArgumentParser, Command
 
 
-class DevicesCommand(Command[BaseArgumentParser]):
+class DevicesArgumentParser(BaseArgumentParser):
+    refresh: bool = False  # check every device now, instead of the last results
+
+
+class DevicesCommand(Command[DevicesArgumentParser]):
     TRIGGER: str = "devices"
 
-    def main(self, args: BaseArgumentParser) -> int:
-        list_devices_response = self.get_client().list_devices()
+    def main(self, args: DevicesArgumentParser) -> int:
+        list_devices_response = self.get_client().list_devices(refresh=args.refresh)
         msg.divider("Registered Devices")
         for device in list_devices_response.devices:
             if device.is_available:
@@ -17,4 +23,9 @@ class DevicesCommand(Command[BaseArgumentParser]):
                 msg.text(
                     f"  {color(device.error_type, bold=True)}: {device.error_message}"
                 )
+                if device.last_seen_at is not None:
+                    last_seen = time.strftime(
+                        "%Y-%m-%d %H:%M:%S", time.localtime(device.last_seen_at)
+                    )
+                    msg.text(f"  Last seen at {last_seen}")
         return 0
@@ -0,0 +1,60 @@
+from typing import List, Tuple
+
+from wasabi import msg
+
+from labby.cli.core import BaseArgumentParser, Command
+from labby.hw.core.stats import ALL_COMMANDS, LatencySummary, SerialCommandStats
+
+
+def _format_latency(latency: LatencySummary) -> str:
+    return f"{latency.p50_ms:.1f} / {latency.p99_ms:.1f}"
+
+
+class SerialStatsCommand(Command[BaseArgumentParser]):
+    TRIGGER: str = "serial-stats"
+
+    def _render_row(self, command: SerialCommandStats) -> Tuple[str, ...]:
+        return (
+            "(all)" if command.command == ALL_COMMANDS else command.command,
+            str(command.queue_wait.count),
+            _format_latency(command.queue_wait),
+            _format_latency(command.write),
+            _format_latency(command.read),
+            str(command.missed_deadlines),
+            str(command.retries),
+        )
+
+    def main(self, args: BaseArgumentParser) -> int:
+        response = self.get_client().serial_stats()
+        if len(response.commands) == 0:
+            print("No serial I/O has been recorded yet.")
+            return 0
+
+        ports: List[str] = []
+        for command in response.commands:
+            if command.port not in ports:
+                ports.append(command.port)
+
+        for port in ports:
+            msg.divider(port)
+            msg.table(
+                [
+                    self._render_row(command)
+                    for command in response.commands
+                    if command.port == port
+                ],
+                header=(
+                    "Command",
+                    "Jobs",
+                    "Queue (ms)",
+                    "Write (ms)",
+                    "Read (ms)",
+                    "Missed",
+                    "Retries",
+                ),
+                aligns=("l", "r", "r", "r", "r", "r", "r"),
+            )
+        msg.text("Latencies are p50 / p99 over the most recent jobs.")
+        msg.text("Missed counts jobs that finished after their deadline.")
+        msg.text("Retries counts queries that were repeated after an I/O error.")
+        return 0
@@ -8,7 +8,6 @@ from tap import Tap
 from labby.client import Client
 from labby.config import Config
 from labby.server import DEFAULT_ADDRESS
-from labby.utils import auto_discover_drivers
 from labby.utils.typing import get_args
 
 
@@ -43,7 +42,6 @@ class Command(Generic[TArgumentParser], ABC):
             args_klass = get_args(command_klass.__orig_bases__[0])[0]
             args = args_klass(prog=f"labby {trigger}").parse_args(argv)
 
-            auto_discover_drivers()
             with open(args.config, "r") as config_file:
                 config = Config(config_file.read())
 
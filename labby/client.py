@@ -12,6 +12,7 @@ from labby.server.requests.halt import HaltRequest
 from labby.server.requests.hello import HelloWorldRequest
 from labby.server.requests.list_devices import ListDevicesRequest, ListDevicesResponse
 from labby.server.requests.run_sequence import RunSequenceRequest
+from labby.server.requests.serial_stats import SerialStatsRequest, SerialStatsResponse
 
 
 DEFAULT_CLIENT_TIMEOUT = 1000
@@ -49,8 +50,8 @@ class Client:
     def hello(self) -> str:
         return self._query(HelloWorldRequest()).content
 
-    def list_devices(self) -> ListDevicesResponse:
-        return self._query(ListDevicesRequest())
+    def list_devices(self, refresh: bool = False) -> ListDevicesResponse:
+        return self._query(ListDevicesRequest(refresh=refresh))
 
     def device_info(self, device_name: str) -> DeviceInfoResponse:
         return self._query(DeviceInfoRequest(device_name=device_name))
@@ -61,5 +62,8 @@ class Client:
     def experiment_status(self) -> ExperimentStatusResponse:
         return self._query(ExperimentStatusRequest())
 
+    def serial_stats(self) -> SerialStatsResponse:
+        return self._query(SerialStatsRequest())
+
     def close(self) -> None:
         self.req.close()
@@ -1,7 +1,7 @@
-from typing import Sequence
+from typing import Any as AnyType, Dict, List, Sequence
 
 import strictyaml
-from strictyaml import Any, Enum, Map, MapPattern, Seq, Str
+from strictyaml import Any, Enum, Int, Map, MapPattern, Optional, Seq, Str
 
 from labby.hw.core import Device
 
@@ -14,6 +14,9 @@ SCHEMA = Map(
                     "name": Str(),
                     "type": Enum("power_supply"),
                     "driver": Str(),
+                    # expands into one device per channel, which keeps configs
+                    # for banks of identical devices short
+                    Optional("channels"): Int(),
                     "args": MapPattern(Str(), Any()),
                 }
             )
@@ -29,8 +32,21 @@ class Config:
     def __init__(self, yaml_contents: str) -> None:
         self.config = strictyaml.load(yaml_contents, SCHEMA)
         self.devices = [
-            Device.create(device["name"], device["driver"].data, device["args"].data)
-            for device in self.config["devices"]
+            device
+            for entry in self.config["devices"]
+            for device in self._create_devices(entry.data)
+        ]
+
+    def _create_devices(self, entry: Dict[str, AnyType]) -> List[Device]:
+        if "channels" not in entry:
+            return [Device.create(entry["name"], entry["driver"], entry["args"])]
+        return [
+            Device.create(
+                f"{entry['name']}-{channel}",
+                entry["driver"],
+                {**entry["args"], "channel": channel},
+            )
+            for channel in range(entry["channels"])
         ]
 
     def get_devices(self) -> Sequence[Device]:
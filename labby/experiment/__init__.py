@@ -7,6 +7,7 @@ from pyre_extensions import none_throws
 
 from labby.config import Config
 from labby.hw.core.power_supply import PowerSupply
+from labby.hw.core.sessions import DeviceSession
 from labby.utils.typing import get_args
 
 
@@ -39,6 +40,7 @@ class Experiment(Generic[TInputParameters, TOutputData], ABC):
     name: str
     params: TInputParameters
     config: Optional[Config] = None
+    session: Optional[DeviceSession] = None
 
     def __init__(self, name: str, params: TInputParameters) -> None:
         self.name = name
@@ -75,13 +77,19 @@ class Experiment(Generic[TInputParameters, TOutputData], ABC):
     def get_power_supply(self, name: str) -> PowerSupply:
         config = none_throws(self.config)
         try:
-            return next(
+            power_supply = next(
                 d
                 for d in config.get_devices()
                 if isinstance(d, PowerSupply) and d.name == name
             )
         except StopIteration:
             raise Exception(f"Power Supply not found: {name}")
+        # the runner's session opens the device and keeps it open for as long
+        # as the experiment runs, so experiments never open or close devices
+        session = none_throws(
+            self.session, "Devices can only be used while the experiment runs"
+        )
+        return session.acquire(power_supply)
 
     @abstractmethod
     def start(self) -> None:
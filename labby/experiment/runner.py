@@ -4,7 +4,7 @@ import time
 from dataclasses import dataclass
 from enum import Enum
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 import pandas
 from mashumaro import DataClassMessagePackMixin
@@ -13,6 +13,8 @@ from pynng import Message, NNGException, Pub0
 from labby.config import Config
 from labby.experiment import Experiment, BaseInputParameters, BaseOutputData
 from labby.experiment.sequence import ExperimentSequence
+from labby.hw.core.deadline import io_deadline
+from labby.hw.core.sessions import DeviceSessionPool
 
 
 _ADDRESS = "inproc://experiment_runner"
@@ -47,11 +49,22 @@ class ExperimentRunner(threading.Thread):
     config: Config
     sequence: ExperimentSequence
     sequence_status: ExperimentSequenceStatus
+    sessions: DeviceSessionPool
 
-    def __init__(self, config: Config, sequence: ExperimentSequence) -> None:
+    _owns_sessions: bool
+
+    def __init__(
+        self,
+        config: Config,
+        sequence: ExperimentSequence,
+        sessions: Optional[DeviceSessionPool] = None,
+    ) -> None:
         super().__init__()
         self.config = config
         self.sequence = sequence
+        # the server shares its pool, so devices it already opened stay open
+        self._owns_sessions = sessions is None
+        self.sessions = DeviceSessionPool() if sessions is None else sessions
         self.subscription_address = _ADDRESS
         self.pub = Pub0(listen=self.subscription_address)
         self.sequence_status = ExperimentSequenceStatus(
@@ -107,7 +120,12 @@ class ExperimentRunner(threading.Thread):
 
             while now - start_time <= experiment.DURATION_IN_SECONDS:
                 self._publish_status(experiment, now - start_time)
-                output_data = experiment.measure()
+                # the sample has to be taken before the next one is due
+                next_sample_time = (
+                    now + period_in_sec - (now - start_time) % period_in_sec
+                )
+                with io_deadline(next_sample_time):
+                    output_data = experiment.measure()
                 raw_data = {
                     key: getattr(output_data, key)
                     for key in output_data.get_column_names()
@@ -128,7 +146,12 @@ class ExperimentRunner(threading.Thread):
             # TODO find a better place for this assignment
             experiment.config = self.config
 
-            dataframe = self._run_experiment(experiment)
+            with self.sessions.session() as session:
+                experiment.session = session
+                try:
+                    dataframe = self._run_experiment(experiment)
+                finally:
+                    experiment.session = None
 
             output_dir = self._get_output_directory()
             os.makedirs(output_dir, exist_ok=True)
@@ -138,4 +161,6 @@ class ExperimentRunner(threading.Thread):
             self._publish_status(
                 experiment, experiment.DURATION_IN_SECONDS, ExperimentState.FINISHED
             )
+        if self._owns_sessions:
+            self.sessions.close()
         self.pub.close()
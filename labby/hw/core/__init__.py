@@ -1,11 +1,29 @@
 import inspect
 from abc import ABC, abstractmethod
 from enum import Enum
+from importlib import import_module
 from types import TracebackType
-from typing import Any, Dict, Optional, Type
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Generator,
+    Optional,
+    Sequence,
+    Type,
+    cast,
+)
+
+from labby.hw.core import streaming
+from labby.hw.core.streaming import SampleBatch
+from labby.utils.typing import get_args
 
 
 ALL_DRIVERS: Dict[str, Type["Device"]] = {}
+_NONE_TYPE: Type[None] = type(None)
+# the types that each driver's constructor arguments are converted to
+_DRIVER_ARG_TYPES: Dict[str, Dict[str, Callable[[object], object]]] = {}
 
 
 class DeviceType(Enum):
@@ -18,6 +36,21 @@ class DeviceType(Enum):
         raise NotImplementedError
 
 
+def _get_arg_type(annotation: object) -> Callable[[object], object]:
+    # Optional[X] can not be called, but X can
+    args = [arg for arg in get_args(annotation) if arg is not _NONE_TYPE]
+    return cast(Callable[[object], object], args[0] if len(args) == 1 else annotation)
+
+
+def _is_package_of(package: Optional[str], module_name: str) -> bool:
+    # whether the module is the package or lives in it, comparing whole
+    # components so that labby.hw.tdk is not taken for labby.hw.tdklambda
+    if package is None:
+        return False
+    components = package.split(".")
+    return module_name.split(".")[: len(components)] == components
+
+
 class Device(ABC):
     name: str = "unnamed device"
     device_type: DeviceType
@@ -50,14 +83,61 @@ class Device(ABC):
     def test_connection(self) -> None:
         raise NotImplementedError
 
+    @abstractmethod
+    def read_channels(self, channels: Sequence[str]) -> Sequence[float]:
+        raise NotImplementedError
+
+    def stream(
+        self, channels: Sequence[str], rate: float, batch_size: Optional[int] = None
+    ) -> Generator[SampleBatch, None, None]:
+        # drivers that can pipeline or buffer readings should override this
+        return streaming.poll(
+            lambda: self.read_channels(channels), channels, rate, batch_size
+        )
+
+    def stream_async(
+        self, channels: Sequence[str], rate: float, batch_size: Optional[int] = None
+    ) -> AsyncIterator[SampleBatch]:
+        return streaming.poll_async(
+            lambda: self.read_channels(channels), channels, rate, batch_size
+        )
+
+    @classmethod
+    def get_driver(cls, driver: str) -> Type["Device"]:
+        klass = ALL_DRIVERS.get(driver)
+        if klass is not None:
+            return klass
+        # drivers are named after the module they live in, which is only
+        # imported once a config actually refers to one of them
+        module_name = driver.rpartition(".")[0]
+        if module_name:
+            try:
+                import_module(module_name)
+            except ModuleNotFoundError as ex:
+                if not _is_package_of(ex.name, module_name):
+                    raise
+        klass = ALL_DRIVERS.get(driver)
+        if klass is None:
+            raise KeyError(f"Unknown driver: {driver}")
+        return klass
+
+    @classmethod
+    def _get_arg_types(cls, driver: str) -> Dict[str, Callable[[object], object]]:
+        arg_types = _DRIVER_ARG_TYPES.get(driver)
+        if arg_types is None:
+            signature = inspect.signature(cls.get_driver(driver))
+            arg_types = {
+                key: _get_arg_type(parameter.annotation)
+                for key, parameter in signature.parameters.items()
+            }
+            _DRIVER_ARG_TYPES[driver] = arg_types
+        return arg_types
+
     @classmethod
     def create(cls, name: str, driver: str, args: Dict[str, Any]) -> "Device":
-        klass = ALL_DRIVERS[driver]
-        signature = inspect.signature(klass)
-        typed_args = {
-            key: signature.parameters[key].annotation(value)
-            for key, value in args.items()
-        }
+        klass = cls.get_driver(driver)
+        arg_types = cls._get_arg_types(driver)
+        typed_args = {key: arg_types[key](value) for key, value in args.items()}
         # pyre-ignore[45]: Cannot instantiate abstract class Device
         device = klass(**typed_args)
         device.name = name
@@ -0,0 +1,304 @@
+import asyncio
+import fcntl
+import os
+from abc import ABC
+from collections import deque
+from types import TracebackType
+from typing import Deque, Dict, List, Optional, Sequence, Type
+
+from pyre_extensions import none_throws
+
+from serial import PARITY_NONE, Serial
+
+from labby.hw.core.exceptions import HardwareIOError
+from labby.hw.core.framing import DEFAULT_TERMINATOR, LineReader
+
+
+READ_CHUNK_SIZE = 4096
+
+
+class AsyncSerialDevice(ABC):
+    WAIT_TIME_AFTER_WRITE_MS: float = 0.0
+    SKIP_WAIT_AFTER_RESPONSE: bool = False
+    RESPONSE_TERMINATOR: bytes = DEFAULT_TERMINATOR
+
+    _serial_controller: Optional["AsyncSerialController"]
+
+    def __init__(
+        self,
+        port: str,
+        baudrate: int,
+        bytesize: int = 8,
+        parity: str = PARITY_NONE,
+        stopbits: int = 1,
+        xonxoff: bool = False,
+        timeout_ms: Optional[float] = None,
+    ) -> None:
+        self.port = port
+        self.baudrate = baudrate
+        self.bytesize = bytesize
+        self.parity = parity
+        self.stopbits = stopbits
+        self.xonxoff = xonxoff
+        self.timeout_ms = timeout_ms
+
+        self._serial_controller = None
+
+    @property
+    def serial_controller(self) -> "AsyncSerialController":
+        return none_throws(
+            self._serial_controller,
+            "Attempted to access AsyncSerialDevice without opening it first",
+        )
+
+    async def _write(self, msg: bytes) -> None:
+        await self.serial_controller.write(msg)
+
+    async def _query(self, msg: bytes) -> str:
+        return await self.serial_controller.query(msg)
+
+    async def _query_many(self, msgs: Sequence[bytes]) -> List[str]:
+        return await self.serial_controller.query_many(msgs)
+
+    async def open(self) -> None:
+        self._serial_controller = AsyncSerialController.get_or_create(
+            port=self.port,
+            baudrate=self.baudrate,
+            bytesize=self.bytesize,
+            parity=self.parity,
+            stopbits=self.stopbits,
+            xonxoff=self.xonxoff,
+            timeout_ms=self.timeout_ms,
+            wait_time_after_write_ms=self.WAIT_TIME_AFTER_WRITE_MS,
+            skip_wait_after_response=self.SKIP_WAIT_AFTER_RESPONSE,
+            response_terminator=self.RESPONSE_TERMINATOR,
+        )
+        await self._on_open()
+
+    async def close(self) -> None:
+        self.serial_controller.close()
+        self._serial_controller = None
+
+    async def __aenter__(self) -> "AsyncSerialDevice":
+        await self.open()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> bool:
+        await self.close()
+        return False
+
+    async def _on_open(self) -> None:
+        pass
+
+
+ASYNC_SERIAL_CONTROLLERS: Dict[str, "AsyncSerialController"] = {}
+
+
+class AsyncSerialController:
+    port: str
+    serial: Serial
+    loop: asyncio.AbstractEventLoop
+    num_clients: int
+    timeout_ms: Optional[float]
+    wait_time_after_write_ms: float
+    skip_wait_after_response: bool
+    next_write_time: float
+
+    _lock: asyncio.Lock
+    _line_reader: LineReader
+    _lines: Deque[bytes]
+    _lines_available: asyncio.Event
+    _read_error: Optional[str]
+
+    def __init__(
+        self,
+        port: str,
+        baudrate: int,
+        bytesize: int,
+        parity: str,
+        stopbits: int,
+        xonxoff: bool,
+        timeout_ms: Optional[float],
+        wait_time_after_write_ms: float,
+        skip_wait_after_response: bool = False,
+        response_terminator: bytes = DEFAULT_TERMINATOR,
+    ) -> None:
+        self.port = port
+        self.loop = asyncio.get_running_loop()
+
+        self.serial = Serial()
+        self.serial.port = port
+        self.serial.baudrate = baudrate
+        self.serial.bytesize = bytesize
+        self.serial.parity = parity
+        self.serial.stopbits = stopbits
+        self.serial.xonxoff = xonxoff
+        # all I/O goes through the event loop, so the port itself never blocks
+        self.serial.timeout = 0
+
+        self.timeout_ms = timeout_ms
+        self.wait_time_after_write_ms = wait_time_after_write_ms
+        self.skip_wait_after_response = skip_wait_after_response
+        self.next_write_time = 0.0
+        self.num_clients = 0
+
+        self._lock = asyncio.Lock()
+        self._line_reader = LineReader(response_terminator)
+        self._lines = deque()
+        self._lines_available = asyncio.Event()
+        self._read_error = None
+
+    @classmethod
+    def get_or_create(
+        cls,
+        port: str,
+        baudrate: int,
+        bytesize: int,
+        parity: str,
+        stopbits: int,
+        xonxoff: bool,
+        timeout_ms: Optional[float],
+        wait_time_after_write_ms: float,
+        skip_wait_after_response: bool = False,
+        response_terminator: bytes = DEFAULT_TERMINATOR,
+    ) -> "AsyncSerialController":
+        serial_controller = ASYNC_SERIAL_CONTROLLERS.get(port)
+        if serial_controller is None:
+            serial_controller = AsyncSerialController(
+                port=port,
+                baudrate=baudrate,
+                bytesize=bytesize,
+                parity=parity,
+                stopbits=stopbits,
+                xonxoff=xonxoff,
+                timeout_ms=timeout_ms,
+                wait_time_after_write_ms=wait_time_after_write_ms,
+                skip_wait_after_response=skip_wait_after_response,
+                response_terminator=response_terminator,
+            )
+            ASYNC_SERIAL_CONTROLLERS[port] = serial_controller
+        elif serial_controller.loop is not asyncio.get_running_loop():
+            raise HardwareIOError(f"{port} is in use by another event loop")
+        serial_controller.num_clients += 1
+        return serial_controller
+
+    def _ensure_open(self) -> None:
+        if self.serial.is_open:
+            return
+        self.serial.open()
+        try:
+            fcntl.flock(self.serial, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except Exception:
+            self.serial.close()
+            raise
+        self._read_error = None
+        self.loop.add_reader(self.serial.fileno(), self._on_readable)
+
+    def _on_readable(self) -> None:
+        fd = self.serial.fileno()
+        try:
+            data = os.read(fd, READ_CHUNK_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as ex:
+            # the port went away. close it so the next request reopens it
+            self._stop_reading(str(ex))
+            return
+        if not data:
+            # hangups are reported as end of file rather than as an error
+            self._stop_reading("the port hung up")
+            return
+        self._line_reader.feed(data)
+        line = self._line_reader.next_line()
+        while line is not None:
+            self._lines.append(line)
+            line = self._line_reader.next_line()
+        if self._lines:
+            self._lines_available.set()
+
+    def _stop_reading(self, reason: str) -> None:
+        if self.serial.is_open:
+            self.loop.remove_reader(self.serial.fileno())
+        self.serial.close()
+        # wake up pending readers, they would otherwise wait for their timeout
+        self._read_error = reason
+        self._lines_available.set()
+
+    async def _wait_until_writable(self, fd: int) -> None:
+        writable: "asyncio.Future[None]" = self.loop.create_future()
+        self.loop.add_writer(fd, writable.set_result, None)
+        try:
+            await writable
+        finally:
+            self.loop.remove_writer(fd)
+
+    async def _write(self, message: bytes) -> None:
+        delay = self.next_write_time - self.loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        fd: int = self.serial.fileno()
+        offset = 0
+        while offset < len(message):
+            try:
+                offset += os.write(fd, message[offset:])
+            except BlockingIOError:
+                await self._wait_until_writable(fd)
+        self.next_write_time = self.loop.time() + self.wait_time_after_write_ms / 1000.0
+
+    async def _readline(self) -> str:
+        timeout_ms = self.timeout_ms
+        timeout = timeout_ms / 1000.0 if timeout_ms else None
+        try:
+            await asyncio.wait_for(self._lines_available.wait(), timeout)
+        except asyncio.TimeoutError:
+            raise HardwareIOError(f"Timed out waiting for a response on {self.port}")
+        if self._read_error is not None:
+            raise HardwareIOError(
+                f"Could not read from {self.port}: {self._read_error}"
+            )
+        line = self._lines.popleft()
+        if not self._lines:
+            self._lines_available.clear()
+        if self.skip_wait_after_response:
+            self.next_write_time = self.loop.time()
+        return line.decode("utf-8")
+
+    def _discard_pending_input(self) -> None:
+        # late responses to a previous, timed out query must not be mistaken
+        # for the response to the next one
+        self._line_reader.clear()
+        self._lines.clear()
+        self._lines_available.clear()
+        self._read_error = None
+
+    async def write(self, message: bytes) -> None:
+        async with self._lock:
+            self._ensure_open()
+            await self._write(message)
+
+    async def query(self, message: bytes) -> str:
+        async with self._lock:
+            self._ensure_open()
+            self._discard_pending_input()
+            await self._write(message)
+            return await self._readline()
+
+    async def query_many(self, messages: Sequence[bytes]) -> List[str]:
+        async with self._lock:
+            self._ensure_open()
+            self._discard_pending_input()
+            for message in messages:
+                await self._write(message)
+            return [await self._readline() for _message in messages]
+
+    def close(self) -> None:
+        self.num_clients -= 1
+        if self.num_clients > 0:
+            return
+        del ASYNC_SERIAL_CONTROLLERS[self.port]
+        self._stop_reading("the port was closed")
@@ -0,0 +1,64 @@
+import threading
+import time
+from typing import Dict, Mapping, Optional, Sequence, Tuple
+
+
+class ResponseCache:
+    ttl_ms: Mapping[bytes, Optional[float]]
+    invalidations: Mapping[bytes, Sequence[bytes]]
+    generation: int
+
+    _entries: Dict[bytes, Tuple[str, float]]
+    _lock: threading.Lock
+
+    def __init__(
+        self,
+        ttl_ms: Mapping[bytes, Optional[float]],
+        invalidations: Mapping[bytes, Sequence[bytes]],
+    ) -> None:
+        # queries missing from ttl_ms are never cached, and a ttl of None
+        # means that the response never expires
+        self.ttl_ms = ttl_ms
+        # maps prefixes of writes to the queries whose responses they change
+        self.invalidations = invalidations
+        # bumped on every invalidation, so that responses to queries that
+        # were in flight while a write happened are not cached
+        self.generation = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def is_cacheable(self, query: bytes) -> bool:
+        return query in self.ttl_ms
+
+    def get(self, query: bytes) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(query)
+            if entry is None:
+                return None
+            (response, expires_at) = entry
+            if time.time() >= expires_at:
+                del self._entries[query]
+                return None
+            return response
+
+    def put(self, query: bytes, response: str, generation: int) -> None:
+        if query not in self.ttl_ms:
+            return
+        ttl_ms = self.ttl_ms[query]
+        expires_at = float("inf") if ttl_ms is None else time.time() + ttl_ms / 1000.0
+        with self._lock:
+            if generation == self.generation:
+                self._entries[query] = (response, expires_at)
+
+    def invalidate(self, write: bytes) -> None:
+        with self._lock:
+            for prefix, queries in self.invalidations.items():
+                if write.startswith(prefix):
+                    self.generation += 1
+                    for query in queries:
+                        self._entries.pop(query, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
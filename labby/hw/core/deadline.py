@@ -0,0 +1,22 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+
+# unset means that there is no deadline
+_IO_DEADLINE: ContextVar[Optional[float]] = ContextVar("io_deadline")
+
+
+@contextmanager
+def io_deadline(deadline: Optional[float]) -> Iterator[None]:
+    # hardware I/O submitted from within this block should be done by the
+    # given time.time(), and is scheduled ahead of I/O without a deadline
+    token = _IO_DEADLINE.set(deadline)
+    try:
+        yield
+    finally:
+        _IO_DEADLINE.reset(token)
+
+
+def get_io_deadline() -> Optional[float]:
+    return _IO_DEADLINE.get(None)
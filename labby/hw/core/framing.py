@@ -0,0 +1,37 @@
+from typing import Optional
+
+
+DEFAULT_TERMINATOR = b"\r\n"
+
+
+class LineReader:
+    terminator: bytes
+
+    _buffer: bytearray
+    _search_start: int
+
+    def __init__(self, terminator: bytes = DEFAULT_TERMINATOR) -> None:
+        self.terminator = terminator
+        self._buffer = bytearray()
+        # where to resume looking for the terminator, so that bytes trickling
+        # in do not make us scan the start of a long response over and over
+        self._search_start = 0
+
+    def feed(self, data: bytes) -> None:
+        self._buffer += data
+
+    def next_line(self) -> Optional[bytes]:
+        end = self._buffer.find(self.terminator, self._search_start)
+        if end < 0:
+            # the terminator may have been split across reads
+            self._search_start = max(0, len(self._buffer) - len(self.terminator) + 1)
+            return None
+        line = bytes(self._buffer[:end])
+        # whatever comes after the terminator belongs to the next response
+        del self._buffer[: end + len(self.terminator)]
+        self._search_start = 0
+        return line
+
+    def clear(self) -> None:
+        self._buffer.clear()
+        self._search_start = 0
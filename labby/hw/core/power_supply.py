@@ -1,7 +1,17 @@
+import logging
+import math
+import threading
+import time
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
 from enum import Enum
+from typing import Callable, Generic, List, Optional, Sequence, Tuple, TypeVar
 
 from labby.hw.core import Device, DeviceType
+from labby.hw.core.deadline import io_deadline
+
+
+logger: logging.Logger = logging.getLogger(__name__)
 
 
 class PowerSupplyMode(Enum):
@@ -9,6 +19,180 @@ class PowerSupplyMode(Enum):
     CONSTANT_CURRENT = 1
 
 
+@dataclass(frozen=True)
+class PowerSupplySnapshot:
+    is_output_on: bool
+    mode: PowerSupplyMode
+    target_voltage: float
+    target_current: float
+    actual_voltage: float
+    actual_current: float
+
+
+TSetpoint = TypeVar("TSetpoint", bool, float)
+
+
+class Setpoint(Generic[TSetpoint]):
+    name: str
+    reconcile_interval_ms: float
+    drift_count: int
+    generation: int
+
+    _value: Optional[TSetpoint]
+    _updated_at: float
+    _lock: threading.Lock
+
+    def __init__(self, reconcile_interval_ms: float, name: str = "setpoint") -> None:
+        self.name = name
+        # how long the shadowed value is trusted before it is read back from
+        # the device again, so that changes made on the front panel show up
+        self.reconcile_interval_ms = reconcile_interval_ms
+        self.drift_count = 0
+        # bumped on every set, so that a read back that raced with a set does
+        # not count as drift
+        self.generation = 0
+        self._value = None
+        self._updated_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[TSetpoint]:
+        with self._lock:
+            age_ms = (time.time() - self._updated_at) * 1000.0
+            if self._value is None or age_ms >= self.reconcile_interval_ms:
+                return None
+            return self._value
+
+    def set(self, value: TSetpoint) -> None:
+        with self._lock:
+            self._value = value
+            self._updated_at = time.time()
+            self.generation += 1
+
+    def reconcile(self, actual: TSetpoint, generation: int) -> TSetpoint:
+        with self._lock:
+            if generation != self.generation:
+                return actual
+            expected = self._value
+            if expected is not None and not _is_same_setpoint(expected, actual):
+                self.drift_count += 1
+                logger.warning(
+                    f"{self.name} was set to {expected} but reads back as "
+                    + f"{actual}, it was likely changed on the front panel"
+                )
+            self._value = actual
+            self._updated_at = time.time()
+            return actual
+
+
+def _is_same_setpoint(expected: TSetpoint, actual: TSetpoint) -> bool:
+    if isinstance(expected, bool):
+        return expected == actual
+    return math.isclose(expected, actual, abs_tol=1e-6)
+
+
+class SetpointShadow:
+    is_output_on: Setpoint[bool]
+    target_voltage: Setpoint[float]
+    target_current: Setpoint[float]
+
+    def __init__(self, reconcile_interval_ms: float, device: str) -> None:
+        self.is_output_on = Setpoint(reconcile_interval_ms, f"Output of {device}")
+        self.target_voltage = Setpoint(
+            reconcile_interval_ms, f"Target voltage of {device}"
+        )
+        self.target_current = Setpoint(
+            reconcile_interval_ms, f"Target current of {device}"
+        )
+
+    def get_drift_count(self) -> int:
+        return (
+            self.is_output_on.drift_count
+            + self.target_voltage.drift_count
+            + self.target_current.drift_count
+        )
+
+
+class PowerSupplyQuantity(Enum):
+    VOLTAGE = "VOLTAGE"
+    CURRENT = "CURRENT"
+
+
+class SetpointSchedule(threading.Thread):
+    steps: Sequence[Tuple[float, float]]
+    steps_done: int
+
+    _set_value: Callable[[float], None]
+    _cancelled: threading.Event
+    _error: Optional[BaseException]
+
+    def __init__(
+        self, set_value: Callable[[float], None], steps: Sequence[Tuple[float, float]]
+    ) -> None:
+        super().__init__()
+        self.daemon = True
+        # pairs of seconds since the start and the value to set then
+        self.steps = steps
+        self.steps_done = 0
+        self._set_value = set_value
+        self._cancelled = threading.Event()
+        self._error = None
+
+    def run(self) -> None:
+        # steps are scheduled on the monotonic clock, so that adjusting the
+        # wall clock during a ramp does not make them fire early or late
+        start_time = time.monotonic()
+        try:
+            for (offset, value) in self.steps:
+                # steps are due at fixed times from the start, so that the
+                # time it takes to set one does not push back the next ones
+                due_time = start_time + offset
+                delay = due_time - time.monotonic()
+                if delay > 0 and self._cancelled.wait(delay):
+                    return
+                if self._cancelled.is_set():
+                    return
+                # goes ahead of I/O that is due later, such as measurements.
+                # I/O deadlines are given in wall clock time
+                deadline = time.time() + (due_time - time.monotonic())
+                with io_deadline(deadline):
+                    self._set_value(value)
+                self.steps_done += 1
+        except BaseException as ex:
+            self._error = ex
+
+    def get_progress(self) -> float:
+        if not self.steps:
+            return 1.0
+        return self.steps_done / len(self.steps)
+
+    def is_done(self) -> bool:
+        return not self.is_alive()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        self.join(timeout)
+        error = self._error
+        if error is not None:
+            raise error
+        return not self.is_alive()
+
+
+def _get_ramp_steps(
+    start: float, target: float, rate: float, step: float
+) -> List[Tuple[float, float]]:
+    if rate <= 0.0 or step <= 0.0:
+        raise ValueError("Ramp rate and step have to be positive")
+    distance = abs(target - start)
+    num_steps = math.ceil(distance / step)
+    steps: List[Tuple[float, float]] = []
+    for index in range(1, num_steps + 1):
+        delta = min(index * step, distance)
+        steps.append((delta / rate, start + math.copysign(delta, target - start)))
+    return steps
+
+
 class PowerSupply(Device, ABC):
     device_type: DeviceType = DeviceType.POWER_SUPPLY
 
@@ -51,3 +235,69 @@ class PowerSupply(Device, ABC):
     @abstractmethod
     def set_target_current(self, current: float) -> None:
         raise NotImplementedError
+
+    def get_snapshot(self) -> PowerSupplySnapshot:
+        # drivers that can read everything at once should override this
+        return PowerSupplySnapshot(
+            is_output_on=self.is_output_on(),
+            mode=self.get_mode(),
+            target_voltage=self.get_target_voltage(),
+            target_current=self.get_target_current(),
+            actual_voltage=self.get_actual_voltage(),
+            actual_current=self.get_actual_current(),
+        )
+
+    def get_setpoint_drift_count(self) -> int:
+        # how often setpoints were found changed behind our back, by drivers
+        # that keep track of what they commanded
+        return 0
+
+    def _get_setter(self, quantity: PowerSupplyQuantity) -> Callable[[float], None]:
+        if quantity == PowerSupplyQuantity.VOLTAGE:
+            return self.set_target_voltage
+        return self.set_target_current
+
+    def ramp(
+        self,
+        target: float,
+        rate: float,
+        step: float,
+        quantity: PowerSupplyQuantity = PowerSupplyQuantity.VOLTAGE,
+    ) -> SetpointSchedule:
+        # rate is in volts or amperes per second, and step in volts or amperes
+        start = (
+            self.get_target_voltage()
+            if quantity == PowerSupplyQuantity.VOLTAGE
+            else self.get_target_current()
+        )
+        schedule = SetpointSchedule(
+            self._get_setter(quantity), _get_ramp_steps(start, target, rate, step)
+        )
+        schedule.start()
+        return schedule
+
+    def sweep(
+        self,
+        points: Sequence[float],
+        dwell: float,
+        quantity: PowerSupplyQuantity = PowerSupplyQuantity.VOLTAGE,
+    ) -> SetpointSchedule:
+        # each point is held for dwell seconds before moving on to the next
+        schedule = SetpointSchedule(
+            self._get_setter(quantity),
+            [(index * dwell, point) for index, point in enumerate(points)],
+        )
+        schedule.start()
+        return schedule
+
+    def read_channels(self, channels: Sequence[str]) -> Sequence[float]:
+        readers = {
+            "voltage": self.get_actual_voltage,
+            "current": self.get_actual_current,
+            "target_voltage": self.get_target_voltage,
+            "target_current": self.get_target_current,
+        }
+        for channel in channels:
+            if channel not in readers:
+                raise ValueError(f"Unknown channel: {channel}")
+        return [readers[channel]() for channel in channels]
@@ -0,0 +1,18 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_retries: int = 0
+    initial_backoff_ms: float = 100.0
+    max_backoff_ms: float = 5000.0
+    backoff_multiplier: float = 2.0
+
+    def get_backoff_ms(self, retry: int) -> float:
+        return min(
+            self.max_backoff_ms,
+            self.initial_backoff_ms * self.backoff_multiplier ** retry,
+        )
+
+
+NO_RETRIES = RetryPolicy()
@@ -1,22 +1,83 @@
+import bisect
+import concurrent.futures
 import fcntl
+import functools
+import itertools
 import queue
 import threading
 import time
-import uuid
 from abc import ABC
-from dataclasses import dataclass, field
+from concurrent.futures import Future
 from enum import Enum
-from typing import Dict, Optional, Type, TypeVar, Union
+from typing import (
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+)
 
 from pyre_extensions import none_throws
 
-from serial import PARITY_NONE, Serial
+from serial import PARITY_NONE, Serial, SerialException, SerialTimeoutException
+
+from labby.hw.core.cache import ResponseCache
+from labby.hw.core.deadline import get_io_deadline
+from labby.hw.core.exceptions import HardwareIOError
+from labby.hw.core.framing import DEFAULT_TERMINATOR, LineReader
+from labby.hw.core.retry import NO_RETRIES, RetryPolicy
+from labby.hw.core.stats import SerialPortStats, get_serial_port_stats
+
+
+TResult = TypeVar("TResult")
+# what the future of each job type resolves to: nothing for writes, selects and
+# closes, a response for queries and a list of them for pipelined queries
+SerialControllerJobResult = Union[None, str, List[str]]
+# errors after which the port cannot be trusted anymore and has to be reopened,
+# such as the USB adapter going away. these are the only ones worth retrying,
+# as a unit that does not answer in time will most likely not answer again
+LINK_ERRORS: Tuple[Type[Exception], ...] = (SerialException, OSError)
+
+
+def _is_link_error(ex: Exception) -> bool:
+    # write timeouts are SerialExceptions too, but they only mean that a unit
+    # is holding the data off, such as with XOFF, not that the link is gone
+    return isinstance(ex, LINK_ERRORS) and not isinstance(ex, SerialTimeoutException)
 
 
 class SerialDevice(ABC):
     WAIT_TIME_AFTER_WRITE_MS: float = 0.0
-
+    # whether a response proves the device is ready for the next command,
+    # allowing the rest of WAIT_TIME_AFTER_WRITE_MS to be skipped
+    SKIP_WAIT_AFTER_RESPONSE: bool = False
+    # how long the port is kept open after its last client closes it
+    IDLE_TIMEOUT_MS: float = 0.0
+    RESPONSE_TERMINATOR: bytes = DEFAULT_TERMINATOR
+    # how many times queries are retried when the link fails, and how long
+    # to wait in between. writes are never retried
+    RETRY_POLICY: RetryPolicy = NO_RETRIES
+    # how long to wait for each job before giving up on it. None waits forever
+    JOB_TIMEOUT_MS: Optional[float] = None
+    # how long responses to a query stay valid, in milliseconds. queries
+    # missing from here always go to the wire, and None never expires
+    QUERY_CACHE_TTL_MS: Mapping[bytes, Optional[float]] = {}
+    # prefixes of writes, and the cached queries that they invalidate
+    QUERY_CACHE_INVALIDATIONS: Mapping[bytes, Sequence[bytes]] = {}
+
+    idle_timeout_ms: float
+    job_timeout_ms: Optional[float]
+    response_cache: ResponseCache
     _serial_controller: Optional["SerialController"]
+    _is_opening: bool
+    # message that selects this unit on a multi-drop bus, if it has to be
+    # selected before talking to it
+    bus_address: Optional[bytes] = None
 
     def __init__(
         self,
@@ -27,6 +88,8 @@ class SerialDevice(ABC):
         stopbits: int = 1,
         xonxoff: bool = False,
         timeout_ms: Optional[float] = None,
+        idle_timeout_ms: Optional[float] = None,
+        job_timeout_ms: Optional[float] = None,
     ) -> None:
         self.port = port
         self.baudrate = baudrate
@@ -35,8 +98,18 @@ class SerialDevice(ABC):
         self.stopbits = stopbits
         self.xonxoff = xonxoff
         self.timeout_ms = timeout_ms
+        self.idle_timeout_ms = (
+            self.IDLE_TIMEOUT_MS if idle_timeout_ms is None else idle_timeout_ms
+        )
+        self.job_timeout_ms = (
+            self.JOB_TIMEOUT_MS if job_timeout_ms is None else job_timeout_ms
+        )
+        self.response_cache = ResponseCache(
+            self.QUERY_CACHE_TTL_MS, self.QUERY_CACHE_INVALIDATIONS
+        )
 
         self._serial_controller = None
+        self._is_opening = False
 
     @property
     def serial_controller(self) -> "SerialController":
@@ -45,11 +118,74 @@ class SerialDevice(ABC):
             "Attempted to access SerialDevice without opening it first",
         )
 
+    def _wait(self, future: "Future[TResult]") -> TResult:
+        job_timeout_ms = self.job_timeout_ms
+        timeout = job_timeout_ms / 1000.0 if job_timeout_ms else None
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            # the job is skipped if it has not started yet
+            future.cancel()
+            raise HardwareIOError(f"Timed out waiting for {self.port}")
+
     def _write(self, msg: bytes) -> None:
-        self.serial_controller.write(msg)
+        self._wait(self._submit_write(msg))
 
     def _query(self, msg: bytes) -> str:
-        return self.serial_controller.query(msg)
+        return self._wait(self._submit_query(msg))
+
+    def _query_many(self, msgs: Sequence[bytes]) -> List[str]:
+        return self._wait(self._submit_query_many(msgs))
+
+    def _select_bus_address(self) -> None:
+        self._wait(self.serial_controller.submit_select(self.bus_address))
+
+    def _submit_write(self, msg: bytes) -> "Future[None]":
+        self.response_cache.invalidate(msg)
+        # writes made while opening are replayed whenever the port is reopened
+        return self.serial_controller.submit_write(
+            msg, address=self.bus_address, setup=self._is_opening
+        )
+
+    def _submit_query(self, msg: bytes) -> "Future[str]":
+        cache: ResponseCache = self.response_cache
+        if not cache.is_cacheable(msg):
+            return self.serial_controller.submit_query(
+                msg, address=self.bus_address, retry_policy=self.RETRY_POLICY
+            )
+
+        cached_response = cache.get(msg)
+        if cached_response is not None:
+            future: "Future[str]" = Future()
+            future.set_result(cached_response)
+            return future
+
+        generation: int = cache.generation
+        future = self.serial_controller.submit_query(
+            msg, address=self.bus_address, retry_policy=self.RETRY_POLICY
+        )
+
+        def _on_done(done: "Future[str]") -> None:
+            if not done.cancelled() and done.exception() is None:
+                cache.put(msg, done.result(), generation)
+
+        future.add_done_callback(_on_done)
+        return future
+
+    def _submit_query_many(self, msgs: Sequence[bytes]) -> "Future[List[str]]":
+        cache: ResponseCache = self.response_cache
+        generation: int = cache.generation
+        future = self.serial_controller.submit_query_many(
+            msgs, address=self.bus_address, retry_policy=self.RETRY_POLICY
+        )
+
+        def _on_done(done: "Future[List[str]]") -> None:
+            if not done.cancelled() and done.exception() is None:
+                for msg, response in zip(msgs, done.result()):
+                    cache.put(msg, response, generation)
+
+        future.add_done_callback(_on_done)
+        return future
 
     def open(self) -> None:
         serial_controller = SerialController.get_or_create(
@@ -61,14 +197,21 @@ class SerialDevice(ABC):
             xonxoff=self.xonxoff,
             timeout_ms=self.timeout_ms,
             wait_time_after_write_ms=self.WAIT_TIME_AFTER_WRITE_MS,
+            skip_wait_after_response=self.SKIP_WAIT_AFTER_RESPONSE,
+            idle_timeout_ms=self.idle_timeout_ms,
+            response_terminator=self.RESPONSE_TERMINATOR,
         )
         if not serial_controller.is_alive():
             serial_controller.start()
         self._serial_controller = serial_controller
-        self._on_open()
+        self._is_opening = True
+        try:
+            self._on_open()
+        finally:
+            self._is_opening = False
 
     def close(self) -> None:
-        self.serial_controller.close()
+        self.serial_controller.close(address=self.bus_address)
 
     def _on_open(self) -> None:
         pass
@@ -78,40 +221,328 @@ REGISTRY_LOCK = threading.Lock()
 SERIAL_CONTROLLERS: Dict[str, "SerialController"] = {}
 
 
-class SerialControllerJobPriority(Enum):
-    HIGH = 0
-    LOW = 10
-
-
 class SerialControllerJobType(Enum):
     WRITE = 0
     QUERY = 1
     CLOSE = 2
+    QUERY_MANY = 3
+    SELECT = 4
 
 
-@dataclass(frozen=True, order=True)
 class SerialControllerJob:
-    condition: threading.Condition = field(init=False, compare=False)
-    uuid: str = field(init=False, compare=False)
-    type: SerialControllerJobType = field(compare=False)
-    message: bytes = field(default=b"", compare=False)
-    priority: SerialControllerJobPriority = SerialControllerJobPriority.LOW
+    __slots__ = (
+        "type",
+        "message",
+        "messages",
+        "deadline",
+        "future",
+        "submitted_at",
+        "address",
+        "coalescible",
+        "coalesced_futures",
+        "retry_policy",
+        "retries",
+        "setup",
+    )
+
+    type: SerialControllerJobType
+    message: bytes
+    messages: Tuple[bytes, ...]
+    # time.time() by which the job should be done, if it has to be
+    deadline: Optional[float]
+    future: "Future[SerialControllerJobResult]"
+    submitted_at: float
+    address: Optional[bytes]
+    # whether identical jobs still waiting in the queue can share one response
+    coalescible: bool
+    # futures of the identical jobs that were merged into this one
+    coalesced_futures: List["Future[SerialControllerJobResult]"]
+    # only used for queries, as writes are not necessarily idempotent
+    retry_policy: RetryPolicy
+    # how many times the job has been retried so far
+    retries: int
+    # whether this is a write that sets the device up after the port is opened
+    setup: bool
 
-    def __post_init__(self) -> None:
-        object.__setattr__(self, "condition", threading.Condition())
-        object.__setattr__(self, "uuid", str(uuid.uuid4()))
+    def __init__(
+        self,
+        type: SerialControllerJobType,
+        message: bytes = b"",
+        messages: Tuple[bytes, ...] = (),
+        deadline: Optional[float] = None,
+        address: Optional[bytes] = None,
+        coalescible: bool = False,
+        retry_policy: RetryPolicy = NO_RETRIES,
+        setup: bool = False,
+    ) -> None:
+        self.type = type
+        self.message = message
+        self.messages = messages
+        self.deadline = deadline
+        self.address = address
+        self.coalescible = coalescible
+        self.coalesced_futures = []
+        self.retry_policy = retry_policy
+        self.retries = 0
+        self.setup = setup
+        self.future = Future()
+        self.submitted_at = time.time()
+
+    def get_messages(self) -> Tuple[bytes, ...]:
+        if self.type == SerialControllerJobType.QUERY_MANY:
+            return self.messages
+        if self.type in (SerialControllerJobType.WRITE, SerialControllerJobType.QUERY):
+            return (self.message,)
+        return ()
+
+    def get_max_retries(self) -> int:
+        if self.type in (
+            SerialControllerJobType.QUERY,
+            SerialControllerJobType.QUERY_MANY,
+        ):
+            return self.retry_policy.max_retries
+        return 0
+
+    def set_running_or_notify_cancel(self) -> bool:
+        coalesced_futures = [
+            future
+            for future in self.coalesced_futures
+            if future.set_running_or_notify_cancel()
+        ]
+        if not self.future.set_running_or_notify_cancel():
+            if not coalesced_futures:
+                return False
+            # whoever submitted the job gave up on it, but others still wait
+            self.future = Future()
+            self.future.set_running_or_notify_cancel()
+        for future in coalesced_futures:
+            self.future.add_done_callback(
+                functools.partial(_copy_future_result, future)
+            )
+        return True
+
+
+def _copy_future_result(
+    destination: "Future[SerialControllerJobResult]",
+    source: "Future[SerialControllerJobResult]",
+) -> None:
+    exception = source.exception()
+    if exception is not None:
+        destination.set_exception(exception)
+    else:
+        destination.set_result(source.result())
+
+
+def _is_due_before(job: SerialControllerJob, other: SerialControllerJob) -> bool:
+    deadline = job.deadline
+    other_deadline = other.deadline
+    if deadline is None:
+        return other_deadline is None
+    return other_deadline is None or deadline <= other_deadline
+
+
+# jobs that may change what a unit responds with, or that are answered
+# in between the queries they are queued with
+_STATEFUL_JOB_TYPES: Tuple[SerialControllerJobType, ...] = (
+    SerialControllerJobType.WRITE,
+    SerialControllerJobType.SELECT,
+    SerialControllerJobType.QUERY_MANY,
+)
+# upper bound on how many times in a row older jobs for other addresses can be
+# passed over in favor of the currently selected one
+MAX_CONSECUTIVE_REORDERED_JOBS = 8
+
+
+class SerialControllerJobQueue:
+    _deadline_jobs: List[Tuple[float, int, SerialControllerJob]]
+    _best_effort_jobs: List[SerialControllerJob]
+    _estimate_ms: Callable[[SerialControllerJob], float]
+    _not_empty: threading.Condition
+    _num_submitted_jobs: int
+    _num_reordered_jobs: int
+    _coalescible_jobs: Dict[Tuple[Optional[bytes], bytes], SerialControllerJob]
+    # jobs backing off before they are retried, and the ones done with that
+    _deferred_jobs: List[SerialControllerJob]
+    _retry_jobs: List[SerialControllerJob]
+    _is_closed: bool
 
+    def __init__(
+        self, estimate_ms: Callable[[SerialControllerJob], float] = lambda job: 0.0
+    ) -> None:
+        # jobs with a deadline are kept sorted by it, ties in submission order
+        self._deadline_jobs = []
+        self._best_effort_jobs = []
+        self._estimate_ms = estimate_ms
+        self._not_empty = threading.Condition(threading.Lock())
+        self._num_submitted_jobs = 0
+        self._num_reordered_jobs = 0
+        self._coalescible_jobs = {}
+        self._deferred_jobs = []
+        self._retry_jobs = []
+        self._is_closed = False
+
+    def put(self, job: SerialControllerJob) -> None:
+        with self._not_empty:
+            if job.type in _STATEFUL_JOB_TYPES:
+                # queries submitted after this job must see what it did, so
+                # they can not share the response of one queued before it
+                for key in [
+                    key for key in self._coalescible_jobs if key[0] == job.address
+                ]:
+                    del self._coalescible_jobs[key]
+            if job.coalescible:
+                key = (job.address, job.message)
+                queued_job = self._coalescible_jobs.get(key)
+                # never make a job wait for one that is due later
+                if queued_job is not None and _is_due_before(queued_job, job):
+                    queued_job.coalesced_futures.append(job.future)
+                    return
+                self._coalescible_jobs[key] = job
+            self._num_submitted_jobs += 1
+            deadline = job.deadline
+            if deadline is None:
+                self._best_effort_jobs.append(job)
+            else:
+                entry: Tuple[float, int, SerialControllerJob] = (
+                    deadline,
+                    self._num_submitted_jobs,
+                    job,
+                )
+                bisect.insort(self._deadline_jobs, entry)
+            self._not_empty.notify()
+
+    def defer(self, job: SerialControllerJob) -> None:
+        with self._not_empty:
+            self._deferred_jobs.append(job)
+
+    def put_retry(self, job: SerialControllerJob) -> None:
+        with self._not_empty:
+            # the job is dropped if the queue was closed in the meantime
+            if job in self._deferred_jobs:
+                self._deferred_jobs.remove(job)
+                self._retry_jobs.append(job)
+                self._not_empty.notify()
+
+    def close(self) -> List[SerialControllerJob]:
+        # returns the jobs that were still waiting to be retried
+        with self._not_empty:
+            jobs = self._retry_jobs + self._deferred_jobs
+            self._retry_jobs = []
+            self._deferred_jobs = []
+            self._is_closed = True
+            return jobs
+
+    def _is_held(self, job: SerialControllerJob) -> bool:
+        # a unit's jobs wait while one of its queries backs off, so that they
+        # still run in the order they were submitted in
+        return any(deferred.address == job.address for deferred in self._deferred_jobs)
+
+    def _has_ready_jobs(self) -> bool:
+        return bool(self._retry_jobs) or any(
+            not self._is_held(job)
+            for job in itertools.chain(
+                (job for (_, _, job) in self._deadline_jobs), self._best_effort_jobs
+            )
+        )
 
-TResult = TypeVar("TResult")
+    def _is_empty(self) -> bool:
+        return (
+            not self._deadline_jobs
+            and not self._best_effort_jobs
+            and not self._deferred_jobs
+            and not self._retry_jobs
+        )
+
+    def empty(self) -> bool:
+        with self._not_empty:
+            return self._is_empty()
+
+    def _get_slack_ms(self) -> float:
+        # how long the queued jobs with deadlines can be put off for without
+        # any of them missing its deadline
+        now = time.time()
+        busy_until_ms = 0.0
+        slack_ms = float("inf")
+        for (deadline, _, job) in self._deadline_jobs:
+            busy_until_ms += self._estimate_ms(job)
+            slack_ms = min(slack_ms, (deadline - now) * 1000.0 - busy_until_ms)
+        return slack_ms
+
+    def _pop_best_effort(
+        self, selected_address: Optional[bytes]
+    ) -> SerialControllerJob:
+        jobs = self._best_effort_jobs
+        ready = [index for index, job in enumerate(jobs) if not self._is_held(job)]
+        if self._num_reordered_jobs < MAX_CONSECUTIVE_REORDERED_JOBS:
+            # jobs are kept in submission order, so picking the first job that
+            # does not need an address switch keeps each device's jobs in order
+            for position, index in enumerate(ready):
+                job = jobs[index]
+                if job.address is None or job.address == selected_address:
+                    self._num_reordered_jobs = (
+                        self._num_reordered_jobs + 1 if position > 0 else 0
+                    )
+                    return jobs.pop(index)
+        self._num_reordered_jobs = 0
+        return jobs.pop(ready[0])
+
+    def _pop(self, selected_address: Optional[bytes]) -> SerialControllerJob:
+        # retries were submitted before anything else that is queued
+        if self._retry_jobs:
+            return self._retry_jobs.pop(0)
+        deadline_index = next(
+            (
+                index
+                for index, (_, _, job) in enumerate(self._deadline_jobs)
+                if not self._is_held(job)
+            ),
+            None,
+        )
+        if deadline_index is None:
+            return self._pop_best_effort(selected_address)
+        best_effort_job = next(
+            (job for job in self._best_effort_jobs if not self._is_held(job)), None
+        )
+        # jobs without a deadline only go first if they fit in the slack
+        if (
+            best_effort_job is not None
+            and self._estimate_ms(best_effort_job) < self._get_slack_ms()
+        ):
+            return self._pop_best_effort(selected_address)
+        return self._deadline_jobs.pop(deadline_index)[2]
+
+    def _forget(self, job: SerialControllerJob) -> SerialControllerJob:
+        # once a job leaves the queue its response may already be on the wire,
+        # so later identical jobs have to go through on their own
+        key = (job.address, job.message)
+        if job.coalescible and self._coalescible_jobs.get(key) is job:
+            del self._coalescible_jobs[key]
+        return job
+
+    def get(
+        self, selected_address: Optional[bytes], timeout: Optional[float] = None
+    ) -> SerialControllerJob:
+        with self._not_empty:
+            if not self._not_empty.wait_for(self._has_ready_jobs, timeout):
+                raise queue.Empty
+            return self._forget(self._pop(selected_address))
 
 
 class SerialController(threading.Thread):
     port: str
     serial: Serial
-    job_queue: "queue.PriorityQueue[SerialControllerJob]"
-    job_results: Dict[str, Union[str, Exception]]
+    job_queue: SerialControllerJobQueue
+    selected_address: Optional[bytes]
     num_clients: int
     wait_time_after_write_ms: float
+    skip_wait_after_response: bool
+    # time.monotonic() before which the next write has to wait
+    next_write_time: float
+    idle_timeout_ms: float
+    line_reader: LineReader
+    # writes that set each address up, to be replayed when reopening the port
+    setup_messages: Dict[Optional[bytes], List[bytes]]
+    stats: SerialPortStats
 
     def __init__(
         self,
@@ -123,6 +554,9 @@ class SerialController(threading.Thread):
         xonxoff: bool,
         timeout_ms: Optional[float],
         wait_time_after_write_ms: float,
+        skip_wait_after_response: bool = False,
+        idle_timeout_ms: float = 0.0,
+        response_terminator: bytes = DEFAULT_TERMINATOR,
     ) -> None:
         super().__init__()
         self.daemon = True
@@ -139,10 +573,16 @@ class SerialController(threading.Thread):
         self.serial.timeout = timeout_ms / 1000.0 if timeout_ms else None
 
         self.wait_time_after_write_ms = wait_time_after_write_ms
-
-        self.job_queue = queue.PriorityQueue()
-        self.job_results = {}
+        self.skip_wait_after_response = skip_wait_after_response
+        self.next_write_time = 0.0
+        self.idle_timeout_ms = idle_timeout_ms
+        self.line_reader = LineReader(response_terminator)
+        self.setup_messages = {}
+
+        self.job_queue = SerialControllerJobQueue(self._estimate_ms)
+        self.selected_address = None
         self.num_clients = 0
+        self.stats = get_serial_port_stats(port)
 
     @classmethod
     def get_or_create(
@@ -155,6 +595,9 @@ class SerialController(threading.Thread):
         xonxoff: bool,
         timeout_ms: Optional[float],
         wait_time_after_write_ms: float,
+        skip_wait_after_response: bool = False,
+        idle_timeout_ms: float = 0.0,
+        response_terminator: bytes = DEFAULT_TERMINATOR,
     ) -> "SerialController":
         with REGISTRY_LOCK:
             if (
@@ -162,6 +605,9 @@ class SerialController(threading.Thread):
                 and SERIAL_CONTROLLERS[port].is_alive()
             ):
                 serial_controller = SERIAL_CONTROLLERS[port]
+                serial_controller.idle_timeout_ms = max(
+                    serial_controller.idle_timeout_ms, idle_timeout_ms
+                )
             else:
                 serial_controller = SerialController(
                     port=port,
@@ -172,83 +618,288 @@ class SerialController(threading.Thread):
                     xonxoff=xonxoff,
                     timeout_ms=timeout_ms,
                     wait_time_after_write_ms=wait_time_after_write_ms,
+                    skip_wait_after_response=skip_wait_after_response,
+                    idle_timeout_ms=idle_timeout_ms,
+                    response_terminator=response_terminator,
                 )
                 SERIAL_CONTROLLERS[port] = serial_controller
             serial_controller.num_clients += 1
             return serial_controller
 
-    def _run_and_wait(self, job: SerialControllerJob) -> None:
-        with job.condition:
-            self.job_queue.put(job)
-            job.condition.wait()
+    def _submit(self, job: SerialControllerJob) -> "Future[SerialControllerJobResult]":
+        if job.deadline is None and job.type != SerialControllerJobType.CLOSE:
+            job.deadline = get_io_deadline()
+        self.job_queue.put(job)
+        return job.future
+
+    def submit_write(
+        self, message: bytes, address: Optional[bytes] = None, setup: bool = False
+    ) -> "Future[None]":
+        future = self._submit(
+            SerialControllerJob(
+                type=SerialControllerJobType.WRITE,
+                message=message,
+                address=address,
+                setup=setup,
+            )
+        )
+        return cast("Future[None]", future)
 
-    def _read_result(
-        self, job: SerialControllerJob, result_type: Type[TResult]
-    ) -> TResult:
-        result = self.job_results.get(job.uuid)
-        try:
-            del self.job_results[job.uuid]
-        except KeyError:
-            pass
-        if isinstance(result, result_type):
-            return result
-        assert isinstance(result, Exception)
-        raise result
+    def submit_query(
+        self,
+        message: bytes,
+        address: Optional[bytes] = None,
+        coalescible: bool = True,
+        retry_policy: RetryPolicy = NO_RETRIES,
+    ) -> "Future[str]":
+        future = self._submit(
+            SerialControllerJob(
+                type=SerialControllerJobType.QUERY,
+                message=message,
+                address=address,
+                coalescible=coalescible,
+                retry_policy=retry_policy,
+            )
+        )
+        return cast("Future[str]", future)
 
-    def write(self, message: bytes) -> None:
-        job = SerialControllerJob(type=SerialControllerJobType.WRITE, message=message)
-        self._run_and_wait(job)
-        return self._read_result(job, type(None))
+    def submit_query_many(
+        self,
+        messages: Sequence[bytes],
+        address: Optional[bytes] = None,
+        retry_policy: RetryPolicy = NO_RETRIES,
+    ) -> "Future[List[str]]":
+        future = self._submit(
+            SerialControllerJob(
+                type=SerialControllerJobType.QUERY_MANY,
+                messages=tuple(messages),
+                address=address,
+                retry_policy=retry_policy,
+            )
+        )
+        return cast("Future[List[str]]", future)
 
-    def query(self, message: bytes) -> str:
-        job = SerialControllerJob(type=SerialControllerJobType.QUERY, message=message)
-        self._run_and_wait(job)
-        return self._read_result(job, str)
+    def submit_select(self, address: Optional[bytes]) -> "Future[None]":
+        future = self._submit(
+            SerialControllerJob(type=SerialControllerJobType.SELECT, address=address)
+        )
+        return cast("Future[None]", future)
 
-    def close(self) -> None:
-        job = SerialControllerJob(type=SerialControllerJobType.CLOSE)
-        self._run_and_wait(job)
-        return self._read_result(job, type(None))
+    def write(self, message: bytes, address: Optional[bytes] = None) -> None:
+        return self.submit_write(message, address).result()
+
+    def query(self, message: bytes, address: Optional[bytes] = None) -> str:
+        return self.submit_query(message, address).result()
+
+    def query_many(
+        self, messages: Sequence[bytes], address: Optional[bytes] = None
+    ) -> List[str]:
+        return self.submit_query_many(messages, address).result()
+
+    def close(self, address: Optional[bytes] = None) -> None:
+        job = SerialControllerJob(type=SerialControllerJobType.CLOSE, address=address)
+        self._submit(job).result()
 
     def _write(self, message: bytes) -> None:
+        # only wait for whatever is left of the gap since the previous write,
+        # on a clock that wall clock adjustments can neither skip nor stretch
+        start_time = time.monotonic()
+        wait_time = self.wait_time_after_write_ms / 1000.0
+        delay = min(self.next_write_time - start_time, wait_time)
+        if delay > 0:
+            time.sleep(delay)
         self.serial.write(message)
-        time.sleep(self.wait_time_after_write_ms / 1000.0)
+        end_time = time.monotonic()
+        self.next_write_time = end_time + wait_time
+        self.stats.record_write(message, end_time - start_time)
+
+    def _readline(self, message: bytes) -> str:
+        start_time = time.monotonic()
+        line = self.line_reader.next_line()
+        while line is None:
+            # block for the first byte, then take whatever else has arrived in
+            # one go rather than a byte at a time like Serial.readline() does
+            data = self.serial.read(max(1, self.serial.in_waiting))
+            if not data:
+                raise HardwareIOError(
+                    f"Timed out waiting for a response on {self.port}"
+                )
+            self.line_reader.feed(data)
+            line = self.line_reader.next_line()
+        response = line.decode("utf-8")
+        end_time = time.monotonic()
+        if self.skip_wait_after_response:
+            self.next_write_time = end_time
+        self.stats.record_read(message, end_time - start_time)
+        return response
+
+    def _open(self) -> None:
+        self.selected_address = None
+        self.line_reader.clear()
+        self.serial.open()
+        try:
+            fcntl.flock(self.serial, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except Exception:
+            self.serial.close()
+            raise
+        for address, messages in self.setup_messages.items():
+            self._select(address)
+            for message in messages:
+                self._write(message)
+
+    def _select(self, address: Optional[bytes]) -> None:
+        if address is not None and address != self.selected_address:
+            self._write(address)
+            self.selected_address = address
+
+    def _record_setup_message(self, job: SerialControllerJob) -> None:
+        messages = self.setup_messages.setdefault(job.address, [])
+        if job.message not in messages:
+            messages.append(job.message)
+
+    def _close(self, job: SerialControllerJob) -> None:
+        self.setup_messages.pop(job.address, None)
+        with REGISTRY_LOCK:
+            self.num_clients -= 1
+            if self.num_clients == 0 and self.idle_timeout_ms <= 0:
+                del SERIAL_CONTROLLERS[self.port]
+                # resolved by run() once the port is actually closed
+                return
+        job.future.set_result(None)
+
+    def _perform(self, job: SerialControllerJob) -> SerialControllerJobResult:
+        if not self.serial.is_open:
+            self._open()
+
+        self._select(job.address)
+
+        if job.type == SerialControllerJobType.SELECT:
+            return None
+
+        if job.type == SerialControllerJobType.WRITE:
+            self._write(job.message)
+            if job.setup:
+                self._record_setup_message(job)
+            return None
+
+        if job.type == SerialControllerJobType.QUERY:
+            self._write(job.message)
+            return self._readline(job.message)
+
+        if job.type == SerialControllerJobType.QUERY_MANY:
+            # write everything first so the device turnaround overlaps with
+            # the pacing of the next writes, then collect responses in order
+            for message in job.messages:
+                self._write(message)
+            return [self._readline(message) for message in job.messages]
+
+    def _recover(self, ex: Exception) -> None:
+        # we can no longer be sure of which unit is listening, and a late
+        # response must not be mistaken for the response to the next query
+        self.selected_address = None
+        self.line_reader.clear()
+        if _is_link_error(ex):
+            # the next job reopens the port, which also takes care of the
+            # device having been unplugged and plugged back in
+            self.serial.close()
 
     def _execute_job(self, job: SerialControllerJob) -> None:
+        if job.type == SerialControllerJobType.CLOSE:
+            self._close(job)
+            return
+
         try:
-            if job.type == SerialControllerJobType.CLOSE:
-                with REGISTRY_LOCK:
-                    self.num_clients -= 1
-                    if self.num_clients == 0:
-                        del SERIAL_CONTROLLERS[self.port]
+            result = self._perform(job)
+        except Exception as ex:
+            self._recover(ex)
+            if not _is_link_error(ex) or job.retries >= job.get_max_retries():
+                job.future.set_exception(ex)
                 return
+            for message in job.get_messages():
+                self.stats.record_retry(message)
+            self._retry_later(job)
+            return
+        job.future.set_result(result)
+
+    def _retry_later(self, job: SerialControllerJob) -> None:
+        # the job backs off on a timer rather than on this thread, so that the
+        # other units on the port are served in the meantime
+        backoff_s = job.retry_policy.get_backoff_ms(job.retries) / 1000.0
+        job.retries += 1
+        self.job_queue.defer(job)
+        timer = threading.Timer(backoff_s, self.job_queue.put_retry, (job,))
+        timer.daemon = True
+        timer.start()
+
+    def _estimate_ms(self, job: SerialControllerJob) -> float:
+        with_response = job.type != SerialControllerJobType.WRITE
+        return sum(
+            self.stats.estimate_ms(message, with_response)
+            for message in job.get_messages()
+        )
 
-            if not self.serial.is_open:
-                self.serial.open()
-                fcntl.flock(self.serial, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    def _record_queue_wait(self, job: SerialControllerJob) -> None:
+        queue_wait = time.time() - job.submitted_at
+        for message in job.get_messages():
+            self.stats.record_queue_wait(message, queue_wait)
 
-            if job.type == SerialControllerJobType.WRITE:
-                self._write(job.message)
-                return
+    def _record_missed_deadline(self, job: SerialControllerJob) -> None:
+        deadline = job.deadline
+        if deadline is None or time.time() <= deadline or not job.future.done():
+            return
+        for message in job.get_messages():
+            self.stats.record_missed_deadline(message)
 
-            if job.type == SerialControllerJobType.QUERY:
-                self._write(job.message)
-                response = self.serial.readline()[:-2].decode("utf-8")
-                self.job_results[job.uuid] = response
-                return
-        except Exception as ex:
-            self.job_results[job.uuid] = ex
+    def _is_registered(self) -> bool:
+        return SERIAL_CONTROLLERS.get(self.port) is self
+
+    def _get_next_job(self) -> Optional[SerialControllerJob]:
+        if self.num_clients > 0 or self.idle_timeout_ms <= 0:
+            return self.job_queue.get(self.selected_address)
+
+        try:
+            return self.job_queue.get(
+                self.selected_address, timeout=self.idle_timeout_ms / 1000.0
+            )
+        except queue.Empty:
+            pass
+
+        with REGISTRY_LOCK:
+            # a new client may have shown up while we were waiting
+            if self.num_clients == 0 and self.job_queue.empty():
+                del SERIAL_CONTROLLERS[self.port]
+                # release the port before anyone can create a new controller
+                # for it, otherwise their flock() would fail
+                self.serial.close()
+        return None
 
     def run(self) -> None:
+        job: Optional[SerialControllerJob] = None
         try:
-            while self.serial.port in SERIAL_CONTROLLERS.keys():
-                job = self.job_queue.get()
-                with job.condition:
+            while self._is_registered():
+                job = self._get_next_job()
+                if job is None:
+                    continue
+                # the futures of retried jobs are already running
+                if job.retries > 0 or job.set_running_or_notify_cancel():
+                    if job.retries == 0:
+                        self._record_queue_wait(job)
                     self._execute_job(job)
-                    job.condition.notify()
-                self.job_queue.task_done()
+                    self._record_missed_deadline(job)
 
+            # jobs that were backing off will not get another try
+            for pending_job in self.job_queue.close():
+                pending_job.future.set_exception(
+                    HardwareIOError(f"{self.port} was closed before responding")
+                )
             assert self.job_queue.empty()
 
         finally:
             self.serial.close()
+            if job is not None and not job.future.done():
+                if job.type == SerialControllerJobType.CLOSE:
+                    job.future.set_result(None)
+                else:
+                    job.future.set_exception(
+                        HardwareIOError(f"{self.port} was closed before responding")
+                    )
@@ -0,0 +1,115 @@
+import threading
+from types import TracebackType
+from typing import Dict, List, Optional, Type, TypeVar
+
+from labby.hw.core import Device
+
+
+TDevice = TypeVar("TDevice", bound=Device)
+
+
+class _PooledDevice:
+    lock: threading.Lock
+    refcount: int
+    is_open: bool
+
+    def __init__(self) -> None:
+        # held while opening or closing, so that a slow device does not hold
+        # up sessions on any other device
+        self.lock = threading.Lock()
+        self.refcount = 0
+        self.is_open = False
+
+
+class DeviceSession:
+    pool: "DeviceSessionPool"
+
+    _devices: List[Device]
+
+    def __init__(self, pool: "DeviceSessionPool") -> None:
+        self.pool = pool
+        self._devices = []
+
+    def acquire(self, device: TDevice) -> TDevice:
+        if not any(d is device for d in self._devices):
+            self.pool._acquire(device)
+            self._devices.append(device)
+        return device
+
+    def close(self) -> None:
+        while self._devices:
+            self.pool._release(self._devices.pop())
+
+    def __enter__(self) -> "DeviceSession":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> bool:
+        self.close()
+        return False
+
+
+class DeviceSessionPool:
+    _lock: threading.Lock
+    _entries: Dict[int, _PooledDevice]
+    _devices: Dict[int, Device]
+    _is_closed: bool
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._devices = {}
+        self._is_closed = False
+
+    def session(self) -> DeviceSession:
+        return DeviceSession(self)
+
+    def _get_entry(self, device: Device) -> _PooledDevice:
+        with self._lock:
+            entry = self._entries.get(id(device))
+            if entry is None:
+                entry = _PooledDevice()
+                self._entries[id(device)] = entry
+                self._devices[id(device)] = device
+            return entry
+
+    def _acquire(self, device: Device) -> None:
+        entry = self._get_entry(device)
+        with entry.lock:
+            # devices stay open once nothing uses them anymore, so that the
+            # next session only pays for its own I/O
+            if not entry.is_open:
+                device.open()
+                entry.is_open = True
+            entry.refcount += 1
+
+    def _release(self, device: Device) -> None:
+        entry = self._get_entry(device)
+        with entry.lock:
+            entry.refcount -= 1
+            if self._is_closed and entry.refcount == 0 and entry.is_open:
+                entry.is_open = False
+                device.close()
+
+    def get_refcount(self, device: Device) -> int:
+        return self._get_entry(device).refcount
+
+    def is_open(self, device: Device) -> bool:
+        return self._get_entry(device).is_open
+
+    def close(self) -> None:
+        with self._lock:
+            self._is_closed = True
+            entries = [
+                (self._devices[key], entry) for key, entry in self._entries.items()
+            ]
+        # devices that are still in use are closed when their last session is
+        for (device, entry) in entries:
+            with entry.lock:
+                if entry.refcount == 0 and entry.is_open:
+                    entry.is_open = False
+                    device.close()
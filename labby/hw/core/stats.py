@@ -0,0 +1,190 @@
+import functools
+import re
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Pattern, Tuple
+
+from mashumaro import DataClassMessagePackMixin
+
+
+ROLLING_WINDOW_SIZE = 1000
+
+_COMMAND_PREFIX_REGEX: Pattern[bytes] = re.compile(rb"[^0-9;\r\n]*")
+
+
+@functools.lru_cache(maxsize=256)
+def get_command_prefix(message: bytes) -> str:
+    # drops arguments and terminators so that, say, :VOL4.250; and :VOL5.000;
+    # are accounted together as :VOL, while :VOL?; and :VOL!; stay separate
+    match = _COMMAND_PREFIX_REGEX.match(message)
+    prefix = match.group(0) if match else b""
+    return prefix.decode("utf-8", "replace")
+
+
+@dataclass(frozen=True)
+class LatencySummary(DataClassMessagePackMixin):
+    count: int
+    mean_ms: float
+    p50_ms: float
+    p99_ms: float
+    max_ms: float
+
+
+class RollingLatencies:
+    window_size: int
+    samples: Deque[float]
+    total_ms: float
+
+    def __init__(self, window_size: int = ROLLING_WINDOW_SIZE) -> None:
+        self.window_size = window_size
+        self.samples = deque()
+        self.total_ms = 0.0
+
+    def add(self, value_ms: float) -> None:
+        if len(self.samples) == self.window_size:
+            self.total_ms -= self.samples.popleft()
+        self.samples.append(value_ms)
+        self.total_ms += value_ms
+
+    def get_mean(self) -> float:
+        return self.total_ms / len(self.samples) if self.samples else 0.0
+
+    def summarize(self) -> LatencySummary:
+        samples: List[float] = sorted(self.samples)
+        if not samples:
+            return LatencySummary(
+                count=0, mean_ms=0.0, p50_ms=0.0, p99_ms=0.0, max_ms=0.0
+            )
+
+        def _percentile(q: float) -> float:
+            return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+        return LatencySummary(
+            count=len(samples),
+            mean_ms=sum(samples) / len(samples),
+            p50_ms=_percentile(0.50),
+            p99_ms=_percentile(0.99),
+            max_ms=samples[-1],
+        )
+
+
+class SerialJobTimings:
+    queue_wait: RollingLatencies
+    write: RollingLatencies
+    read: RollingLatencies
+    missed_deadlines: int
+    retries: int
+
+    def __init__(self) -> None:
+        self.queue_wait = RollingLatencies()
+        self.write = RollingLatencies()
+        self.read = RollingLatencies()
+        self.missed_deadlines = 0
+        self.retries = 0
+
+
+@dataclass(frozen=True)
+class SerialCommandStats(DataClassMessagePackMixin):
+    port: str
+    command: str
+    queue_wait: LatencySummary
+    write: LatencySummary
+    read: LatencySummary
+    missed_deadlines: int
+    retries: int
+
+
+ALL_COMMANDS = "*"
+
+
+class SerialPortStats:
+    port: str
+    timings: Dict[str, SerialJobTimings]
+    _lock: threading.Lock
+
+    def __init__(self, port: str) -> None:
+        self.port = port
+        self.timings = {ALL_COMMANDS: SerialJobTimings()}
+        self._lock = threading.Lock()
+
+    def _get_timings(self, message: bytes) -> Tuple[SerialJobTimings, SerialJobTimings]:
+        command = get_command_prefix(message)
+        timings = self.timings.get(command)
+        if timings is None:
+            timings = self.timings[command] = SerialJobTimings()
+        return (self.timings[ALL_COMMANDS], timings)
+
+    def record_queue_wait(self, message: bytes, seconds: float) -> None:
+        with self._lock:
+            for timings in self._get_timings(message):
+                timings.queue_wait.add(seconds * 1000.0)
+
+    def record_write(self, message: bytes, seconds: float) -> None:
+        with self._lock:
+            for timings in self._get_timings(message):
+                timings.write.add(seconds * 1000.0)
+
+    def record_read(self, message: bytes, seconds: float) -> None:
+        with self._lock:
+            for timings in self._get_timings(message):
+                timings.read.add(seconds * 1000.0)
+
+    def record_missed_deadline(self, message: bytes) -> None:
+        with self._lock:
+            for timings in self._get_timings(message):
+                timings.missed_deadlines += 1
+
+    def record_retry(self, message: bytes) -> None:
+        with self._lock:
+            for timings in self._get_timings(message):
+                timings.retries += 1
+
+    def estimate_ms(self, message: bytes, with_response: bool) -> float:
+        # commands that have not been seen yet are assumed to behave like the
+        # average command on this port
+        with self._lock:
+            timings = self.timings.get(get_command_prefix(message))
+            if timings is None or not timings.write.samples:
+                timings = self.timings[ALL_COMMANDS]
+            estimate_ms = timings.write.get_mean()
+            if with_response:
+                estimate_ms += timings.read.get_mean()
+            return estimate_ms
+
+    def summarize(self) -> List[SerialCommandStats]:
+        with self._lock:
+            return [
+                SerialCommandStats(
+                    port=self.port,
+                    command=command,
+                    queue_wait=timings.queue_wait.summarize(),
+                    write=timings.write.summarize(),
+                    read=timings.read.summarize(),
+                    missed_deadlines=timings.missed_deadlines,
+                    retries=timings.retries,
+                )
+                for command, timings in sorted(self.timings.items())
+            ]
+
+
+_STATS_LOCK = threading.Lock()
+SERIAL_STATS: Dict[str, SerialPortStats] = {}
+
+
+def get_serial_port_stats(port: str) -> SerialPortStats:
+    with _STATS_LOCK:
+        stats = SERIAL_STATS.get(port)
+        if stats is None:
+            stats = SERIAL_STATS[port] = SerialPortStats(port)
+        return stats
+
+
+def get_serial_stats() -> List[SerialCommandStats]:
+    with _STATS_LOCK:
+        all_stats = [SERIAL_STATS[port] for port in sorted(SERIAL_STATS.keys())]
+    return [
+        command_stats
+        for port_stats in all_stats
+        for command_stats in port_stats.summarize()
+    ]
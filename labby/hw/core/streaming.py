@@ -0,0 +1,131 @@
+import asyncio
+import math
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import (
+    AsyncIterator,
+    Callable,
+    Deque,
+    Generator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+
+T = TypeVar("T")
+
+# how long each batch spans, unless a batch size is given
+DEFAULT_BATCH_PERIOD_S = 0.1
+# samples a pipelined stream keeps in flight, which bounds how far behind it
+# can fall when the device can not keep up with the requested rate
+MAX_SAMPLES_IN_FLIGHT = 8
+
+
+@dataclass(frozen=True)
+class SampleBatch:
+    channels: Sequence[str]
+    # when each sample was requested, as returned by time.time()
+    timestamps: Sequence[float]
+    # one row per sample, with a value for each channel
+    values: Sequence[Sequence[float]]
+
+
+def get_batch_size(rate: float, batch_size: Optional[int]) -> int:
+    if rate <= 0.0:
+        raise ValueError("Streaming rate has to be positive")
+    if batch_size is not None:
+        return max(1, batch_size)
+    return max(1, math.floor(rate * DEFAULT_BATCH_PERIOD_S))
+
+
+def _sleep_until(due_time: float) -> None:
+    delay = due_time - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def poll(
+    read: Callable[[], Sequence[float]],
+    channels: Sequence[str],
+    rate: float,
+    batch_size: Optional[int] = None,
+) -> Generator[SampleBatch, None, None]:
+    size = get_batch_size(rate, batch_size)
+    # samples are scheduled on the monotonic clock, so that the stream keeps
+    # its pace when the wall clock is adjusted
+    start_time = time.monotonic()
+    index = 0
+    while True:
+        timestamps: List[float] = []
+        values: List[Sequence[float]] = []
+        while len(values) < size:
+            # samples are due at fixed times from the start, and the ones
+            # that are overdue are taken right away rather than skipped
+            _sleep_until(start_time + index / rate)
+            index += 1
+            timestamps.append(time.time())
+            values.append(read())
+        yield SampleBatch(channels=channels, timestamps=timestamps, values=values)
+
+
+def pipeline(
+    submit: Callable[[], "Future[T]"],
+    parse: Callable[[T], Sequence[float]],
+    channels: Sequence[str],
+    rate: float,
+    batch_size: Optional[int] = None,
+) -> Generator[SampleBatch, None, None]:
+    size = get_batch_size(rate, batch_size)
+    start_time = time.monotonic()
+    index = 0
+    in_flight: Deque[Tuple[float, "Future[T]"]] = deque()
+    try:
+        while True:
+            timestamps: List[float] = []
+            values: List[Sequence[float]] = []
+            while len(values) < size:
+                # requests go out when they are due, without waiting for the
+                # previous response, so round trips overlap with each other
+                while len(in_flight) < MAX_SAMPLES_IN_FLIGHT:
+                    due_time = start_time + index / rate
+                    if in_flight and due_time > time.monotonic():
+                        break
+                    _sleep_until(due_time)
+                    index += 1
+                    in_flight.append((time.time(), submit()))
+                (timestamp, future) = in_flight.popleft()
+                timestamps.append(timestamp)
+                values.append(parse(future.result()))
+            yield SampleBatch(channels=channels, timestamps=timestamps, values=values)
+    finally:
+        for (_timestamp, future) in in_flight:
+            future.cancel()
+
+
+async def poll_async(
+    read: Callable[[], Sequence[float]],
+    channels: Sequence[str],
+    rate: float,
+    batch_size: Optional[int] = None,
+) -> AsyncIterator[SampleBatch]:
+    size = get_batch_size(rate, batch_size)
+    loop = asyncio.get_running_loop()
+    start_time = time.monotonic()
+    index = 0
+    while True:
+        timestamps: List[float] = []
+        values: List[Sequence[float]] = []
+        while len(values) < size:
+            delay = start_time + index / rate - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            index += 1
+            timestamps.append(time.time())
+            # reads block, so they are kept off the event loop
+            values.append(await loop.run_in_executor(None, read))
+        yield SampleBatch(channels=channels, timestamps=timestamps, values=values)
@@ -0,0 +1,183 @@
+import asyncio
+import os
+import select
+import threading
+from typing import Callable, Dict, Tuple
+from unittest import TestCase
+from unittest.mock import patch
+
+from labby.hw.core.async_serial import ASYNC_SERIAL_CONTROLLERS, AsyncSerialDevice
+from labby.hw.core.exceptions import HardwareIOError
+
+
+class TestAsyncSerialDevice(AsyncSerialDevice):
+    async def get_value(self) -> str:
+        return await self._query(b":value?;")
+
+
+class FakeTerminal(threading.Thread):
+    master: int
+    port: str
+    responses: Dict[bytes, bytes]
+    received: bytearray
+    stopped: threading.Event
+
+    def __init__(self, responses: Dict[bytes, bytes]) -> None:
+        super().__init__()
+        self.daemon = True
+        self.master, slave = os.openpty()
+        self.port = os.ttyname(slave)
+        os.close(slave)
+        self.responses = responses
+        self.received = bytearray()
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        pending = bytearray()
+        while not self.stopped.is_set():
+            readable, _, _ = select.select([self.master], [], [], 0.01)
+            if not readable:
+                continue
+            try:
+                data = os.read(self.master, 1024)
+            except OSError:
+                continue
+            self.received += data
+            pending += data
+            while b";" in pending:
+                command, _, rest = bytes(pending).partition(b";")
+                pending = bytearray(rest)
+                response = self.responses.get(command + b";")
+                if response is not None:
+                    os.write(self.master, response + b"\r\n")
+
+    def close(self) -> None:
+        self.stopped.set()
+        self.join()
+        os.close(self.master)
+
+
+def _fake_terminal(responses: Dict[bytes, bytes]) -> FakeTerminal:
+    terminal = FakeTerminal(responses)
+    terminal.start()
+    return terminal
+
+
+class AsyncSerialDeviceTest(TestCase):
+    def test_query(self) -> None:
+        terminal: FakeTerminal = _fake_terminal({b":value?;": b"42"})
+
+        async def _test() -> str:
+            async with TestAsyncSerialDevice(terminal.port, 9600) as device:
+                assert isinstance(device, TestAsyncSerialDevice)
+                return await device.get_value()
+
+        try:
+            self.assertEqual(asyncio.run(_test()), "42")
+        finally:
+            terminal.close()
+
+    def test_write_and_query_many(self) -> None:
+        terminal: FakeTerminal = _fake_terminal({b":a?;": b"A", b":b?;": b"B"})
+
+        async def _test() -> Tuple[str, ...]:
+            async with TestAsyncSerialDevice(terminal.port, 9600) as device:
+                await device._write(b":set;")
+                return tuple(await device._query_many([b":a?;", b":b?;"]))
+
+        try:
+            self.assertEqual(asyncio.run(_test()), ("A", "B"))
+            self.assertEqual(bytes(terminal.received), b":set;:a?;:b?;")
+        finally:
+            terminal.close()
+
+    def test_concurrent_queries_are_serialized(self) -> None:
+        terminal: FakeTerminal = _fake_terminal({b":a?;": b"A", b":b?;": b"B"})
+
+        async def _test() -> Tuple[str, ...]:
+            async with TestAsyncSerialDevice(terminal.port, 9600) as device:
+                return tuple(
+                    await asyncio.gather(
+                        *(
+                            device._query(b":a?;" if i % 2 else b":b?;")
+                            for i in range(6)
+                        )
+                    )
+                )
+
+        try:
+            self.assertEqual(asyncio.run(_test()), ("B", "A") * 3)
+        finally:
+            terminal.close()
+
+    def test_query_timeout(self) -> None:
+        terminal: FakeTerminal = _fake_terminal({})
+
+        async def _test() -> None:
+            device = TestAsyncSerialDevice(terminal.port, 9600, timeout_ms=50)
+            async with device:
+                await device._query(b":value?;")
+
+        try:
+            with self.assertRaisesRegex(HardwareIOError, "Timed out"):
+                asyncio.run(_test())
+        finally:
+            terminal.close()
+
+    def test_controllers_are_shared_and_purged_on_close(self) -> None:
+        terminal: FakeTerminal = _fake_terminal({b":value?;": b"42"})
+
+        async def _test() -> None:
+            self.assertEqual(len(ASYNC_SERIAL_CONTROLLERS), 0)
+            async with TestAsyncSerialDevice(terminal.port, 9600) as first:
+                async with TestAsyncSerialDevice(terminal.port, 9600) as second:
+                    self.assertIs(first.serial_controller, second.serial_controller)
+                    self.assertEqual(first.serial_controller.num_clients, 2)
+                self.assertEqual(len(ASYNC_SERIAL_CONTROLLERS), 1)
+            self.assertEqual(len(ASYNC_SERIAL_CONTROLLERS), 0)
+
+        try:
+            asyncio.run(_test())
+        finally:
+            terminal.close()
+
+    def test_hangups_fail_pending_queries(self) -> None:
+        terminal: FakeTerminal = _fake_terminal({b":value?;": b"42"})
+        read: Callable[[int, int], bytes] = os.read
+
+        async def _test() -> None:
+            device = TestAsyncSerialDevice(terminal.port, 9600)
+            async with device:
+                controller = device.serial_controller
+                controller._ensure_open()
+                fd = controller.serial.fileno()
+                with patch(
+                    "os.read",
+                    side_effect=lambda f, n: b"" if f == fd else read(f, n),
+                ):
+                    with self.assertRaisesRegex(HardwareIOError, "hung up"):
+                        await device.get_value()
+                self.assertFalse(controller.serial.is_open)
+                self.assertEqual(await device.get_value(), "42")
+
+        try:
+            asyncio.run(_test())
+        finally:
+            terminal.close()
+
+    def test_closing_fails_pending_queries(self) -> None:
+        terminal: FakeTerminal = _fake_terminal({})
+
+        async def _test() -> None:
+            device = TestAsyncSerialDevice(terminal.port, 9600)
+            await device.open()
+            query = asyncio.ensure_future(device.get_value())
+            await asyncio.sleep(0.05)
+            await device.close()
+            await asyncio.wait_for(query, 1.0)
+
+        try:
+            with self.assertRaisesRegex(HardwareIOError, "was closed"):
+                asyncio.run(_test())
+        finally:
+            terminal.close()
@@ -0,0 +1,40 @@
+from unittest import TestCase
+
+from freezegun import freeze_time
+
+from labby.hw.core.cache import ResponseCache
+
+
+class ResponseCacheTest(TestCase):
+    def setUp(self) -> None:
+        self.cache = ResponseCache(
+            {b":MDL?;": None, b":VOL!;": 1000.0}, {b":VOL": (b":VOL!;",)}
+        )
+
+    def test_uncacheable_queries(self) -> None:
+        self.assertFalse(self.cache.is_cacheable(b":VOL?;"))
+        self.cache.put(b":VOL?;", "AV1.00", self.cache.generation)
+        self.assertIsNone(self.cache.get(b":VOL?;"))
+
+    def test_expiry(self) -> None:
+        with freeze_time("2020-01-01 00:00:00") as frozen_time:
+            self.cache.put(b":MDL?;", "ZUP6-33", self.cache.generation)
+            self.cache.put(b":VOL!;", "SV1.00", self.cache.generation)
+            frozen_time.tick(0.999)
+            self.assertEqual(self.cache.get(b":VOL!;"), "SV1.00")
+            frozen_time.tick(0.001)
+            self.assertIsNone(self.cache.get(b":VOL!;"))
+            self.assertEqual(self.cache.get(b":MDL?;"), "ZUP6-33")
+
+    def test_invalidation(self) -> None:
+        self.cache.put(b":MDL?;", "ZUP6-33", self.cache.generation)
+        self.cache.put(b":VOL!;", "SV1.00", self.cache.generation)
+        self.cache.invalidate(b":VOL2.000;")
+        self.assertIsNone(self.cache.get(b":VOL!;"))
+        self.assertEqual(self.cache.get(b":MDL?;"), "ZUP6-33")
+
+    def test_responses_to_queries_in_flight_during_a_write_are_dropped(self) -> None:
+        generation = self.cache.generation
+        self.cache.invalidate(b":VOL2.000;")
+        self.cache.put(b":VOL!;", "SV1.00", generation)
+        self.assertIsNone(self.cache.get(b":VOL!;"))
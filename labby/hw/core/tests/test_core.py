@@ -1,5 +1,10 @@
+import subprocess
+import sys
 from unittest import TestCase
-from labby.hw.core import DeviceType
+from unittest.mock import patch
+from labby.hw.core import Device, DeviceType
+from labby.hw.tdklambda import power_supply as tdklambda_power_supply
+from labby.hw.virtual import power_supply as virtual_power_supply
 
 
 class DeviceTypeTest(TestCase):
@@ -8,3 +13,52 @@ class DeviceTypeTest(TestCase):
             friendly_name = device_type.friendly_name
             self.assertIsInstance(friendly_name, str)
             self.assertGreater(len(friendly_name), 0)
+
+
+class DeviceTest(TestCase):
+    def test_create(self) -> None:
+        device = Device.create(
+            "virtual",
+            "labby.hw.virtual.power_supply.PowerSupply",
+            {"load_in_ohms": "5"},
+        )
+        assert isinstance(device, virtual_power_supply.PowerSupply)
+        self.assertEqual(device.name, "virtual")
+        self.assertEqual(device.load_in_ohms, 5.0)
+
+    def test_create_with_optional_args(self) -> None:
+        device = Device.create(
+            "zup",
+            "labby.hw.tdklambda.power_supply.ZUP",
+            {"port": "/dev/ttyUSB0", "baudrate": "9600", "model": "ZUP6-33"},
+        )
+        assert isinstance(device, tdklambda_power_supply.ZUP)
+        self.assertEqual(device.model.name, "ZUP6-33")
+
+    def test_unknown_driver(self) -> None:
+        with self.assertRaisesRegex(KeyError, "Unknown driver"):
+            Device.get_driver("labby.hw.foobar.power_supply.PowerSupply")
+        with self.assertRaisesRegex(KeyError, "Unknown driver"):
+            Device.get_driver("labby.hw.virtual.power_supply.FooBar")
+        with self.assertRaisesRegex(KeyError, "Unknown driver"):
+            Device.get_driver("FooBar")
+
+    def test_errors_importing_a_driver_are_raised(self) -> None:
+        # a module that the driver imports is missing, rather than the driver
+        error = ModuleNotFoundError(
+            "No module named 'labby.hw.tdk'", name="labby.hw.tdk"
+        )
+        with patch("labby.hw.core.import_module", side_effect=error):
+            with self.assertRaises(ModuleNotFoundError):
+                Device.get_driver("labby.hw.tdklambda.foobar.FooBar")
+
+    def test_drivers_are_imported_lazily(self) -> None:
+        script = (
+            "import sys\n"
+            "from labby.hw.core import Device\n"
+            "Device.create('virtual', 'labby.hw.virtual.power_supply.PowerSupply',"
+            " {'load_in_ohms': 5})\n"
+            "print('labby.hw.tdklambda.power_supply' in sys.modules)\n"
+        )
+        output = subprocess.check_output([sys.executable, "-c", script])
+        self.assertEqual(output.strip(), b"False")
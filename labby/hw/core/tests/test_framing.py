@@ -0,0 +1,39 @@
+from unittest import TestCase
+
+from labby.hw.core.framing import LineReader
+
+
+class LineReaderTest(TestCase):
+    def test_lines_split_across_chunks(self) -> None:
+        reader = LineReader()
+        reader.feed(b"SV1.0")
+        self.assertIsNone(reader.next_line())
+        reader.feed(b"0\r")
+        self.assertIsNone(reader.next_line())
+        reader.feed(b"\nSA0.")
+        self.assertEqual(reader.next_line(), b"SV1.00")
+        self.assertIsNone(reader.next_line())
+        reader.feed(b"5\r\n")
+        self.assertEqual(reader.next_line(), b"SA0.5")
+
+    def test_many_lines_in_one_chunk(self) -> None:
+        reader = LineReader()
+        reader.feed(b"a\r\nb\r\n\r\nc")
+        self.assertEqual(reader.next_line(), b"a")
+        self.assertEqual(reader.next_line(), b"b")
+        self.assertEqual(reader.next_line(), b"")
+        self.assertIsNone(reader.next_line())
+
+    def test_custom_terminator(self) -> None:
+        reader = LineReader(b";")
+        reader.feed(b"a\r\n;b;")
+        self.assertEqual(reader.next_line(), b"a\r\n")
+        self.assertEqual(reader.next_line(), b"b")
+
+    def test_clear(self) -> None:
+        reader = LineReader()
+        reader.feed(b"a\r")
+        reader.clear()
+        reader.feed(b"\nb\r\n")
+        self.assertEqual(reader.next_line(), b"\nb")
+        self.assertIsNone(reader.next_line())
@@ -0,0 +1,145 @@
+import itertools
+import time
+from typing import List, Optional
+from unittest import TestCase
+from unittest.mock import call, patch
+
+from freezegun import freeze_time
+from pyre_extensions import none_throws
+
+from labby.hw.core.deadline import get_io_deadline
+from labby.hw.core.exceptions import HardwareIOError
+from labby.hw.core.power_supply import (
+    PowerSupplyQuantity,
+    Setpoint,
+    _get_ramp_steps,
+)
+from labby.hw.virtual.power_supply import PowerSupply
+
+
+class SetpointTest(TestCase):
+    def test_unknown_until_set(self) -> None:
+        setpoint: Setpoint[float] = Setpoint(1000.0)
+        self.assertIsNone(setpoint.get())
+        setpoint.set(4.2)
+        self.assertEqual(setpoint.get(), 4.2)
+
+    def test_expires_after_reconcile_interval(self) -> None:
+        with freeze_time("2020-01-01 00:00:00") as frozen_time:
+            setpoint: Setpoint[float] = Setpoint(1000.0)
+            setpoint.set(4.2)
+            frozen_time.tick(0.999)
+            self.assertEqual(setpoint.get(), 4.2)
+            frozen_time.tick(0.001)
+            self.assertIsNone(setpoint.get())
+            setpoint.reconcile(4.2, setpoint.generation)
+            self.assertEqual(setpoint.get(), 4.2)
+            self.assertEqual(setpoint.drift_count, 0)
+
+    def test_drift(self) -> None:
+        setpoint: Setpoint[bool] = Setpoint(1000.0)
+        # nothing to drift from before the first set
+        setpoint.reconcile(False, setpoint.generation)
+        setpoint.set(True)
+        with self.assertLogs("labby.hw.core.power_supply", "WARNING") as logs:
+            self.assertFalse(setpoint.reconcile(False, setpoint.generation))
+        self.assertEqual(setpoint.drift_count, 1)
+        self.assertIn(
+            "setpoint was set to True but reads back as False", logs.output[0]
+        )
+        self.assertFalse(setpoint.get())
+
+    def test_reconcile_racing_with_set(self) -> None:
+        setpoint: Setpoint[float] = Setpoint(1000.0)
+        generation = setpoint.generation
+        setpoint.set(4.2)
+        setpoint.reconcile(1.0, generation)
+        self.assertEqual(setpoint.get(), 4.2)
+        self.assertEqual(setpoint.drift_count, 0)
+
+
+class RampTest(TestCase):
+    def test_ramp_steps(self) -> None:
+        steps = _get_ramp_steps(1.0, 2.0, rate=0.5, step=0.3)
+        expected_steps = [(0.6, 1.3), (1.2, 1.6), (1.8, 1.9), (2.0, 2.0)]
+        self.assertEqual(len(steps), len(expected_steps))
+        for (offset, value), (expected_offset, expected_value) in zip(
+            steps, expected_steps
+        ):
+            self.assertAlmostEqual(offset, expected_offset)
+            self.assertAlmostEqual(value, expected_value)
+        steps = _get_ramp_steps(2.0, 1.5, rate=1.0, step=0.25)
+        self.assertEqual(steps, [(0.25, 1.75), (0.5, 1.5)])
+        self.assertEqual(_get_ramp_steps(2.0, 2.0, rate=1.0, step=0.25), [])
+        with self.assertRaises(ValueError):
+            _get_ramp_steps(0.0, 1.0, rate=0.0, step=0.25)
+
+    def test_ramp(self) -> None:
+        power_supply = PowerSupply(4)
+        power_supply.set_target_voltage(1.0)
+        with patch.object(
+            power_supply, "set_target_voltage", wraps=power_supply.set_target_voltage
+        ) as set_target_voltage:
+            start_time = time.time()
+            ramp = power_supply.ramp(2.0, rate=20.0, step=0.25)
+            self.assertTrue(ramp.wait(timeout=1.0))
+            self.assertGreaterEqual(time.time() - start_time, 0.05)
+        self.assertEqual(
+            set_target_voltage.call_args_list,
+            [call(1.25), call(1.5), call(1.75), call(2.0)],
+        )
+        self.assertEqual(ramp.get_progress(), 1.0)
+        self.assertTrue(ramp.is_done())
+
+    def test_sweep_current(self) -> None:
+        power_supply = PowerSupply(4)
+        deadlines: List[Optional[float]] = []
+        with patch.object(
+            power_supply,
+            "set_target_current",
+            side_effect=lambda _current: deadlines.append(get_io_deadline()),
+        ) as set_target_current:
+            sweep = power_supply.sweep(
+                [0.5, 1.0, 0.5], dwell=0.01, quantity=PowerSupplyQuantity.CURRENT
+            )
+            self.assertTrue(sweep.wait(timeout=1.0))
+        self.assertEqual(
+            set_target_current.call_args_list, [call(0.5), call(1.0), call(0.5)]
+        )
+        # every step is due when it was scheduled for
+        self.assertTrue(all(deadline is not None for deadline in deadlines))
+        first_deadline = none_throws(deadlines[0])
+        last_deadline = none_throws(deadlines[2])
+        self.assertAlmostEqual(last_deadline - first_deadline, 0.02, places=3)
+
+    def test_steps_ignore_wall_clock_adjustments(self) -> None:
+        power_supply = PowerSupply(4)
+        wall_clock = time.time
+        # the wall clock is set back by an hour right after the sweep starts
+        offsets = itertools.chain([0.0], itertools.repeat(-3600.0))
+        with patch("time.time", side_effect=lambda: wall_clock() + next(offsets)):
+            with patch.object(power_supply, "set_target_voltage"):
+                sweep = power_supply.sweep([1.0, 2.0, 3.0], dwell=0.01)
+                finished = sweep.wait(timeout=1.0)
+                sweep.cancel()
+        self.assertTrue(finished)
+        self.assertEqual(sweep.steps_done, 3)
+
+    def test_cancel(self) -> None:
+        power_supply = PowerSupply(4)
+        sweep = power_supply.sweep([1.0, 2.0, 3.0], dwell=60.0)
+        time.sleep(0.05)
+        sweep.cancel()
+        self.assertTrue(sweep.wait(timeout=1.0))
+        self.assertAlmostEqual(sweep.get_progress(), 1 / 3)
+        self.assertAlmostEqual(power_supply.get_target_voltage(), 1.0)
+
+    def test_errors_are_raised_from_wait(self) -> None:
+        power_supply = PowerSupply(4)
+        with patch.object(
+            power_supply, "set_target_voltage", side_effect=HardwareIOError
+        ):
+            sweep = power_supply.sweep([1.0, 2.0], dwell=0.01)
+            with self.assertRaises(HardwareIOError):
+                sweep.wait(timeout=1.0)
+        self.assertEqual(sweep.steps_done, 0)
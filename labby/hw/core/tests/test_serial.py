@@ -1,19 +1,40 @@
+import queue
+import threading
+import time
+from typing import Optional
 from unittest import TestCase
-from unittest.mock import Mock
+from unittest.mock import Mock, call, patch
 
 from serial import SerialException, SerialTimeoutException
 
+from labby.hw.core.exceptions import HardwareIOError
 from labby.hw.core.power_supply import (
     PowerSupply,
     PowerSupplyMode,
 )
-from labby.hw.core.serial import SerialDevice, SERIAL_CONTROLLERS
+from labby.hw.core.serial import (
+    MAX_CONSECUTIVE_REORDERED_JOBS,
+    SerialControllerJob,
+    SerialControllerJobQueue,
+    SerialControllerJobType,
+    SerialDevice,
+    SERIAL_CONTROLLERS,
+)
+from labby.hw.core.deadline import io_deadline
+from labby.hw.core.retry import RetryPolicy
+from labby.hw.core.stats import ALL_COMMANDS, get_serial_stats
 from labby.tests.utils import fake_serial_port
 
 
 class TestSerialPowerSupply(SerialDevice, PowerSupply):
-    def __init__(self, port: str, baudrate: int) -> None:
-        SerialDevice.__init__(self, port, baudrate)
+    def __init__(
+        self, port: str, baudrate: int, idle_timeout_ms: Optional[float] = None
+    ) -> None:
+        SerialDevice.__init__(self, port, baudrate, idle_timeout_ms=idle_timeout_ms)
+
+    def __enter__(self) -> "TestSerialPowerSupply":
+        PowerSupply.__enter__(self)
+        return self
 
     def test_connection(self) -> None:
         return
@@ -46,6 +67,42 @@ class TestSerialPowerSupply(SerialDevice, PowerSupply):
         raise NotImplementedError
 
 
+class PacedSerialPowerSupply(TestSerialPowerSupply):
+    WAIT_TIME_AFTER_WRITE_MS: float = 50.0
+
+
+class FastPacedSerialPowerSupply(PacedSerialPowerSupply):
+    SKIP_WAIT_AFTER_RESPONSE: bool = True
+
+
+class LineFeedSerialPowerSupply(TestSerialPowerSupply):
+    RESPONSE_TERMINATOR: bytes = b"\n"
+
+
+class PersistentSerialPowerSupply(TestSerialPowerSupply):
+    IDLE_TIMEOUT_MS: float = 50.0
+
+
+class ReconnectingSerialPowerSupply(TestSerialPowerSupply):
+    RETRY_POLICY: RetryPolicy = RetryPolicy(max_retries=2, initial_backoff_ms=10.0)
+
+    def _on_open(self) -> None:
+        self._write(b":remote")
+
+
+def _reopenable(serial_port_mock: Mock) -> None:
+    serial_port_mock.is_open = False
+
+    def _open() -> None:
+        serial_port_mock.is_open = True
+
+    def _close() -> None:
+        serial_port_mock.is_open = False
+
+    serial_port_mock.open.side_effect = _open
+    serial_port_mock.close.side_effect = _close
+
+
 class SerialDeviceTest(TestCase):
     @fake_serial_port
     def test_fail_to_open_serial_port(self, serial_port_mock: Mock) -> None:
@@ -64,12 +121,367 @@ class SerialDeviceTest(TestCase):
 
     @fake_serial_port
     def test_successful_write_and_read(self, serial_port_mock: Mock) -> None:
-        serial_port_mock.readline.return_value = b"0\r\n"
+        serial_port_mock.read.return_value = b"0\r\n"
         with TestSerialPowerSupply("/dev/ttyUSB0", 9600) as power_supply:
             self.assertEqual(power_supply.get_mode(), PowerSupplyMode.CONSTANT_VOLTAGE)
 
+    @fake_serial_port
+    def test_jobs_are_timed(self, serial_port_mock: Mock) -> None:
+        serial_port_mock.read.return_value = b"0\r\n"
+        with TestSerialPowerSupply("/dev/ttyUSB7", 9600) as power_supply:
+            power_supply.get_mode()
+            power_supply._query_many([b":mode?", b":other?"])
+        summaries = {
+            summary.command: summary
+            for summary in get_serial_stats()
+            if summary.port == "/dev/ttyUSB7"
+        }
+        self.assertEqual(summaries.keys(), {ALL_COMMANDS, ":mode?", ":other?"})
+        self.assertEqual(summaries[ALL_COMMANDS].queue_wait.count, 3)
+        self.assertEqual(summaries[":mode?"].write.count, 2)
+        self.assertEqual(summaries[":other?"].read.count, 1)
+
+    @fake_serial_port
+    def test_missed_deadlines_are_counted(self, serial_port_mock: Mock) -> None:
+        serial_port_mock.read.return_value = b"0\r\n"
+        with TestSerialPowerSupply("/dev/ttyUSB8", 9600) as power_supply:
+            with io_deadline(time.time() + 1.0):
+                power_supply.get_mode()
+            with io_deadline(time.time() - 1.0):
+                power_supply.get_mode()
+                power_supply._query_many([b":mode?", b":other?"])
+        summaries = {
+            summary.command: summary
+            for summary in get_serial_stats()
+            if summary.port == "/dev/ttyUSB8"
+        }
+        self.assertEqual(summaries[ALL_COMMANDS].missed_deadlines, 3)
+        self.assertEqual(summaries[":mode?"].missed_deadlines, 2)
+
+    @fake_serial_port
+    def test_query_many(self, serial_port_mock: Mock) -> None:
+        serial_port_mock.read.side_effect = [b"0\r\n", b"1\r\n", b"foo\r\n"]
+        with TestSerialPowerSupply("/dev/ttyUSB0", 9600) as power_supply:
+            responses = power_supply._query_many([b":a?", b":b?", b":c?"])
+        self.assertEqual(responses, ["0", "1", "foo"])
+        self.assertEqual(
+            serial_port_mock.write.call_args_list,
+            [call(b":a?"), call(b":b?"), call(b":c?")],
+        )
+
+    @fake_serial_port
+    def test_responses_are_read_in_bulk(self, serial_port_mock: Mock) -> None:
+        serial_port_mock.read.side_effect = [b"0", b"\r\n1\r", b"\nfoo\r\n"]
+        serial_port_mock.in_waiting = 4
+        with TestSerialPowerSupply("/dev/ttyUSB0", 9600) as power_supply:
+            responses = power_supply._query_many([b":a?", b":b?", b":c?"])
+        self.assertEqual(responses, ["0", "1", "foo"])
+        serial_port_mock.read.assert_called_with(4)
+
+    @fake_serial_port
+    def test_custom_response_terminator(self, serial_port_mock: Mock) -> None:
+        serial_port_mock.read.return_value = b"1\n2\n"
+        with LineFeedSerialPowerSupply("/dev/ttyUSB0", 9600) as power_supply:
+            self.assertEqual(power_supply._query(b":a?"), "1")
+            self.assertEqual(power_supply._query(b":b?"), "2")
+        serial_port_mock.read.assert_called_once_with(1)
+
+    @fake_serial_port
+    def test_read_timeout(self, serial_port_mock: Mock) -> None:
+        serial_port_mock.read.side_effect = [b"1", b"", b"0\r\n"]
+        with TestSerialPowerSupply("/dev/ttyUSB0", 9600) as power_supply:
+            with self.assertRaisesRegex(HardwareIOError, "Timed out"):
+                power_supply._query(b":a?")
+            # the partial response is dropped along with the timed out query
+            self.assertEqual(power_supply._query(b":b?"), "0")
+
+    @fake_serial_port
+    def test_query_many_failure(self, serial_port_mock: Mock) -> None:
+        serial_port_mock.write.side_effect = [None, SerialTimeoutException("Timeout")]
+        with TestSerialPowerSupply("/dev/ttyUSB0", 9600) as power_supply:
+            with self.assertRaises(SerialTimeoutException):
+                power_supply._query_many([b":a?", b":b?"])
+        serial_port_mock.read.assert_not_called()
+
 
 class SerialControllerTest(TestCase):
+    @fake_serial_port
+    def test_writes_are_paced(self, serial_port_mock: Mock) -> None:
+        with PacedSerialPowerSupply("/dev/ttyUSB0", 9600) as power_supply:
+            with patch("time.sleep", wraps=time.sleep) as sleep_mock:
+                power_supply._write(b":a")
+                sleep_mock.assert_not_called()
+                power_supply._write(b":b")
+                sleep_mock.assert_called_once()
+                self.assertAlmostEqual(sleep_mock.call_args[0][0], 0.05)
+
+    @fake_serial_port
+    def test_pacing_only_waits_for_the_remaining_gap(
+        self, serial_port_mock: Mock
+    ) -> None:
+        with PacedSerialPowerSupply("/dev/ttyUSB0", 9600) as power_supply:
+            power_supply._write(b":a")
+            time.sleep(0.03)
+            with patch("time.sleep", wraps=time.sleep) as sleep_mock:
+                power_supply._write(b":b")
+                sleep_mock.assert_called_once()
+                self.assertAlmostEqual(sleep_mock.call_args[0][0], 0.02)
+            time.sleep(1.0)
+            with patch("time.sleep", wraps=time.sleep) as sleep_mock:
+                power_supply._write(b":c")
+                sleep_mock.assert_not_called()
+
+    @fake_serial_port
+    def test_pacing_ignores_wall_clock_adjustments(
+        self, serial_port_mock: Mock
+    ) -> None:
+        with PacedSerialPowerSupply("/dev/ttyUSB0", 9600) as power_supply:
+            power_supply._write(b":a")
+            with patch("time.time", return_value=time.time() + 3600.0):
+                with patch("time.sleep", wraps=time.sleep) as sleep_mock:
+                    power_supply._write(b":b")
+                    sleep_mock.assert_called_once()
+
+    @fake_serial_port
+    def test_pacing_is_skipped_after_a_response(self, serial_port_mock: Mock) -> None:
+        serial_port_mock.read.return_value = b"0\r\n"
+        with FastPacedSerialPowerSupply("/dev/ttyUSB0", 9600) as power_supply:
+            with patch("time.sleep", wraps=time.sleep) as sleep_mock:
+                power_supply.get_mode()
+                power_supply.get_mode()
+                power_supply._write(b":a")
+                sleep_mock.assert_not_called()
+                power_supply.get_mode()
+                sleep_mock.assert_called_once()
+                self.assertAlmostEqual(sleep_mock.call_args[0][0], 0.05)
+
+    @fake_serial_port
+    def test_submit_returns_futures(self, serial_port_mock: Mock) -> None:
+        serial_port_mock.read.side_effect = [b"0\r\n", b"1\r\n"]
+        with TestSerialPowerSupply("/dev/ttyUSB0", 9600) as power_supply:
+            write_future = power_supply._submit_write(b":a")
+            query_future = power_supply._submit_query(b":b?")
+            query_many_future = power_supply._submit_query_many([b":c?"])
+            self.assertIsNone(write_future.result())
+            self.assertEqual(query_future.result(), "0")
+            self.assertEqual(query_many_future.result(), ["1"])
+        self.assertEqual(
+            serial_port_mock.write.call_args_list,
+            [call(b":a"), call(b":b?"), call(b":c?")],
+        )
+
+    @fake_serial_port
+    def test_submit_propagates_exceptions(self, serial_port_mock: Mock) -> None:
+        serial_port_mock.write.side_effect = SerialTimeoutException("Timeout")
+        with TestSerialPowerSupply("/dev/ttyUSB0", 9600) as power_supply:
+            future = power_supply._submit_query(b":a?")
+            self.assertIsInstance(future.exception(), SerialTimeoutException)
+
+    @fake_serial_port
+    def test_cancelled_jobs_are_skipped(self, serial_port_mock: Mock) -> None:
+        with TestSerialPowerSupply("/dev/ttyUSB0", 9600) as power_supply:
+            job = SerialControllerJob(type=SerialControllerJobType.WRITE, message=b":a")
+            self.assertTrue(job.future.cancel())
+            power_supply.serial_controller._submit(job)
+            power_supply._submit_write(b":b").result()
+        serial_port_mock.write.assert_called_once_with(b":b")
+
+    @fake_serial_port
+    def test_identical_queued_queries_are_coalesced(
+        self, serial_port_mock: Mock
+    ) -> None:
+        release = threading.Event()
+        serial_port_mock.write.side_effect = lambda message: release.wait(1.0)
+        serial_port_mock.read.return_value = b"AV1.00\r\n"
+        with TestSerialPowerSupply("/dev/ttyUSB0", 9600) as power_supply:
+            power_supply._submit_write(b":busy;")
+            futures = [power_supply._submit_query(b":VOL?;") for _i in range(3)]
+            self.assertTrue(futures[0].cancel())
+            release.set()
+            self.assertEqual([f.result() for f in futures[1:]], ["AV1.00"] * 2)
+            self.assertEqual(power_supply._query(b":VOL?;"), "AV1.00")
+        self.assertEqual(
+            serial_port_mock.write.call_args_list,
+            [call(b":busy;"), call(b":VOL?;"), call(b":VOL?;")],
+        )
+
+    @fake_serial_port
+    def test_queries_are_not_coalesced_across_writes(
+        self, serial_port_mock: Mock
+    ) -> None:
+        release = threading.Event()
+        serial_port_mock.write.side_effect = lambda message: release.wait(1.0)
+        serial_port_mock.read.side_effect = [b"AV1.00\r\n", b"AV5.00\r\n"]
+        with TestSerialPowerSupply("/dev/ttyUSB0", 9600) as power_supply:
+            power_supply._submit_write(b":busy;")
+            before = power_supply._submit_query(b":VOL?;")
+            power_supply._submit_write(b":VOL5.000;")
+            after = power_supply._submit_query(b":VOL?;")
+            release.set()
+            self.assertEqual(before.result(), "AV1.00")
+            self.assertEqual(after.result(), "AV5.00")
+        self.assertEqual(
+            serial_port_mock.write.call_args_list,
+            [call(b":busy;"), call(b":VOL?;"), call(b":VOL5.000;"), call(b":VOL?;")],
+        )
+
+    @fake_serial_port
+    def test_coalesced_queries_share_exceptions(self, serial_port_mock: Mock) -> None:
+        release = threading.Event()
+        serial_port_mock.write.side_effect = lambda message: release.wait(1.0)
+        serial_port_mock.read.side_effect = SerialException("Gone")
+        with TestSerialPowerSupply("/dev/ttyUSB0", 9600) as power_supply:
+            power_supply._submit_write(b":busy;")
+            futures = [power_supply._submit_query(b":VOL?;") for _i in range(2)]
+            release.set()
+            for future in futures:
+                self.assertIsInstance(future.exception(), SerialException)
+
+    @fake_serial_port
+    def test_queries_are_retried_on_a_reopened_port(
+        self, serial_port_mock: Mock
+    ) -> None:
+        _reopenable(serial_port_mock)
+        serial_port_mock.read.side_effect = [SerialException("Gone"), b"1\r\n"]
+        with ReconnectingSerialPowerSupply("/dev/ttyUSB9", 9600) as power_supply:
+            self.assertEqual(power_supply.get_mode(), PowerSupplyMode.CONSTANT_CURRENT)
+        self.assertEqual(serial_port_mock.open.call_count, 2)
+        # the writes from _on_open are replayed after reopening the port
+        self.assertEqual(
+            serial_port_mock.write.call_args_list,
+            [call(b":remote"), call(b":mode?"), call(b":remote"), call(b":mode?")],
+        )
+        summaries = {
+            summary.command: summary
+            for summary in get_serial_stats()
+            if summary.port == "/dev/ttyUSB9"
+        }
+        self.assertEqual(summaries[":mode?"].retries, 1)
+
+    @fake_serial_port
+    def test_retries_are_bounded(self, serial_port_mock: Mock) -> None:
+        _reopenable(serial_port_mock)
+        serial_port_mock.read.side_effect = SerialException("Gone")
+        with ReconnectingSerialPowerSupply("/dev/ttyUSB0", 9600) as power_supply:
+            with patch("threading.Timer", wraps=threading.Timer) as timer_mock:
+                with self.assertRaises(SerialException):
+                    power_supply.get_mode()
+            self.assertEqual(
+                [args[0] for (args, _kwargs) in timer_mock.call_args_list],
+                [0.01, 0.02],
+            )
+        self.assertEqual(serial_port_mock.read.call_count, 3)
+
+    @fake_serial_port
+    def test_other_units_are_served_during_backoff(
+        self, serial_port_mock: Mock
+    ) -> None:
+        _reopenable(serial_port_mock)
+        serial_port_mock.read.side_effect = [
+            SerialException("Gone"),
+            b"B\r\n",
+            b"A\r\n",
+        ]
+        retry_policy = RetryPolicy(max_retries=1, initial_backoff_ms=300.0)
+        with TestSerialPowerSupply("/dev/ttyUSB0", 9600) as power_supply:
+            controller = power_supply.serial_controller
+            first = controller.submit_query(
+                b":a?", address=b":ADR01;", retry_policy=retry_policy
+            )
+            other = controller.submit_query(b":b?", address=b":ADR02;")
+            # jobs for the unit that is backing off keep their order
+            later = controller.submit_write(b":c", address=b":ADR01;")
+            self.assertEqual(other.result(0.2), "B")
+            self.assertFalse(first.done())
+            self.assertEqual(first.result(1.0), "A")
+            self.assertIsNone(later.result(1.0))
+        self.assertEqual(
+            serial_port_mock.write.call_args_list,
+            [
+                call(b":ADR01;"),
+                call(b":a?"),
+                call(b":ADR02;"),
+                call(b":b?"),
+                call(b":ADR01;"),
+                call(b":a?"),
+                call(b":c"),
+            ],
+        )
+
+    @fake_serial_port
+    def test_write_timeouts_are_not_retried(self, serial_port_mock: Mock) -> None:
+        # a unit holding the data off with XOFF has not gone away
+        _reopenable(serial_port_mock)
+        with ReconnectingSerialPowerSupply("/dev/ttyUSB0", 9600) as power_supply:
+            serial_port_mock.write.side_effect = SerialTimeoutException("Timeout")
+            with self.assertRaises(SerialTimeoutException):
+                power_supply.get_mode()
+            self.assertTrue(serial_port_mock.is_open)
+            serial_port_mock.write.side_effect = None
+        self.assertEqual(serial_port_mock.open.call_count, 1)
+        self.assertEqual(
+            serial_port_mock.write.call_args_list, [call(b":remote"), call(b":mode?")]
+        )
+
+    @fake_serial_port
+    def test_response_timeouts_are_not_retried(self, serial_port_mock: Mock) -> None:
+        # a unit that is off or set to another address never answers
+        _reopenable(serial_port_mock)
+        serial_port_mock.read.return_value = b""
+        with ReconnectingSerialPowerSupply("/dev/ttyUSB0", 9600) as power_supply:
+            with patch("time.sleep", wraps=time.sleep) as sleep_mock:
+                with self.assertRaisesRegex(HardwareIOError, "Timed out"):
+                    power_supply.get_mode()
+            sleep_mock.assert_not_called()
+        self.assertEqual(serial_port_mock.read.call_count, 1)
+        self.assertEqual(serial_port_mock.open.call_count, 1)
+        self.assertEqual(
+            serial_port_mock.write.call_args_list, [call(b":remote"), call(b":mode?")]
+        )
+
+    @fake_serial_port
+    def test_writes_are_not_retried(self, serial_port_mock: Mock) -> None:
+        _reopenable(serial_port_mock)
+        with ReconnectingSerialPowerSupply("/dev/ttyUSB0", 9600) as power_supply:
+            serial_port_mock.write.side_effect = [SerialException("Gone"), None, None]
+            with self.assertRaises(SerialException):
+                power_supply._write(b":a")
+            self.assertFalse(serial_port_mock.is_open)
+            power_supply._write(b":b")
+            self.assertTrue(serial_port_mock.is_open)
+        self.assertEqual(
+            serial_port_mock.write.call_args_list,
+            [call(b":remote"), call(b":a"), call(b":remote"), call(b":b")],
+        )
+
+    @fake_serial_port
+    def test_unfinished_queries_fail_when_the_controller_stops(
+        self, serial_port_mock: Mock
+    ) -> None:
+        power_supply = TestSerialPowerSupply("/dev/ttyUSB0", 9600)
+        power_supply.open()
+        controller = power_supply.serial_controller
+        try:
+            with patch.object(
+                controller, "_record_queue_wait", side_effect=RuntimeError("Boom")
+            ), patch("threading.excepthook"):
+                future = power_supply._submit_query(b":a?")
+                self.assertIsInstance(future.exception(1.0), HardwareIOError)
+                controller.join(1.0)
+        finally:
+            del SERIAL_CONTROLLERS["/dev/ttyUSB0"]
+
+    @fake_serial_port
+    def test_job_timeout(self, serial_port_mock: Mock) -> None:
+        release = threading.Event()
+        serial_port_mock.write.side_effect = lambda message: release.wait(1.0)
+        power_supply = TestSerialPowerSupply("/dev/ttyUSB0", 9600)
+        power_supply.job_timeout_ms = 10.0
+        with power_supply:
+            with self.assertRaisesRegex(HardwareIOError, "Timed out"):
+                power_supply._write(b":a")
+            release.set()
+
     @fake_serial_port
     def test_device_reuse(self, serial_port_mock: Mock) -> None:
         self.assertEqual(len(SERIAL_CONTROLLERS), 0)
@@ -83,6 +495,37 @@ class SerialControllerTest(TestCase):
         power_supply.close()
         self.assertEqual(len(SERIAL_CONTROLLERS), 0)
 
+    @fake_serial_port
+    def test_idle_port_is_kept_open(self, serial_port_mock: Mock) -> None:
+        power_supply = PersistentSerialPowerSupply("/dev/ttyUSB0", 9600)
+        power_supply.open()
+        serial_controller = power_supply.serial_controller
+        power_supply.close()
+        self.assertEqual(SERIAL_CONTROLLERS, {"/dev/ttyUSB0": serial_controller})
+        serial_port_mock.close.assert_not_called()
+
+        power_supply.open()
+        self.assertIs(power_supply.serial_controller, serial_controller)
+        power_supply.close()
+
+        serial_controller.join(timeout=5.0)
+        self.assertFalse(serial_controller.is_alive())
+        self.assertEqual(len(SERIAL_CONTROLLERS), 0)
+        serial_port_mock.close.assert_called()
+
+    @fake_serial_port
+    def test_idle_timeout_from_constructor(self, serial_port_mock: Mock) -> None:
+        power_supply = PersistentSerialPowerSupply("/dev/ttyUSB0", 9600)
+        self.assertEqual(power_supply.idle_timeout_ms, 50.0)
+        power_supply = TestSerialPowerSupply("/dev/ttyUSB0", 9600)
+        self.assertEqual(power_supply.idle_timeout_ms, 0.0)
+        power_supply = PersistentSerialPowerSupply(
+            "/dev/ttyUSB0", 9600, idle_timeout_ms=0.0
+        )
+        with power_supply:
+            pass
+        self.assertEqual(len(SERIAL_CONTROLLERS), 0)
+
     @fake_serial_port
     def test_serial_controllers_are_reused(self, _serial_port_mock: Mock) -> None:
         self.assertEqual(len(SERIAL_CONTROLLERS), 0)
@@ -147,3 +590,177 @@ class SerialControllerTest(TestCase):
             self.assertEqual(len(SERIAL_CONTROLLERS), 1)
 
         self.assertEqual(len(SERIAL_CONTROLLERS), 0)
+
+
+def _job(address: bytes, deadline: Optional[float] = None) -> SerialControllerJob:
+    return SerialControllerJob(
+        type=SerialControllerJobType.WRITE, address=address, deadline=deadline
+    )
+
+
+def _query(
+    message: bytes,
+    deadline: Optional[float] = None,
+    address: Optional[bytes] = None,
+) -> SerialControllerJob:
+    return SerialControllerJob(
+        type=SerialControllerJobType.QUERY,
+        message=message,
+        deadline=deadline,
+        address=address,
+        coalescible=True,
+    )
+
+
+class SerialControllerJobQueueTest(TestCase):
+    def test_prefers_jobs_for_the_selected_address(self) -> None:
+        job_queue = SerialControllerJobQueue()
+        a1, b1, a2, b2 = _job(b"A"), _job(b"B"), _job(b"A"), _job(b"B")
+        for job in (a1, b1, a2, b2):
+            job_queue.put(job)
+        self.assertIs(job_queue.get(b"A"), a1)
+        self.assertIs(job_queue.get(b"A"), a2)
+        self.assertIs(job_queue.get(b"A"), b1)
+        self.assertIs(job_queue.get(b"B"), b2)
+        self.assertTrue(job_queue.empty())
+
+    def test_deadlines_come_before_address(self) -> None:
+        job_queue = SerialControllerJobQueue(lambda job: 10.0)
+        a = _job(b"A")
+        b = _job(b"B", deadline=time.time() + 0.015)
+        job_queue.put(a)
+        job_queue.put(b)
+        self.assertIs(job_queue.get(b"A"), b)
+        self.assertIs(job_queue.get(b"B"), a)
+
+    def test_earliest_deadline_first(self) -> None:
+        job_queue = SerialControllerJobQueue()
+        now = time.time()
+        later, sooner, sooner_too = (
+            _job(b"A", now + 2),
+            _job(b"B", now + 1),
+            _job(b"A", now + 1),
+        )
+        for job in (later, sooner, sooner_too):
+            job_queue.put(job)
+        self.assertIs(job_queue.get(b"A"), sooner)
+        self.assertIs(job_queue.get(b"A"), sooner_too)
+        self.assertIs(job_queue.get(b"A"), later)
+
+    def test_jobs_without_deadlines_are_fitted_into_the_slack(self) -> None:
+        job_queue = SerialControllerJobQueue(lambda job: 10.0)
+        now = time.time()
+        sampled = _job(b"A", now + 1.0)
+        interactive = _job(b"A")
+        job_queue.put(sampled)
+        job_queue.put(interactive)
+        self.assertIs(job_queue.get(b"A"), interactive)
+        self.assertIs(job_queue.get(b"A"), sampled)
+
+        # the second sample would be late if the interactive job went first
+        first, second = _job(b"A", now + 1.0), _job(b"A", now + 0.015)
+        for job in (first, second, interactive):
+            job_queue.put(job)
+        self.assertEqual(job_queue.get(b"A"), second)
+        self.assertEqual(job_queue.get(b"A"), interactive)
+        self.assertEqual(job_queue.get(b"A"), first)
+
+    def test_jobs_for_other_addresses_are_not_starved(self) -> None:
+        job_queue = SerialControllerJobQueue()
+        b = _job(b"B")
+        job_queue.put(b)
+        for _i in range(MAX_CONSECUTIVE_REORDERED_JOBS + 1):
+            job_queue.put(_job(b"A"))
+        for _i in range(MAX_CONSECUTIVE_REORDERED_JOBS):
+            self.assertEqual(job_queue.get(b"A").address, b"A")
+        self.assertIs(job_queue.get(b"A"), b)
+        self.assertEqual(job_queue.get(b"B").address, b"A")
+
+    def test_identical_queries_are_coalesced(self) -> None:
+        job_queue = SerialControllerJobQueue()
+        jobs = [_query(b":VOL?;") for _i in range(3)]
+        for job in jobs:
+            job_queue.put(job)
+        self.assertIs(job_queue.get(None), jobs[0])
+        self.assertEqual(jobs[0].coalesced_futures, [jobs[1].future, jobs[2].future])
+        self.assertTrue(job_queue.empty())
+
+    def test_dequeued_queries_are_not_coalesced(self) -> None:
+        job_queue = SerialControllerJobQueue()
+        first, second = _query(b":VOL?;"), _query(b":VOL?;")
+        job_queue.put(first)
+        job_queue.get(None)
+        job_queue.put(second)
+        self.assertIs(job_queue.get(None), second)
+
+    def test_queries_are_not_coalesced_into_ones_due_later(self) -> None:
+        job_queue = SerialControllerJobQueue()
+        now = time.time()
+        best_effort = _query(b":VOL?;")
+        sooner = _query(b":VOL?;", deadline=now + 1.0)
+        later = _query(b":VOL?;", deadline=now + 2.0)
+        for job in (best_effort, sooner, later):
+            job_queue.put(job)
+        self.assertIs(job_queue.get(None), best_effort)
+        self.assertIs(job_queue.get(None), sooner)
+        self.assertEqual(sooner.coalesced_futures, [later.future])
+        self.assertTrue(job_queue.empty())
+
+    def test_queries_are_not_coalesced_across_writes(self) -> None:
+        job_queue = SerialControllerJobQueue()
+        before = _query(b":VOL?;", address=b"A")
+        write = SerialControllerJob(
+            type=SerialControllerJobType.WRITE, message=b":VOL5.000;", address=b"A"
+        )
+        after = _query(b":VOL?;", address=b"A")
+        other = _query(b":VOL?;", address=b"B")
+        for job in (before, other, write, after, _query(b":VOL?;", address=b"B")):
+            job_queue.put(job)
+        self.assertIs(job_queue.get(b"A"), before)
+        self.assertIs(job_queue.get(b"A"), write)
+        self.assertIs(job_queue.get(b"A"), after)
+        # a write to one unit does not stop queries to another from merging
+        self.assertIs(job_queue.get(b"A"), other)
+        self.assertEqual(len(other.coalesced_futures), 1)
+        self.assertTrue(job_queue.empty())
+
+    def test_queries_for_other_addresses_are_not_coalesced(self) -> None:
+        job_queue = SerialControllerJobQueue()
+        a = _query(b":VOL?;", address=b"A")
+        b = _query(b":VOL?;", address=b"B")
+        job_queue.put(a)
+        job_queue.put(b)
+        self.assertIs(job_queue.get(b"A"), a)
+        self.assertIs(job_queue.get(b"A"), b)
+
+    def test_jobs_of_a_unit_wait_for_its_retries(self) -> None:
+        job_queue = SerialControllerJobQueue()
+        retried = _query(b":a?", address=b"A")
+        job_queue.put(retried)
+        self.assertIs(job_queue.get(None), retried)
+        job_queue.defer(retried)
+        same_unit, other_unit = _job(b"A"), _job(b"B")
+        job_queue.put(same_unit)
+        job_queue.put(other_unit)
+        self.assertIs(job_queue.get(b"A"), other_unit)
+        with self.assertRaises(queue.Empty):
+            job_queue.get(b"A", timeout=0.01)
+        self.assertFalse(job_queue.empty())
+        job_queue.put_retry(retried)
+        self.assertIs(job_queue.get(b"B"), retried)
+        self.assertIs(job_queue.get(b"A"), same_unit)
+        self.assertTrue(job_queue.empty())
+
+    def test_closing_drops_retries(self) -> None:
+        job_queue = SerialControllerJobQueue()
+        retried = _query(b":a?")
+        job_queue.put(retried)
+        job_queue.get(None)
+        job_queue.defer(retried)
+        self.assertEqual(job_queue.close(), [retried])
+        job_queue.put_retry(retried)
+        self.assertTrue(job_queue.empty())
+
+    def test_get_timeout(self) -> None:
+        with self.assertRaises(queue.Empty):
+            SerialControllerJobQueue().get(None, timeout=0.01)
@@ -0,0 +1,67 @@
+import threading
+from unittest import TestCase
+from unittest.mock import Mock
+
+from labby.hw.core import Device
+from labby.hw.core.sessions import DeviceSessionPool
+
+
+class DeviceSessionPoolTest(TestCase):
+    def setUp(self) -> None:
+        self.pool = DeviceSessionPool()
+        self.device = Mock(spec=Device)
+
+    def test_opens_once_and_keeps_devices_warm(self) -> None:
+        for _i in range(3):
+            with self.pool.session() as session:
+                self.assertIs(session.acquire(self.device), self.device)
+                self.assertEqual(self.pool.get_refcount(self.device), 1)
+        self.device.open.assert_called_once()
+        self.device.close.assert_not_called()
+        self.assertTrue(self.pool.is_open(self.device))
+        self.assertEqual(self.pool.get_refcount(self.device), 0)
+
+    def test_sessions_share_devices(self) -> None:
+        with self.pool.session() as first, self.pool.session() as second:
+            first.acquire(self.device)
+            first.acquire(self.device)
+            second.acquire(self.device)
+            self.assertEqual(self.pool.get_refcount(self.device), 2)
+        self.assertEqual(self.pool.get_refcount(self.device), 0)
+        self.device.open.assert_called_once()
+
+    def test_failing_to_open(self) -> None:
+        self.device.open.side_effect = Exception("Unavailable device")
+        with self.pool.session() as session:
+            with self.assertRaises(Exception):
+                session.acquire(self.device)
+        self.assertFalse(self.pool.is_open(self.device))
+        self.assertEqual(self.pool.get_refcount(self.device), 0)
+
+    def test_close(self) -> None:
+        idle_device = Mock(spec=Device)
+        with self.pool.session() as session:
+            session.acquire(idle_device)
+        session = self.pool.session()
+        session.acquire(self.device)
+
+        self.pool.close()
+        idle_device.close.assert_called_once()
+        # devices that are in use are closed once they are released
+        self.device.close.assert_not_called()
+        session.close()
+        self.device.close.assert_called_once()
+
+    def test_concurrent_sessions(self) -> None:
+        def _use_device() -> None:
+            for _i in range(100):
+                with self.pool.session() as session:
+                    session.acquire(self.device)
+
+        threads = [threading.Thread(target=_use_device) for _i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.device.open.assert_called_once()
+        self.assertEqual(self.pool.get_refcount(self.device), 0)
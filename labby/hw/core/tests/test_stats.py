@@ -0,0 +1,84 @@
+from unittest import TestCase
+
+from labby.hw.core.stats import (
+    ALL_COMMANDS,
+    RollingLatencies,
+    SerialPortStats,
+    get_command_prefix,
+)
+
+
+class RollingLatenciesTest(TestCase):
+    def test_empty_window(self) -> None:
+        summary = RollingLatencies().summarize()
+        self.assertEqual(summary.count, 0)
+        self.assertEqual(summary.p99_ms, 0.0)
+
+    def test_summary(self) -> None:
+        latencies = RollingLatencies()
+        for value in range(1, 101):
+            latencies.add(float(value))
+        summary = latencies.summarize()
+        self.assertEqual(summary.count, 100)
+        self.assertAlmostEqual(summary.mean_ms, 50.5)
+        self.assertAlmostEqual(latencies.get_mean(), 50.5)
+        self.assertAlmostEqual(summary.p50_ms, 51.0)
+        self.assertAlmostEqual(summary.p99_ms, 100.0)
+        self.assertAlmostEqual(summary.max_ms, 100.0)
+
+    def test_only_keeps_the_most_recent_samples(self) -> None:
+        latencies = RollingLatencies(window_size=3)
+        for value in (0.5, 20.0, 5.0, 5.0, 5.0):
+            latencies.add(value)
+        self.assertEqual(latencies.summarize().max_ms, 5.0)
+        self.assertAlmostEqual(latencies.get_mean(), 5.0)
+
+
+class SerialPortStatsTest(TestCase):
+    def test_command_prefix(self) -> None:
+        self.assertEqual(get_command_prefix(b":VOL?;"), ":VOL?")
+        self.assertEqual(get_command_prefix(b":VOL!;"), ":VOL!")
+        self.assertEqual(get_command_prefix(b":VOL4.250;"), ":VOL")
+        self.assertEqual(get_command_prefix(b":ADR01;"), ":ADR")
+        self.assertEqual(get_command_prefix(b"*IDN?\r\n"), "*IDN?")
+
+    def test_timings_are_aggregated_per_port_and_command(self) -> None:
+        stats = SerialPortStats("/dev/ttyUSB0")
+        stats.record_queue_wait(b":VOL?;", 0.001)
+        stats.record_write(b":VOL?;", 0.002)
+        stats.record_read(b":VOL?;", 0.003)
+        stats.record_write(b":VOL1.000;", 0.004)
+
+        summaries = {summary.command: summary for summary in stats.summarize()}
+        self.assertEqual(summaries.keys(), {ALL_COMMANDS, ":VOL?", ":VOL"})
+        self.assertEqual(summaries[ALL_COMMANDS].write.count, 2)
+        self.assertAlmostEqual(summaries[ALL_COMMANDS].write.max_ms, 4.0)
+        self.assertEqual(summaries[":VOL?"].queue_wait.count, 1)
+        self.assertAlmostEqual(summaries[":VOL?"].read.p50_ms, 3.0)
+        self.assertEqual(summaries[":VOL"].read.count, 0)
+        self.assertEqual(summaries[":VOL"].port, "/dev/ttyUSB0")
+
+    def test_missed_deadlines(self) -> None:
+        stats = SerialPortStats("/dev/ttyUSB0")
+        stats.record_missed_deadline(b":VOL?;")
+        stats.record_missed_deadline(b":CUR?;")
+        summaries = {summary.command: summary for summary in stats.summarize()}
+        self.assertEqual(summaries[ALL_COMMANDS].missed_deadlines, 2)
+        self.assertEqual(summaries[":VOL?"].missed_deadlines, 1)
+
+    def test_retries(self) -> None:
+        stats = SerialPortStats("/dev/ttyUSB0")
+        stats.record_retry(b":VOL?;")
+        summaries = {summary.command: summary for summary in stats.summarize()}
+        self.assertEqual(summaries[ALL_COMMANDS].retries, 1)
+        self.assertEqual(summaries[":VOL?"].retries, 1)
+
+    def test_estimates(self) -> None:
+        stats = SerialPortStats("/dev/ttyUSB0")
+        self.assertEqual(stats.estimate_ms(b":VOL?;", with_response=True), 0.0)
+        stats.record_write(b":VOL?;", 0.010)
+        stats.record_read(b":VOL?;", 0.020)
+        stats.record_write(b":OUT1;", 0.030)
+        self.assertAlmostEqual(stats.estimate_ms(b":VOL?;", with_response=True), 30.0)
+        self.assertAlmostEqual(stats.estimate_ms(b":OUT0;", with_response=False), 30.0)
+        self.assertAlmostEqual(stats.estimate_ms(b":CUR?;", with_response=True), 40.0)
@@ -0,0 +1,128 @@
+import asyncio
+import itertools
+import time
+from concurrent.futures import Future
+from typing import Iterator, List, Sequence
+from unittest import TestCase
+from unittest.mock import patch
+
+from labby.hw.core.streaming import (
+    MAX_SAMPLES_IN_FLIGHT,
+    SampleBatch,
+    get_batch_size,
+    pipeline,
+    poll,
+    poll_async,
+)
+from labby.hw.virtual.power_supply import PowerSupply
+from labby.tests.utils import patch_time
+
+
+class StreamingTest(TestCase):
+    def test_batch_size(self) -> None:
+        self.assertEqual(get_batch_size(100.0, None), 10)
+        self.assertEqual(get_batch_size(1.0, None), 1)
+        self.assertEqual(get_batch_size(100.0, 25), 25)
+        with self.assertRaises(ValueError):
+            get_batch_size(0.0, None)
+
+    def test_poll(self) -> None:
+        counter = itertools.count()
+        with patch_time("2020-08-08"):
+            stream = poll(lambda: [float(next(counter))], ["voltage"], 10.0, 4)
+            first = next(stream)
+            second = next(stream)
+        self.assertEqual(first.channels, ["voltage"])
+        self.assertEqual(first.values, [[0.0], [1.0], [2.0], [3.0]])
+        self.assertEqual(second.values, [[4.0], [5.0], [6.0], [7.0]])
+        # samples are evenly spaced, also across batches
+        timestamps = list(first.timestamps) + list(second.timestamps)
+        for (previous, current) in zip(timestamps, timestamps[1:]):
+            self.assertAlmostEqual(current - previous, 0.1, places=5)
+
+    def test_poll_ignores_wall_clock_adjustments(self) -> None:
+        with patch_time("2020-08-08"):
+            stream = poll(lambda: [0.0], ["voltage"], 10.0, 2)
+            next(stream)
+            with patch("time.time", return_value=time.time() - 3600.0), patch(
+                "time.sleep", wraps=time.sleep
+            ) as sleep_mock:
+                next(stream)
+        # setting the clock back does not hold up the next samples
+        for (args, _kwargs) in sleep_mock.call_args_list:
+            self.assertLessEqual(args[0], 0.1 + 1e-6)
+
+    def test_pipeline(self) -> None:
+        submitted: List["Future[int]"] = []
+
+        def _submit() -> "Future[int]":
+            future: "Future[int]" = Future()
+            future.set_result(len(submitted))
+            submitted.append(future)
+            return future
+
+        def _parse(value: int) -> Sequence[float]:
+            return [float(value), -float(value)]
+
+        with patch_time("2020-08-08"):
+            stream = pipeline(_submit, _parse, ["a", "b"], 100.0, 3)
+            batch = next(stream)
+        self.assertEqual(
+            batch, SampleBatch(["a", "b"], batch.timestamps, [[0, 0], [1, -1], [2, -2]])
+        )
+        self.assertLessEqual(len(submitted), 3 + MAX_SAMPLES_IN_FLIGHT)
+
+    def test_pipeline_keeps_requests_in_flight(self) -> None:
+        submitted: List["Future[int]"] = []
+
+        def _submit() -> "Future[int]":
+            future: "Future[int]" = Future()
+            submitted.append(future)
+            # a slow device, whose first response only comes back once the
+            # stream has as many requests in flight as it allows
+            if len(submitted) == MAX_SAMPLES_IN_FLIGHT:
+                for (index, pending_future) in enumerate(submitted):
+                    pending_future.set_result(index)
+            return future
+
+        # at this rate every sample is overdue by the time it is submitted
+        stream = pipeline(_submit, lambda value: [float(value)], ["v"], 1e6, 2)
+        batch = next(stream)
+        self.assertEqual(batch.values, [[0.0], [1.0]])
+        # taking the first response made room for another request
+        self.assertEqual(len(submitted), MAX_SAMPLES_IN_FLIGHT + 1)
+
+        # requests that are still in flight are cancelled along with the stream
+        stream.close()
+        self.assertTrue(submitted[-1].cancelled())
+
+    def test_poll_async(self) -> None:
+        counter: Iterator[int] = itertools.count()
+
+        async def _collect() -> List[SampleBatch]:
+            batches: List[SampleBatch] = []
+            stream = poll_async(lambda: [float(next(counter))], ["voltage"], 200.0, 2)
+            async for batch in stream:
+                batches.append(batch)
+                if len(batches) == 2:
+                    break
+            return batches
+
+        batches = asyncio.run(_collect())
+        self.assertEqual([batch.values for batch in batches], [[[0], [1]], [[2], [3]]])
+
+
+class DeviceStreamTest(TestCase):
+    def test_power_supply_stream(self) -> None:
+        power_supply = PowerSupply(4)
+        power_supply.set_target_voltage(8)
+        power_supply.set_target_current(3)
+        power_supply.set_output_on(True)
+        with patch_time("2020-08-08"):
+            batch = next(power_supply.stream(["voltage", "current"], 100.0))
+        self.assertEqual(len(batch.values), 10)
+        self.assertEqual(batch.values[0], [8.0, 2.0])
+
+    def test_unknown_channel(self) -> None:
+        with self.assertRaisesRegex(ValueError, "Unknown channel"):
+            PowerSupply(4).read_channels(["foobar"])
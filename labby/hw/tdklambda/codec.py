@@ -0,0 +1,154 @@
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, Generic, Pattern, TypeVar
+
+from labby.hw.core.exceptions import HardwareIOError
+from labby.hw.core.power_supply import PowerSupplyMode
+
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class OperationalStatusRegister:
+    mode: PowerSupplyMode
+
+
+@dataclass(frozen=True)
+class ZUPQuery(Generic[T]):
+    command: bytes
+    parse: Callable[[str], T]
+
+
+@dataclass(frozen=True)
+class ZUPSetter:
+    command: str
+    format: str
+
+    def encode(self, value: float, maximum: float) -> bytes:
+        if not 0.0 <= value <= maximum:
+            raise ValueError(f"{value} is out of range for {self.command}")
+        return bytes(f"{self.command}{value:{self.format}};", "ascii")
+
+    def quantize(self, value: float) -> float:
+        # what the unit ends up set to, given the digits we send
+        return float(f"{value:{self.format}}")
+
+
+@dataclass(frozen=True)
+class ZUPModel:
+    name: str
+    max_voltage: float
+    max_current: float
+    # how setpoints are formatted, as the number of digits varies with ratings
+    voltage_format: str = ".3f"
+    current_format: str = "06.2f"
+
+    @property
+    def voltage_setter(self) -> ZUPSetter:
+        return ZUPSetter(":VOL", self.voltage_format)
+
+    @property
+    def current_setter(self) -> ZUPSetter:
+        return ZUPSetter(":CUR", self.current_format)
+
+
+def _parse_float(response_regex: str) -> Callable[[str], float]:
+    regex: Pattern[str] = re.compile(response_regex)
+
+    def _parse(response: str) -> float:
+        match = regex.fullmatch(response)
+        if match is None:
+            raise HardwareIOError(f"Could not parse response: {response}")
+        return float(match.group(1))
+
+    return _parse
+
+
+def _parse_output(response: str) -> bool:
+    if response == "OT1":
+        return True
+    if response == "OT0":
+        return False
+    raise HardwareIOError(f"Could not parse response: {response}")
+
+
+_STATUS_REGEX: Pattern[str] = re.compile(r"OS([0-9])[0-9]*")
+
+
+def _parse_status(response: str) -> OperationalStatusRegister:
+    match = _STATUS_REGEX.fullmatch(response)
+    if match is None:
+        raise HardwareIOError(f"Could not parse response: {response}")
+    return OperationalStatusRegister(mode=PowerSupplyMode(int(match.group(1))))
+
+
+def _parse_text(response: str) -> str:
+    return response
+
+
+MODEL: ZUPQuery[str] = ZUPQuery(b":MDL?;", _parse_text)
+SOFTWARE_VERSION: ZUPQuery[str] = ZUPQuery(b":REV?;", _parse_text)
+OUTPUT: ZUPQuery[bool] = ZUPQuery(b":OUT?;", _parse_output)
+STATUS: ZUPQuery[OperationalStatusRegister] = ZUPQuery(b":STA?;", _parse_status)
+TARGET_VOLTAGE: ZUPQuery[float] = ZUPQuery(
+    b":VOL!;", _parse_float(r"SV([0-9]+\.[0-9]+)")
+)
+ACTUAL_VOLTAGE: ZUPQuery[float] = ZUPQuery(
+    b":VOL?;", _parse_float(r"AV([0-9]+\.[0-9]+)")
+)
+TARGET_CURRENT: ZUPQuery[float] = ZUPQuery(
+    b":CUR!;", _parse_float(r"SA([0-9]+\.[0-9]+)")
+)
+ACTUAL_CURRENT: ZUPQuery[float] = ZUPQuery(
+    b":CUR?;", _parse_float(r"AA([0-9]+\.[0-9]+)")
+)
+
+OUTPUT_ON = b":OUT1;"
+OUTPUT_OFF = b":OUT0;"
+
+# used until the model of the unit is known, so setpoints are only checked
+# for being non-negative
+UNKNOWN_MODEL = ZUPModel("ZUP", max_voltage=float("inf"), max_current=float("inf"))
+
+ZUP_MODELS: Dict[str, ZUPModel] = {
+    model.name: model
+    for model in (
+        ZUPModel("ZUP6-33", 6.0, 33.0),
+        ZUPModel("ZUP6-66", 6.0, 66.0),
+        ZUPModel("ZUP6-132", 6.0, 132.0),
+        ZUPModel("ZUP10-20", 10.0, 20.0),
+        ZUPModel("ZUP10-40", 10.0, 40.0),
+        ZUPModel("ZUP10-80", 10.0, 80.0),
+        ZUPModel("ZUP20-10", 20.0, 10.0),
+        ZUPModel("ZUP20-20", 20.0, 20.0),
+        ZUPModel("ZUP20-40", 20.0, 40.0),
+        ZUPModel("ZUP36-6", 36.0, 6.0),
+        ZUPModel("ZUP36-12", 36.0, 12.0),
+        ZUPModel("ZUP36-24", 36.0, 24.0),
+        ZUPModel("ZUP60-3.5", 60.0, 3.5),
+        ZUPModel("ZUP60-7", 60.0, 7.0),
+        ZUPModel("ZUP60-14", 60.0, 14.0),
+        ZUPModel("ZUP80-2.5", 80.0, 2.5),
+        ZUPModel("ZUP80-5", 80.0, 5.0),
+        ZUPModel("ZUP120-1.8", 120.0, 1.8),
+        ZUPModel("ZUP120-3.6", 120.0, 3.6),
+    )
+}
+
+# units report their model as, say, "Nemic-Lambda ZUP(6V-33A)"
+_MODEL_REGEX: Pattern[str] = re.compile(r"ZUP\(([0-9.]+)V-([0-9.]+)A\)")
+
+
+def get_model(name_or_response: str) -> ZUPModel:
+    model = ZUP_MODELS.get(name_or_response)
+    if model is not None:
+        return model
+    match = _MODEL_REGEX.search(name_or_response)
+    if match is None:
+        raise ValueError(f"Unknown ZUP model: {name_or_response}")
+    name = f"ZUP{match.group(1)}-{match.group(2)}"
+    return ZUP_MODELS.get(
+        name,
+        ZUPModel(name, float(match.group(1)), float(match.group(2))),
+    )
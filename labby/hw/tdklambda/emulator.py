@@ -0,0 +1,187 @@
+import os
+import re
+import select
+import threading
+import time
+import tty
+from types import TracebackType
+from typing import Dict, Optional, Pattern, Sequence, Type
+
+from labby.hw.virtual.power_supply import PowerSupply
+
+
+# 8N1 framing puts a start and a stop bit around every byte
+BITS_PER_CHARACTER = 10
+DEFAULT_MODEL = "Nemic-Lambda ZUP(6V-33A)"
+DEFAULT_SOFTWARE_VERSION = "Ver 6-33 1.8"
+
+_COMMAND_REGEX: Pattern[bytes] = re.compile(rb"^:([A-Z]{3})(.*)$")
+
+
+class ZUPEmulatorUnit(PowerSupply):
+    address: int
+    model: str
+    software_version: str
+
+    def __init__(
+        self,
+        address: int,
+        load_in_ohms: float,
+        model: str = DEFAULT_MODEL,
+        software_version: str = DEFAULT_SOFTWARE_VERSION,
+    ) -> None:
+        super().__init__(load_in_ohms)
+        self.address = address
+        self.model = model
+        self.software_version = software_version
+
+    def handle(self, command: str, argument: str) -> Optional[str]:
+        if command == "MDL" and argument == "?":
+            return self.model
+        if command == "REV" and argument == "?":
+            return self.software_version
+        if command == "STA" and argument == "?":
+            return f"OS{self.get_mode().value}0000000"
+        if command == "OUT":
+            if argument == "?":
+                return "OT1" if self.is_output_on() else "OT0"
+            self.set_output_on(argument == "1")
+            return None
+        if command == "VOL":
+            if argument == "!":
+                return f"SV{self.get_target_voltage():06.3f}"
+            if argument == "?":
+                return f"AV{self.get_actual_voltage():06.3f}"
+            self.set_target_voltage(float(argument))
+            return None
+        if command == "CUR":
+            if argument == "!":
+                return f"SA{self.get_target_current():06.3f}"
+            if argument == "?":
+                return f"AA{self.get_actual_current():06.3f}"
+            self.set_target_current(float(argument))
+            return None
+        return None
+
+
+class ZUPEmulator(threading.Thread):
+    port: str
+    baudrate: int
+    turnaround_ms: float
+    units: Dict[int, ZUPEmulatorUnit]
+    selected_address: Optional[int]
+    num_commands: int
+
+    _master: int
+    _slave: int
+    _stopped: threading.Event
+    _receive_line_free_at: float
+    _transmit_line_free_at: float
+
+    def __init__(
+        self,
+        baudrate: int = 9600,
+        addresses: Sequence[int] = (1,),
+        turnaround_ms: float = 5.0,
+        load_in_ohms: float = 5.0,
+    ) -> None:
+        super().__init__()
+        self.daemon = True
+        self.baudrate = baudrate
+        self.turnaround_ms = turnaround_ms
+        self.units = {
+            address: ZUPEmulatorUnit(address, load_in_ohms) for address in addresses
+        }
+        self.selected_address = None
+        self.num_commands = 0
+
+        self._master, self._slave = os.openpty()
+        # keeping the slave end open means that reads from the master do not
+        # fail in between clients, and raw mode keeps it from echoing commands
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._stopped = threading.Event()
+        self._receive_line_free_at = 0.0
+        self._transmit_line_free_at = 0.0
+
+    def _get_transmission_time(self, num_bytes: int) -> float:
+        return num_bytes * BITS_PER_CHARACTER / self.baudrate
+
+    def _sleep_until(self, deadline: float) -> None:
+        delay = deadline - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _handle(self, message: bytes) -> Optional[bytes]:
+        match = _COMMAND_REGEX.match(message)
+        if match is None:
+            return None
+        command = match.group(1).decode("ascii")
+        argument = match.group(2).decode("ascii")
+        if command == "ADR":
+            address = int(argument)
+            self.selected_address = address if address in self.units else None
+            return None
+        selected_address = self.selected_address
+        if selected_address is None:
+            return None
+        try:
+            response = self.units[selected_address].handle(command, argument)
+        except ValueError:
+            return None
+        return None if response is None else bytes(response + "\r\n", "ascii")
+
+    def _process(self, message: bytes, received_at: float) -> None:
+        self.num_commands += 1
+        # the command is only complete once its last byte made it through the
+        # line, and the unit then takes a while before it starts to answer
+        self._receive_line_free_at = max(
+            received_at, self._receive_line_free_at
+        ) + self._get_transmission_time(len(message) + len(b";"))
+        # not reading any further until then throttles writers to line speed
+        self._sleep_until(self._receive_line_free_at)
+        response = self._handle(message)
+        if response is None:
+            return
+        ready_at = self._receive_line_free_at + self.turnaround_ms / 1000.0
+        self._transmit_line_free_at = max(
+            ready_at, self._transmit_line_free_at
+        ) + self._get_transmission_time(len(response))
+        self._sleep_until(self._transmit_line_free_at)
+        os.write(self._master, response)
+
+    def run(self) -> None:
+        pending = b""
+        while not self._stopped.is_set():
+            readable, _, _ = select.select([self._master], [], [], 0.01)
+            if not readable:
+                continue
+            try:
+                data = os.read(self._master, 1024)
+            except OSError:
+                continue
+            received_at = time.time()
+            pending += data
+            while b";" in pending:
+                message, _, pending = pending.partition(b";")
+                self._process(message.strip(), received_at)
+
+    def close(self) -> None:
+        self._stopped.set()
+        if self.is_alive():
+            self.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def __enter__(self) -> "ZUPEmulator":
+        self.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> bool:
+        self.close()
+        return False
@@ -1,103 +1,237 @@
-import re
-from dataclasses import dataclass
-from typing import Match
+from typing import Dict, Generator, List, Mapping, Optional, Sequence, TypeVar
 
 from labby.hw.core.power_supply import (
     PowerSupply,
     PowerSupplyMode,
+    PowerSupplySnapshot,
+    Setpoint,
+    SetpointShadow,
+    TSetpoint,
 )
 from labby.hw.core.exceptions import HardwareIOError
+from labby.hw.core.retry import RetryPolicy
 from labby.hw.core.serial import SerialDevice
+from labby.hw.core import streaming
+from labby.hw.core.streaming import SampleBatch
+from labby.hw.tdklambda import codec
+from labby.hw.tdklambda.codec import (
+    OperationalStatusRegister,
+    ZUPModel,
+    ZUPQuery,
+    ZUPSetter,
+)
 
 
 TIMEOUT_MS = 2000
+DEFAULT_RECONCILE_INTERVAL_MS = 5000.0
 
+T = TypeVar("T")
 
-@dataclass(frozen=True)
-class OperationalStatusRegister:
-    mode: PowerSupplyMode
+CHANNEL_QUERIES: Dict[str, ZUPQuery[float]] = {
+    "voltage": codec.ACTUAL_VOLTAGE,
+    "current": codec.ACTUAL_CURRENT,
+    "target_voltage": codec.TARGET_VOLTAGE,
+    "target_current": codec.TARGET_CURRENT,
+}
 
 
 class ZUP(SerialDevice, PowerSupply):
     WAIT_TIME_AFTER_WRITE_MS: float = 50.0
+    # rides out the USB adapter re-enumerating, which takes a couple seconds
+    RETRY_POLICY: RetryPolicy = RetryPolicy(max_retries=5)
+    QUERY_CACHE_TTL_MS: Mapping[bytes, Optional[float]] = {
+        codec.MODEL.command: None,
+        codec.SOFTWARE_VERSION.command: None,
+    }
 
     address: int
-
-    def __init__(self, port: str, baudrate: int, address: int = 1) -> None:
+    model: ZUPModel
+    setpoints: SetpointShadow
+
+    def __init__(
+        self,
+        port: str,
+        baudrate: int,
+        address: int = 1,
+        idle_timeout_ms: float = 0.0,
+        model: Optional[str] = None,
+        reconcile_interval_ms: float = DEFAULT_RECONCILE_INTERVAL_MS,
+    ) -> None:
         SerialDevice.__init__(
             self,
             port,
             baudrate,
             xonxoff=True,
             timeout_ms=TIMEOUT_MS,
+            idle_timeout_ms=idle_timeout_ms,
         )
         self.address = address
+        self.bus_address = bytes(f":ADR{address:02d};", "utf-8")
+        # setpoints are checked against the ratings of the unit once we know
+        # them, either from the config or from what the unit reports
+        self.model = codec.UNKNOWN_MODEL if model is None else codec.get_model(model)
+        # what we last commanded, so reading it back does not cost a query
+        self.setpoints = SetpointShadow(
+            reconcile_interval_ms, f"{port} (address {address})"
+        )
 
     def __enter__(self) -> "ZUP":
         PowerSupply.__enter__(self)
         return self
 
     def _on_open(self) -> None:
-        self._write(bytes(f":ADR{self.address:02d};", "utf-8"))
+        self._select_bus_address()
+
+    def _read(self, query: ZUPQuery[T]) -> T:
+        return query.parse(self._query(query.command))
+
+    def _read_setpoint(
+        self, setpoint: Setpoint[TSetpoint], query: ZUPQuery[TSetpoint]
+    ) -> TSetpoint:
+        value = setpoint.get()
+        if value is not None:
+            return value
+        generation = setpoint.generation
+        return setpoint.reconcile(self._read(query), generation)
+
+    def _write_setpoint(
+        self, setpoint: Setpoint[float], setter: ZUPSetter, value: float, maximum: float
+    ) -> None:
+        self._write(setter.encode(value, maximum))
+        setpoint.set(setter.quantize(value))
 
     def _read_operational_status_register(self) -> OperationalStatusRegister:
-        response = self._query(b":STA?;")
-        return OperationalStatusRegister(mode=PowerSupplyMode(int(response[2])))
+        return self._read(codec.STATUS)
 
     def get_mode(self) -> PowerSupplyMode:
         return self._read_operational_status_register().mode
 
     def test_connection(self) -> None:
         try:
-            model = self.get_model()
-            assert len(model) > 0
+            # the model is cached for good, so it would not tell whether the
+            # unit is still there
+            self._read_operational_status_register()
         except Exception:
             raise HardwareIOError
 
     def get_model(self) -> str:
-        return self._query(b":MDL?;")
+        model = self._read(codec.MODEL)
+        if self.model is codec.UNKNOWN_MODEL:
+            try:
+                self.model = codec.get_model(model)
+            except ValueError:
+                pass
+        return model
 
     def is_output_on(self) -> bool:
-        return self._query(b":OUT?;") == "OT1"
+        return self._read_setpoint(self.setpoints.is_output_on, codec.OUTPUT)
 
     def set_output_on(self, is_on: bool) -> None:
-        self._write(b":OUT1;" if is_on else b":OUT0;")
+        self._write(codec.OUTPUT_ON if is_on else codec.OUTPUT_OFF)
+        self.setpoints.is_output_on.set(is_on)
 
-    def get_software_version(self) -> str:
-        return self._query(b":REV?;")
+    def get_setpoint_drift_count(self) -> int:
+        return self.setpoints.get_drift_count()
 
-    def _re_search(self, regex: str, line: str) -> Match[str]:
-        search = re.search(regex, line)
-        if search is None:
-            raise HardwareIOError(f"Could not parse response: {line}")
-        return search
+    def get_software_version(self) -> str:
+        return self._read(codec.SOFTWARE_VERSION)
 
     def get_target_voltage(self) -> float:
-        response = self._query(b":VOL!;")
-        search = self._re_search("^SV([0-9]+\\.[0-9]+)$", response)
-        return float(search.group(1))
+        return self._read_setpoint(self.setpoints.target_voltage, codec.TARGET_VOLTAGE)
 
     def get_actual_voltage(self) -> float:
-        response = self._query(b":VOL?;")
-        search = self._re_search("^AV([0-9]+\\.[0-9]+)$", response)
-        return float(search.group(1))
+        return self._read(codec.ACTUAL_VOLTAGE)
 
     def get_target_current(self) -> float:
-        response = self._query(b":CUR!;")
-        search = self._re_search("^SA([0-9]+\\.[0-9]+)$", response)
-        return float(search.group(1))
+        return self._read_setpoint(self.setpoints.target_current, codec.TARGET_CURRENT)
 
     def get_actual_current(self) -> float:
-        response = self._query(b":CUR?;")
-        search = self._re_search("^AA([0-9]+\\.[0-9]+)$", response)
-        return float(search.group(1))
+        return self._read(codec.ACTUAL_CURRENT)
+
+    def get_snapshot(self) -> PowerSupplySnapshot:
+        # a single transaction keeps the readings consistent with each other
+        # and saves five round trips worth of turnaround time
+        setpoints = self.setpoints
+        generations = (
+            setpoints.is_output_on.generation,
+            setpoints.target_voltage.generation,
+            setpoints.target_current.generation,
+        )
+        (
+            output,
+            status,
+            target_voltage,
+            target_current,
+            actual_voltage,
+            actual_current,
+        ) = self._query_many(
+            [
+                codec.OUTPUT.command,
+                codec.STATUS.command,
+                codec.TARGET_VOLTAGE.command,
+                codec.TARGET_CURRENT.command,
+                codec.ACTUAL_VOLTAGE.command,
+                codec.ACTUAL_CURRENT.command,
+            ]
+        )
+        # the setpoints that came along double as a reconciliation
+        return PowerSupplySnapshot(
+            is_output_on=setpoints.is_output_on.reconcile(
+                codec.OUTPUT.parse(output), generations[0]
+            ),
+            mode=codec.STATUS.parse(status).mode,
+            target_voltage=setpoints.target_voltage.reconcile(
+                codec.TARGET_VOLTAGE.parse(target_voltage), generations[1]
+            ),
+            target_current=setpoints.target_current.reconcile(
+                codec.TARGET_CURRENT.parse(target_current), generations[2]
+            ),
+            actual_voltage=codec.ACTUAL_VOLTAGE.parse(actual_voltage),
+            actual_current=codec.ACTUAL_CURRENT.parse(actual_current),
+        )
+
+    def _get_channel_queries(self, channels: Sequence[str]) -> List[ZUPQuery[float]]:
+        for channel in channels:
+            if channel not in CHANNEL_QUERIES:
+                raise ValueError(f"Unknown channel: {channel}")
+        return [CHANNEL_QUERIES[channel] for channel in channels]
+
+    def read_channels(self, channels: Sequence[str]) -> Sequence[float]:
+        queries = self._get_channel_queries(channels)
+        responses = self._query_many([query.command for query in queries])
+        return [query.parse(r) for (query, r) in zip(queries, responses)]
+
+    def stream(
+        self, channels: Sequence[str], rate: float, batch_size: Optional[int] = None
+    ) -> Generator[SampleBatch, None, None]:
+        queries: List[ZUPQuery[float]] = self._get_channel_queries(channels)
+        commands = [query.command for query in queries]
+
+        def _parse(responses: List[str]) -> Sequence[float]:
+            return [query.parse(r) for (query, r) in zip(queries, responses)]
+
+        # every sample is a single transaction, and they are queued up without
+        # waiting for the previous one to come back
+        return streaming.pipeline(
+            lambda: self._submit_query_many(commands),
+            _parse,
+            channels,
+            rate,
+            batch_size,
+        )
 
     def set_target_voltage(self, voltage: float) -> None:
-        # TODO: assert voltage is within range
-        command = bytes(f":VOL{voltage:.3f};", "utf-8")
-        self._write(command)
+        self._write_setpoint(
+            self.setpoints.target_voltage,
+            self.model.voltage_setter,
+            voltage,
+            self.model.max_voltage,
+        )
 
     def set_target_current(self, current: float) -> None:
-        # TODO: assert current is within range
-        command = bytes(f":CUR{current:06.2f};", "utf-8")
-        self._write(command)
+        self._write_setpoint(
+            self.setpoints.target_current,
+            self.model.current_setter,
+            current,
+            self.model.max_current,
+        )
@@ -0,0 +1,56 @@
+from unittest import TestCase
+
+from labby.hw.core.exceptions import HardwareIOError
+from labby.hw.core.power_supply import PowerSupplyMode
+from labby.hw.tdklambda import codec
+
+
+class CodecTest(TestCase):
+    def test_parse_floats(self) -> None:
+        self.assertAlmostEqual(codec.TARGET_VOLTAGE.parse("SV05.250"), 5.25)
+        self.assertAlmostEqual(codec.ACTUAL_VOLTAGE.parse("AV1.33"), 1.33)
+        self.assertAlmostEqual(codec.TARGET_CURRENT.parse("SA0.01"), 0.01)
+        self.assertAlmostEqual(codec.ACTUAL_CURRENT.parse("AA132.00"), 132.0)
+
+    def test_parse_rejects_other_responses(self) -> None:
+        with self.assertRaisesRegex(HardwareIOError, "Could not parse response"):
+            codec.TARGET_VOLTAGE.parse("AV1.33")
+        with self.assertRaisesRegex(HardwareIOError, "Could not parse response"):
+            codec.ACTUAL_CURRENT.parse("AA1.33 ")
+        with self.assertRaisesRegex(HardwareIOError, "Could not parse response"):
+            codec.OUTPUT.parse("OT2")
+        with self.assertRaisesRegex(HardwareIOError, "Could not parse response"):
+            codec.STATUS.parse("foobar")
+
+    def test_parse_status(self) -> None:
+        self.assertEqual(
+            codec.STATUS.parse("OS100000000").mode, PowerSupplyMode.CONSTANT_CURRENT
+        )
+        self.assertEqual(
+            codec.STATUS.parse("OS000000000").mode, PowerSupplyMode.CONSTANT_VOLTAGE
+        )
+
+    def test_encode_setpoints(self) -> None:
+        model = codec.ZUP_MODELS["ZUP6-33"]
+        self.assertEqual(model.voltage_setter.encode(4.25, 6.0), b":VOL4.250;")
+        self.assertEqual(model.current_setter.encode(1.23, 33.0), b":CUR001.23;")
+
+    def test_encode_checks_range(self) -> None:
+        setter = codec.ZUP_MODELS["ZUP6-33"].voltage_setter
+        self.assertEqual(setter.encode(6.0, 6.0), b":VOL6.000;")
+        with self.assertRaises(ValueError):
+            setter.encode(6.01, 6.0)
+        with self.assertRaises(ValueError):
+            setter.encode(-0.1, 6.0)
+
+    def test_get_model(self) -> None:
+        self.assertIs(codec.get_model("ZUP60-3.5"), codec.ZUP_MODELS["ZUP60-3.5"])
+        self.assertIs(
+            codec.get_model("Nemic-Lambda ZUP(6V-33A)"), codec.ZUP_MODELS["ZUP6-33"]
+        )
+        # models missing from the table still get their ratings from the name
+        model = codec.get_model("Nemic-Lambda ZUP(12V-4A)")
+        self.assertEqual(model.max_voltage, 12.0)
+        self.assertEqual(model.max_current, 4.0)
+        with self.assertRaises(ValueError):
+            codec.get_model("FOOBAR")
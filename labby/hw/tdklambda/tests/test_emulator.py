@@ -0,0 +1,71 @@
+import time
+from unittest import TestCase
+
+from labby.hw.core.power_supply import PowerSupplyMode
+from labby.hw.core.serial import SERIAL_CONTROLLERS
+from labby.hw.tdklambda.emulator import DEFAULT_MODEL, ZUPEmulator
+from labby.hw.tdklambda.power_supply import ZUP
+
+
+class ZUPEmulatorTest(TestCase):
+    def tearDown(self) -> None:
+        self.assertEqual(len(SERIAL_CONTROLLERS), 0)
+
+    def test_driver(self) -> None:
+        with ZUPEmulator(baudrate=115200, turnaround_ms=0.0) as emulator:
+            with ZUP(emulator.port, 115200) as power_supply:
+                self.assertEqual(power_supply.get_model(), DEFAULT_MODEL)
+                power_supply.set_target_voltage(5.0)
+                power_supply.set_target_current(0.5)
+                power_supply.set_output_on(True)
+                self.assertTrue(power_supply.is_output_on())
+                self.assertAlmostEqual(power_supply.get_target_voltage(), 5.0)
+                self.assertAlmostEqual(power_supply.get_actual_voltage(), 2.5)
+                self.assertAlmostEqual(power_supply.get_actual_current(), 0.5)
+                self.assertEqual(
+                    power_supply.get_mode(), PowerSupplyMode.CONSTANT_CURRENT
+                )
+                snapshot = power_supply.get_snapshot()
+                self.assertTrue(snapshot.is_output_on)
+                self.assertEqual(snapshot.mode, PowerSupplyMode.CONSTANT_CURRENT)
+                self.assertAlmostEqual(snapshot.target_current, 0.5)
+                self.assertAlmostEqual(snapshot.actual_voltage, 2.5)
+
+    def test_stream(self) -> None:
+        with ZUPEmulator(baudrate=115200, turnaround_ms=0.0) as emulator:
+            with ZUP(emulator.port, 115200) as power_supply:
+                power_supply.WAIT_TIME_AFTER_WRITE_MS = 0.0
+                power_supply.set_target_voltage(5.0)
+                power_supply.set_target_current(0.5)
+                power_supply.set_output_on(True)
+                stream = power_supply.stream(["voltage", "current"], 100.0, 5)
+                batch = next(stream)
+                stream.close()
+                self.assertEqual(batch.channels, ["voltage", "current"])
+                self.assertEqual(len(batch.timestamps), 5)
+                for values in batch.values:
+                    self.assertAlmostEqual(values[0], 2.5)
+                    self.assertAlmostEqual(values[1], 0.5)
+
+    def test_multiple_addresses(self) -> None:
+        with ZUPEmulator(
+            baudrate=115200, addresses=(1, 2), turnaround_ms=0.0
+        ) as emulator:
+            with ZUP(emulator.port, 115200, address=1) as first, ZUP(
+                emulator.port, 115200, address=2
+            ) as second:
+                first.set_target_voltage(1.0)
+                second.set_target_voltage(2.0)
+                self.assertAlmostEqual(first.get_target_voltage(), 1.0)
+                self.assertAlmostEqual(second.get_target_voltage(), 2.0)
+        self.assertAlmostEqual(emulator.units[1].target_voltage, 1.0)
+        self.assertAlmostEqual(emulator.units[2].target_voltage, 2.0)
+
+    def test_transmission_and_turnaround_time(self) -> None:
+        with ZUPEmulator(baudrate=1200, turnaround_ms=50.0) as emulator:
+            with ZUP(emulator.port, 1200) as power_supply:
+                start_time = time.time()
+                power_supply.get_actual_voltage()
+                elapsed_time = time.time() - start_time
+        # 6 bytes out and 8 bytes back at 120 bytes per second, plus turnaround
+        self.assertGreaterEqual(elapsed_time, 14 / 120 + 0.05)
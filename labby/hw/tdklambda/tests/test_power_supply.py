@@ -1,11 +1,13 @@
+import time
 from unittest import TestCase
-from unittest.mock import Mock
+from unittest.mock import Mock, call
 
 from labby.hw.core.exceptions import HardwareIOError
-from labby.hw.core.power_supply import PowerSupplyMode
+from labby.hw.core.power_supply import PowerSupplyMode, PowerSupplySnapshot
+from labby.hw.core.retry import RetryPolicy
 from labby.hw.tdklambda import power_supply as tdklambda_power_supply
 from labby.tests.utils import fake_serial_port
-from serial import EIGHTBITS, PARITY_NONE, STOPBITS_ONE
+from serial import EIGHTBITS, PARITY_NONE, STOPBITS_ONE, SerialException
 
 
 class ZUPTest(TestCase):
@@ -31,6 +33,61 @@ class ZUPTest(TestCase):
         with tdklambda_power_supply.ZUP("/dev/ttyUSB0", 9600, address=42):
             serial_port_mock.write.assert_called_once_with(b":ADR42;")
 
+    def test_idle_timeout(self) -> None:
+        power_supply = tdklambda_power_supply.ZUP("/dev/ttyUSB0", 9600)
+        self.assertEqual(power_supply.idle_timeout_ms, 0.0)
+        power_supply = tdklambda_power_supply.ZUP(
+            "/dev/ttyUSB0", 9600, idle_timeout_ms=30000
+        )
+        self.assertEqual(power_supply.idle_timeout_ms, 30000)
+
+    @fake_serial_port
+    def test_multiple_addresses_on_the_same_port(self, serial_port_mock: Mock) -> None:
+        with tdklambda_power_supply.ZUP(
+            "/dev/ttyUSB0", 9600, address=1
+        ) as first, tdklambda_power_supply.ZUP(
+            "/dev/ttyUSB0", 9600, address=2
+        ) as second:
+            self.assertIs(first.serial_controller, second.serial_controller)
+            serial_port_mock.reset_mock()
+            second.set_output_on(True)
+            second.set_output_on(False)
+            first.set_output_on(True)
+            second.set_output_on(True)
+            self.assertEqual(
+                serial_port_mock.write.call_args_list,
+                [
+                    call(b":OUT1;"),
+                    call(b":OUT0;"),
+                    call(b":ADR01;"),
+                    call(b":OUT1;"),
+                    call(b":ADR02;"),
+                    call(b":OUT1;"),
+                ],
+            )
+
+    @fake_serial_port
+    def test_reopening_does_not_reselect_the_address(
+        self, serial_port_mock: Mock
+    ) -> None:
+        power_supply = tdklambda_power_supply.ZUP(
+            "/dev/ttyUSB0", 9600, idle_timeout_ms=60000
+        )
+        with power_supply:
+            serial_port_mock.write.assert_called_once_with(b":ADR01;")
+        with power_supply:
+            power_supply.set_output_on(True)
+        self.assertEqual(
+            serial_port_mock.write.call_args_list, [call(b":ADR01;"), call(b":OUT1;")]
+        )
+        # shut the port down right away
+        serial_controller = power_supply.serial_controller
+        serial_controller.idle_timeout_ms = 0.0
+        power_supply.idle_timeout_ms = 0.0
+        power_supply.open()
+        power_supply.close()
+        serial_controller.join()
+
     @fake_serial_port
     def test_closes_automatically_from_with_block(self, serial_port_mock: Mock) -> None:
         with tdklambda_power_supply.ZUP("/dev/ttyUSB0", 9600):
@@ -59,11 +116,38 @@ class ZUPTest(TestCase):
             power_supply.set_target_current(1.23)
             serial_port_mock.write.assert_called_once_with(b":CUR001.23;")
 
+    @fake_serial_port
+    def test_setpoints_are_checked_against_configured_model(
+        self, serial_port_mock: Mock
+    ) -> None:
+        with tdklambda_power_supply.ZUP(
+            "/dev/ttyUSB0", 9600, model="ZUP6-33"
+        ) as power_supply:
+            serial_port_mock.reset_mock()
+            with self.assertRaises(ValueError):
+                power_supply.set_target_voltage(6.5)
+            with self.assertRaises(ValueError):
+                power_supply.set_target_current(-1.0)
+            serial_port_mock.write.assert_not_called()
+
+    @fake_serial_port
+    def test_setpoints_are_checked_against_reported_model(
+        self, serial_port_mock: Mock
+    ) -> None:
+        with tdklambda_power_supply.ZUP("/dev/ttyUSB0", 9600) as power_supply:
+            power_supply.set_target_voltage(20.0)
+            serial_port_mock.read.return_value = b"Nemic-Lambda ZUP(6V-33A)\r\n"
+            power_supply.get_model()
+            serial_port_mock.reset_mock()
+            with self.assertRaises(ValueError):
+                power_supply.set_target_voltage(20.0)
+            serial_port_mock.write.assert_not_called()
+
     @fake_serial_port
     def test_get_model(self, serial_port_mock: Mock) -> None:
         with tdklambda_power_supply.ZUP("/dev/ttyUSB0", 9600) as power_supply:
             serial_port_mock.reset_mock()
-            serial_port_mock.readline.return_value = b"FOOBAR\r\n"
+            serial_port_mock.read.return_value = b"FOOBAR\r\n"
             returned_model = power_supply.get_model()
             serial_port_mock.write.assert_called_once_with(b":MDL?;")
             self.assertEqual(returned_model, "FOOBAR")
@@ -72,7 +156,7 @@ class ZUPTest(TestCase):
     def test_get_software_version(self, serial_port_mock: Mock) -> None:
         with tdklambda_power_supply.ZUP("/dev/ttyUSB0", 9600) as power_supply:
             serial_port_mock.reset_mock()
-            serial_port_mock.readline.return_value = b"V4.2.0\r\n"
+            serial_port_mock.read.return_value = b"V4.2.0\r\n"
             returned_version = power_supply.get_software_version()
             serial_port_mock.write.assert_called_once_with(b":REV?;")
             self.assertEqual(returned_version, "V4.2.0")
@@ -81,12 +165,13 @@ class ZUPTest(TestCase):
     def test_is_output_on(self, serial_port_mock: Mock) -> None:
         with tdklambda_power_supply.ZUP("/dev/ttyUSB0", 9600) as power_supply:
             serial_port_mock.reset_mock()
-            serial_port_mock.readline.return_value = b"OT1\r\n"
+            serial_port_mock.read.return_value = b"OT1\r\n"
             self.assertTrue(power_supply.is_output_on())
             serial_port_mock.write.assert_called_once_with(b":OUT?;")
 
             serial_port_mock.reset_mock()
-            serial_port_mock.readline.return_value = b"OT0\r\n"
+            serial_port_mock.read.return_value = b"OT0\r\n"
+            time.sleep(tdklambda_power_supply.DEFAULT_RECONCILE_INTERVAL_MS / 1000.0)
             self.assertFalse(power_supply.is_output_on())
             serial_port_mock.write.assert_called_once_with(b":OUT?;")
 
@@ -105,7 +190,7 @@ class ZUPTest(TestCase):
     def test_get_target_voltage(self, serial_port_mock: Mock) -> None:
         with tdklambda_power_supply.ZUP("/dev/ttyUSB0", 9600) as power_supply:
             serial_port_mock.reset_mock()
-            serial_port_mock.readline.return_value = b"SV1.42\r\n"
+            serial_port_mock.read.return_value = b"SV1.42\r\n"
             returned_target_voltage = power_supply.get_target_voltage()
             serial_port_mock.write.assert_called_once_with(b":VOL!;")
             self.assertAlmostEqual(returned_target_voltage, 1.42)
@@ -114,16 +199,110 @@ class ZUPTest(TestCase):
     def test_get_target_current(self, serial_port_mock: Mock) -> None:
         with tdklambda_power_supply.ZUP("/dev/ttyUSB0", 9600) as power_supply:
             serial_port_mock.reset_mock()
-            serial_port_mock.readline.return_value = b"SA0.01\r\n"
+            serial_port_mock.read.return_value = b"SA0.01\r\n"
             returned_target_current = power_supply.get_target_current()
             serial_port_mock.write.assert_called_once_with(b":CUR!;")
             self.assertAlmostEqual(returned_target_current, 0.01)
 
+    @fake_serial_port
+    def test_model_is_cached(self, serial_port_mock: Mock) -> None:
+        with tdklambda_power_supply.ZUP("/dev/ttyUSB0", 9600) as power_supply:
+            serial_port_mock.reset_mock()
+            serial_port_mock.read.return_value = b"FOOBAR\r\n"
+            self.assertEqual(power_supply.get_model(), "FOOBAR")
+            time.sleep(3600)
+            self.assertEqual(power_supply.get_model(), "FOOBAR")
+            serial_port_mock.write.assert_called_once_with(b":MDL?;")
+
+    @fake_serial_port
+    def test_connection_is_not_served_from_cache(self, serial_port_mock: Mock) -> None:
+        with tdklambda_power_supply.ZUP("/dev/ttyUSB0", 9600) as power_supply:
+            serial_port_mock.read.return_value = b"FOOBAR\r\n"
+            power_supply.get_model()
+            serial_port_mock.reset_mock()
+            serial_port_mock.read.return_value = b"OS100000000\r\n"
+            power_supply.test_connection()
+            serial_port_mock.write.assert_called_once_with(b":STA?;")
+
+            # the unit was unplugged, and stays that way through the retries
+            power_supply.RETRY_POLICY = RetryPolicy(
+                max_retries=5, initial_backoff_ms=1.0
+            )
+            serial_port_mock.reset_mock()
+            serial_port_mock.write.side_effect = SerialException("Device disconnected")
+            with self.assertRaises(HardwareIOError):
+                power_supply.test_connection()
+            self.assertGreater(serial_port_mock.write.call_count, 0)
+            serial_port_mock.write.side_effect = None
+
+    @fake_serial_port
+    def test_target_voltage_is_served_from_shadow(self, serial_port_mock: Mock) -> None:
+        with tdklambda_power_supply.ZUP("/dev/ttyUSB0", 9600) as power_supply:
+            serial_port_mock.reset_mock()
+            serial_port_mock.read.return_value = b"SV1.42\r\n"
+            self.assertAlmostEqual(power_supply.get_target_voltage(), 1.42)
+            self.assertAlmostEqual(power_supply.get_target_voltage(), 1.42)
+            serial_port_mock.write.assert_called_once_with(b":VOL!;")
+
+            serial_port_mock.reset_mock()
+            power_supply.set_target_voltage(4.25)
+            power_supply.set_target_current(1.234)
+            self.assertAlmostEqual(power_supply.get_target_voltage(), 4.25)
+            self.assertAlmostEqual(power_supply.get_target_current(), 1.23)
+            self.assertEqual(
+                serial_port_mock.write.call_args_list,
+                [call(b":VOL4.250;"), call(b":CUR001.23;")],
+            )
+
+    @fake_serial_port
+    def test_shadow_is_reconciled(self, serial_port_mock: Mock) -> None:
+        with tdklambda_power_supply.ZUP("/dev/ttyUSB0", 9600) as power_supply:
+            power_supply.set_target_current(1.234)
+            serial_port_mock.reset_mock()
+            serial_port_mock.read.return_value = b"SA1.230\r\n"
+            time.sleep(tdklambda_power_supply.DEFAULT_RECONCILE_INTERVAL_MS / 1000.0)
+            self.assertAlmostEqual(power_supply.get_target_current(), 1.23)
+            serial_port_mock.write.assert_called_once_with(b":CUR!;")
+            self.assertEqual(power_supply.setpoints.get_drift_count(), 0)
+
+    @fake_serial_port
+    def test_shadow_detects_drift(self, serial_port_mock: Mock) -> None:
+        with tdklambda_power_supply.ZUP(
+            "/dev/ttyUSB0", 9600, reconcile_interval_ms=1000.0
+        ) as power_supply:
+            power_supply.set_target_voltage(4.25)
+            power_supply.set_output_on(True)
+            # somebody turned the knob and the output off on the front panel
+            serial_port_mock.read.return_value = b"SV5.000\r\n"
+            time.sleep(1.0)
+            self.assertAlmostEqual(power_supply.get_target_voltage(), 5.0)
+            self.assertEqual(power_supply.setpoints.target_voltage.drift_count, 1)
+            serial_port_mock.read.return_value = b"OT0\r\n"
+            self.assertFalse(power_supply.is_output_on())
+            self.assertEqual(power_supply.get_setpoint_drift_count(), 2)
+
+            # the value read back is trusted until the next reconciliation
+            serial_port_mock.reset_mock()
+            self.assertAlmostEqual(power_supply.get_target_voltage(), 5.0)
+            serial_port_mock.write.assert_not_called()
+
+    @fake_serial_port
+    def test_shadow_can_be_disabled(self, serial_port_mock: Mock) -> None:
+        with tdklambda_power_supply.ZUP(
+            "/dev/ttyUSB0", 9600, reconcile_interval_ms=0.0
+        ) as power_supply:
+            power_supply.set_target_current(1.0)
+            serial_port_mock.reset_mock()
+            serial_port_mock.read.return_value = b"SA0.01\r\n"
+            power_supply.get_target_current()
+            power_supply.get_target_current()
+            self.assertEqual(serial_port_mock.write.call_count, 2)
+
     @fake_serial_port
     def test_get_actual_voltage(self, serial_port_mock: Mock) -> None:
         with tdklambda_power_supply.ZUP("/dev/ttyUSB0", 9600) as power_supply:
             serial_port_mock.reset_mock()
-            serial_port_mock.readline.return_value = b"AV1.33\r\n"
+            serial_port_mock.read.return_value = b"AV1.33\r\n"
             returned_actual_voltage = power_supply.get_actual_voltage()
             serial_port_mock.write.assert_called_once_with(b":VOL?;")
             self.assertAlmostEqual(returned_actual_voltage, 1.33)
@@ -132,7 +311,7 @@ class ZUPTest(TestCase):
     def test_get_actual_current(self, serial_port_mock: Mock) -> None:
         with tdklambda_power_supply.ZUP("/dev/ttyUSB0", 9600) as power_supply:
             serial_port_mock.reset_mock()
-            serial_port_mock.readline.return_value = b"AA0.02\r\n"
+            serial_port_mock.read.return_value = b"AA0.02\r\n"
             returned_actual_current = power_supply.get_actual_current()
             serial_port_mock.write.assert_called_once_with(b":CUR?;")
             self.assertAlmostEqual(returned_actual_current, 0.02)
@@ -141,14 +320,52 @@ class ZUPTest(TestCase):
     def test_get_mode(self, serial_port_mock: Mock) -> None:
         with tdklambda_power_supply.ZUP("/dev/ttyUSB0", 9600) as power_supply:
             serial_port_mock.reset_mock()
-            serial_port_mock.readline.return_value = b"OS100000000"
+            serial_port_mock.read.return_value = b"OS100000000\r\n"
             returned_mode = power_supply.get_mode()
             serial_port_mock.write.assert_called_once_with(b":STA?;")
             self.assertEqual(returned_mode, PowerSupplyMode.CONSTANT_CURRENT)
 
+    @fake_serial_port
+    def test_get_snapshot(self, serial_port_mock: Mock) -> None:
+        with tdklambda_power_supply.ZUP("/dev/ttyUSB0", 9600) as power_supply:
+            serial_port_mock.reset_mock()
+            serial_port_mock.read.side_effect = [
+                b"OT1\r\nOS100000000\r\n",
+                b"SV5.000\r\nSA0.500\r\n",
+                b"AV2.500\r\nAA0.500\r\n",
+            ]
+            snapshot = power_supply.get_snapshot()
+            self.assertEqual(
+                serial_port_mock.write.call_args_list,
+                [
+                    call(b":OUT?;"),
+                    call(b":STA?;"),
+                    call(b":VOL!;"),
+                    call(b":CUR!;"),
+                    call(b":VOL?;"),
+                    call(b":CUR?;"),
+                ],
+            )
+            self.assertEqual(
+                snapshot,
+                PowerSupplySnapshot(
+                    is_output_on=True,
+                    mode=PowerSupplyMode.CONSTANT_CURRENT,
+                    target_voltage=5.0,
+                    target_current=0.5,
+                    actual_voltage=2.5,
+                    actual_current=0.5,
+                ),
+            )
+
+            # the targets that came along are cached
+            serial_port_mock.reset_mock()
+            self.assertAlmostEqual(power_supply.get_target_voltage(), 5.0)
+            serial_port_mock.write.assert_not_called()
+
     @fake_serial_port
     def test_invalid_response(self, serial_port_mock: Mock) -> None:
         with tdklambda_power_supply.ZUP("/dev/ttyUSB0", 9600) as power_supply:
-            serial_port_mock.readline.return_value = b"foobar\r\n"
+            serial_port_mock.read.return_value = b"foobar\r\n"
             with self.assertRaisesRegex(HardwareIOError, "Could not parse response"):
                 power_supply.get_actual_voltage()
@@ -0,0 +1,186 @@
+import math
+import threading
+from dataclasses import dataclass
+from typing import Dict
+
+import numpy
+
+from labby.hw.core.power_supply import (
+    PowerSupply,
+    PowerSupplyMode,
+    PowerSupplySnapshot,
+)
+
+
+REGISTRY_LOCK = threading.Lock()
+BANKS: Dict[str, "PowerSupplyBank"] = {}
+
+
+@dataclass(frozen=True)
+class PowerSupplyBankReading:
+    # arrays with a value per channel
+    is_output_on: numpy.ndarray
+    mode: numpy.ndarray
+    target_voltage: numpy.ndarray
+    target_current: numpy.ndarray
+    actual_voltage: numpy.ndarray
+    actual_current: numpy.ndarray
+
+
+class PowerSupplyBank:
+    name: str
+    size: int
+    is_on: numpy.ndarray
+    load_in_ohms: numpy.ndarray
+    target_voltage: numpy.ndarray
+    target_current: numpy.ndarray
+
+    _lock: threading.Lock
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.size = 0
+        self.is_on = numpy.zeros(0, dtype=bool)
+        self.load_in_ohms = numpy.ones(0)
+        self.target_voltage = numpy.zeros(0)
+        self.target_current = numpy.zeros(0)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_or_create(cls, name: str) -> "PowerSupplyBank":
+        with REGISTRY_LOCK:
+            bank = BANKS.get(name)
+            if bank is None:
+                bank = PowerSupplyBank(name)
+                BANKS[name] = bank
+            return bank
+
+    def add_channel(self, channel: int, load_in_ohms: float) -> None:
+        with self._lock:
+            if channel >= len(self.is_on):
+                # grow geometrically, so that adding channels one at a time
+                # does not copy the arrays over and over
+                capacity = max(channel + 1, 2 * len(self.is_on))
+                padding = capacity - len(self.is_on)
+                self.is_on = numpy.concatenate(
+                    (self.is_on, numpy.zeros(padding, dtype=bool))
+                )
+                self.load_in_ohms = numpy.concatenate(
+                    (self.load_in_ohms, numpy.ones(padding))
+                )
+                self.target_voltage = numpy.concatenate(
+                    (self.target_voltage, numpy.zeros(padding))
+                )
+                self.target_current = numpy.concatenate(
+                    (self.target_current, numpy.zeros(padding))
+                )
+            self.size = max(self.size, channel + 1)
+            self.load_in_ohms[channel] = load_in_ohms
+
+    def set_output_on(self, channel: int, is_on: bool) -> None:
+        with self._lock:
+            self.is_on[channel] = is_on
+
+    def set_target_voltage(self, channel: int, voltage: float) -> None:
+        with self._lock:
+            self.target_voltage[channel] = voltage
+
+    def set_target_current(self, channel: int, current: float) -> None:
+        with self._lock:
+            self.target_current[channel] = current
+
+    def read(self) -> PowerSupplyBankReading:
+        with self._lock:
+            size = self.size
+            is_on = self.is_on[:size].copy()
+            load_in_ohms = self.load_in_ohms[:size].copy()
+            target_voltage = self.target_voltage[:size].copy()
+            target_current = self.target_current[:size].copy()
+        actual_current = numpy.where(
+            is_on, numpy.minimum(target_voltage / load_in_ohms, target_current), 0.0
+        )
+        actual_voltage = actual_current * load_in_ohms
+        mode = numpy.where(
+            numpy.isclose(actual_voltage, target_voltage),
+            PowerSupplyMode.CONSTANT_VOLTAGE.value,
+            PowerSupplyMode.CONSTANT_CURRENT.value,
+        )
+        return PowerSupplyBankReading(
+            is_output_on=is_on,
+            mode=mode,
+            target_voltage=target_voltage,
+            target_current=target_current,
+            actual_voltage=actual_voltage,
+            actual_current=actual_current,
+        )
+
+    def read_channel(self, channel: int) -> PowerSupplySnapshot:
+        # the same as read(), without going through arrays for one channel
+        with self._lock:
+            is_on = bool(self.is_on[channel])
+            load_in_ohms = float(self.load_in_ohms[channel])
+            target_voltage = float(self.target_voltage[channel])
+            target_current = float(self.target_current[channel])
+        actual_current = (
+            min(target_voltage / load_in_ohms, target_current) if is_on else 0.0
+        )
+        actual_voltage = actual_current * load_in_ohms
+        return PowerSupplySnapshot(
+            is_output_on=is_on,
+            mode=PowerSupplyMode.CONSTANT_VOLTAGE
+            if math.isclose(actual_voltage, target_voltage)
+            else PowerSupplyMode.CONSTANT_CURRENT,
+            target_voltage=target_voltage,
+            target_current=target_current,
+            actual_voltage=actual_voltage,
+            actual_current=actual_current,
+        )
+
+
+class BankPowerSupply(PowerSupply):
+    bank: PowerSupplyBank
+    channel: int
+
+    def __init__(self, bank: str, channel: int, load_in_ohms: float = 5.0) -> None:
+        self.bank = PowerSupplyBank.get_or_create(bank)
+        self.channel = channel
+        self.bank.add_channel(channel, load_in_ohms)
+
+    def open(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def test_connection(self) -> None:
+        pass
+
+    def get_mode(self) -> PowerSupplyMode:
+        return self.bank.read_channel(self.channel).mode
+
+    def is_output_on(self) -> bool:
+        return self.bank.read_channel(self.channel).is_output_on
+
+    def set_output_on(self, is_on: bool) -> None:
+        self.bank.set_output_on(self.channel, is_on)
+
+    def get_target_voltage(self) -> float:
+        return self.bank.read_channel(self.channel).target_voltage
+
+    def get_actual_voltage(self) -> float:
+        return self.bank.read_channel(self.channel).actual_voltage
+
+    def get_target_current(self) -> float:
+        return self.bank.read_channel(self.channel).target_current
+
+    def get_actual_current(self) -> float:
+        return self.bank.read_channel(self.channel).actual_current
+
+    def set_target_voltage(self, voltage: float) -> None:
+        self.bank.set_target_voltage(self.channel, voltage)
+
+    def set_target_current(self, current: float) -> None:
+        self.bank.set_target_current(self.channel, current)
+
+    def get_snapshot(self) -> PowerSupplySnapshot:
+        return self.bank.read_channel(self.channel)
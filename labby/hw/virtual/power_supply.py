@@ -1,5 +1,9 @@
 import math
+import random
+import time
+from typing import Optional
 
+from labby.hw.core.exceptions import HardwareIOError
 from labby.hw.core.power_supply import (
     PowerSupply as BasePowerSupply,
     PowerSupplyMode,
@@ -11,24 +15,109 @@ class PowerSupply(BasePowerSupply):
     load_in_ohms: float
     target_current: float = 0.0
     target_voltage: float = 0.0
-
-    def __init__(self, load_in_ohms: float) -> None:
+    latency_ms: float
+    latency_jitter_ms: float
+    slew_rate_v_per_s: float
+    voltage_noise: float
+    current_noise: float
+    timeout_probability: float
+    garbage_probability: float
+    timeout_ms: float
+
+    _random: random.Random
+    _slew_start_voltage: float
+    _slew_started_at: float
+
+    def __init__(
+        self,
+        load_in_ohms: float,
+        latency_ms: float = 0.0,
+        latency_jitter_ms: float = 0.0,
+        slew_rate_v_per_s: float = 0.0,
+        voltage_noise: float = 0.0,
+        current_noise: float = 0.0,
+        timeout_probability: float = 0.0,
+        garbage_probability: float = 0.0,
+        timeout_ms: float = 2000.0,
+        seed: Optional[int] = None,
+    ) -> None:
         self.load_in_ohms = load_in_ohms
+        # every call takes a normally distributed time, never less than zero
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        # how fast the output follows changes to the target voltage, where 0
+        # means that it does so right away
+        self.slew_rate_v_per_s = slew_rate_v_per_s
+        # standard deviation of what is added to each measurement
+        self.voltage_noise = voltage_noise
+        self.current_noise = current_noise
+        # chance of each call timing out after timeout_ms, or of each query
+        # getting a response that can not be parsed
+        self.timeout_probability = timeout_probability
+        self.garbage_probability = garbage_probability
+        self.timeout_ms = timeout_ms
+        self._random = random.Random(seed)
+        self._slew_start_voltage = 0.0
+        self._slew_started_at = 0.0
+
+    def _io(self, is_query: bool = True) -> None:
+        if self.latency_ms > 0.0 or self.latency_jitter_ms > 0.0:
+            latency_ms = self._random.gauss(self.latency_ms, self.latency_jitter_ms)
+            time.sleep(max(0.0, latency_ms) / 1000.0)
+        if self.timeout_probability > 0.0:
+            if self._random.random() < self.timeout_probability:
+                time.sleep(self.timeout_ms / 1000.0)
+                raise HardwareIOError("Timed out waiting for a response")
+        if is_query and self.garbage_probability > 0.0:
+            if self._random.random() < self.garbage_probability:
+                raise HardwareIOError("Could not parse response: ?\x00?")
+
+    def _add_noise(self, value: float, noise: float) -> float:
+        if noise <= 0.0:
+            return value
+        return value + self._random.gauss(0.0, noise)
+
+    def _get_output_voltage_setpoint(self) -> float:
+        if self.slew_rate_v_per_s <= 0.0:
+            return self.target_voltage
+        elapsed_time = max(0.0, time.time() - self._slew_started_at)
+        step = self.slew_rate_v_per_s * elapsed_time
+        delta = self.target_voltage - self._slew_start_voltage
+        if abs(delta) <= step:
+            return self.target_voltage
+        return self._slew_start_voltage + math.copysign(step, delta)
+
+    def _start_slew(self, start_voltage: float) -> None:
+        self._slew_start_voltage = start_voltage
+        self._slew_started_at = time.time()
+
+    def _get_ideal_current(self) -> float:
+        if not self.is_on:
+            return 0.0
+        return min(
+            self._get_output_voltage_setpoint() / self.load_in_ohms,
+            self.target_current,
+        )
 
     def get_mode(self) -> PowerSupplyMode:
+        self._io()
         return (
             PowerSupplyMode.CONSTANT_VOLTAGE
-            if math.isclose(self.get_actual_voltage(), self.target_voltage)
+            if math.isclose(
+                self._get_ideal_current() * self.load_in_ohms,
+                self._get_output_voltage_setpoint(),
+            )
             else PowerSupplyMode.CONSTANT_CURRENT
         )
 
     def get_actual_voltage(self) -> float:
-        return self.get_actual_current() * self.load_in_ohms
+        self._io()
+        voltage = self._get_ideal_current() * self.load_in_ohms
+        return self._add_noise(voltage, self.voltage_noise)
 
     def get_actual_current(self) -> float:
-        if not self.is_on:
-            return 0.0
-        return min(self.target_voltage / self.load_in_ohms, self.target_current)
+        self._io()
+        return self._add_noise(self._get_ideal_current(), self.current_noise)
 
     def open(self) -> None:
         pass
@@ -37,24 +126,34 @@ class PowerSupply(BasePowerSupply):
         pass
 
     def test_connection(self) -> None:
-        pass
+        self._io()
 
     def is_output_on(self) -> bool:
+        self._io()
         return self.is_on
 
     def set_output_on(self, is_on: bool) -> None:
+        self._io(is_query=False)
+        if is_on and not self.is_on:
+            # the output ramps up from nothing when it is turned on
+            self._start_slew(0.0)
         self.is_on = is_on
 
     def get_target_voltage(self) -> float:
+        self._io()
         return self.target_voltage
 
     def get_target_current(self) -> float:
+        self._io()
         return self.target_current
 
     def set_target_voltage(self, voltage: float) -> None:
+        self._io(is_query=False)
+        self._start_slew(self._get_output_voltage_setpoint())
         self.target_voltage = voltage
 
     def set_target_current(self, current: float) -> None:
+        self._io(is_query=False)
         self.target_current = current
 
 
@@ -0,0 +1,77 @@
+from unittest import TestCase
+
+import numpy
+
+from labby.hw.core.power_supply import PowerSupplyMode, PowerSupplySnapshot
+from labby.hw.virtual.bank import BankPowerSupply, PowerSupplyBank
+from labby.hw.virtual.power_supply import PowerSupply
+
+
+class PowerSupplyBankTest(TestCase):
+    def test_channels_share_a_bank(self) -> None:
+        first = BankPowerSupply("test_channels_share_a_bank", 0)
+        second = BankPowerSupply("test_channels_share_a_bank", 1, load_in_ohms=2.0)
+        self.assertIs(first.bank, second.bank)
+        self.assertEqual(first.bank.size, 2)
+
+        second.set_target_voltage(8)
+        second.set_target_current(3)
+        second.set_output_on(True)
+        self.assertEqual(
+            second.get_snapshot(),
+            PowerSupplySnapshot(
+                is_output_on=True,
+                mode=PowerSupplyMode.CONSTANT_CURRENT,
+                target_voltage=8.0,
+                target_current=3.0,
+                actual_voltage=6.0,
+                actual_current=3.0,
+            ),
+        )
+        self.assertFalse(first.is_output_on())
+        self.assertAlmostEqual(first.get_actual_voltage(), 0.0)
+
+    def test_matches_virtual_power_supply(self) -> None:
+        cases = [(4, 8, 3, True), (2, 8, 3, True), (5, 15, 4, True), (4, 8, 3, False)]
+        for (load_in_ohms, voltage, current, is_on) in cases:
+            expected = PowerSupply(load_in_ohms)
+            actual = BankPowerSupply(
+                "test_matches_virtual_power_supply", 0, load_in_ohms
+            )
+            for power_supply in (expected, actual):
+                power_supply.set_target_voltage(voltage)
+                power_supply.set_target_current(current)
+                power_supply.set_output_on(is_on)
+            self.assertEqual(actual.get_snapshot(), expected.get_snapshot())
+
+    def test_batched_read(self) -> None:
+        channels = [
+            BankPowerSupply("test_batched_read", channel, load_in_ohms=2.0)
+            for channel in range(1000)
+        ]
+        for channel, power_supply in enumerate(channels):
+            power_supply.set_target_voltage(channel / 100.0)
+            power_supply.set_target_current(3.0)
+            power_supply.set_output_on(channel % 2 == 0)
+
+        reading = PowerSupplyBank.get_or_create("test_batched_read").read()
+        self.assertEqual(reading.actual_voltage.shape, (1000,))
+        for channel in (0, 1, 500, 998, 999):
+            snapshot = channels[channel].get_snapshot()
+            self.assertEqual(reading.is_output_on[channel], snapshot.is_output_on)
+            self.assertEqual(reading.mode[channel], snapshot.mode.value)
+            self.assertAlmostEqual(
+                float(reading.actual_voltage[channel]), snapshot.actual_voltage
+            )
+            self.assertAlmostEqual(
+                float(reading.actual_current[channel]), snapshot.actual_current
+            )
+        numpy.testing.assert_allclose(reading.target_current, 3.0)
+
+    def test_channels_out_of_order(self) -> None:
+        last = BankPowerSupply("test_channels_out_of_order", 9)
+        first = BankPowerSupply("test_channels_out_of_order", 0, load_in_ohms=2.0)
+        last.set_target_voltage(5.0)
+        self.assertEqual(last.bank.size, 10)
+        self.assertAlmostEqual(last.get_target_voltage(), 5.0)
+        self.assertAlmostEqual(first.get_target_voltage(), 0.0)
@@ -1,10 +1,15 @@
+import statistics
+import time
+from typing import List
 from unittest import TestCase
 
-from labby.hw.core.power_supply import PowerSupplyMode
+from labby.hw.core.exceptions import HardwareIOError
+from labby.hw.core.power_supply import PowerSupplyMode, PowerSupplySnapshot
 from labby.hw.virtual.power_supply import (
     BrokenPowerSupply,
     PowerSupply,
 )
+from labby.tests.utils import patch_time
 
 
 class PowerSupplyTest(TestCase):
@@ -18,6 +23,23 @@ class PowerSupplyTest(TestCase):
         self.assertAlmostEqual(power_supply.get_actual_voltage(), 0)
         self.assertEqual(power_supply.get_mode(), PowerSupplyMode.CONSTANT_VOLTAGE)
 
+    def test_snapshot(self) -> None:
+        power_supply = PowerSupply(2)
+        power_supply.set_target_voltage(8)
+        power_supply.set_target_current(3)
+        power_supply.set_output_on(True)
+        self.assertEqual(
+            power_supply.get_snapshot(),
+            PowerSupplySnapshot(
+                is_output_on=True,
+                mode=PowerSupplyMode.CONSTANT_CURRENT,
+                target_voltage=8.0,
+                target_current=3.0,
+                actual_voltage=6.0,
+                actual_current=3.0,
+            ),
+        )
+
     def test_power_supply_load(self) -> None:
         power_supply = PowerSupply(4)
         power_supply.set_target_voltage(8)
@@ -59,6 +81,75 @@ class PowerSupplyTest(TestCase):
         self.assertAlmostEqual(power_supply.get_actual_voltage(), 0.0)
 
 
+class PowerSupplyModelTest(TestCase):
+    def test_latency(self) -> None:
+        power_supply = PowerSupply(4, latency_ms=20.0, latency_jitter_ms=5.0, seed=1)
+        with patch_time("2020-08-08"):
+            start_time = time.time()
+            for _i in range(100):
+                power_supply.get_actual_voltage()
+            mean_latency_ms = (time.time() - start_time) * 10.0
+        self.assertAlmostEqual(mean_latency_ms, 20.0, delta=2.0)
+
+    def test_slew_rate(self) -> None:
+        power_supply = PowerSupply(4, slew_rate_v_per_s=2.0)
+        with patch_time("2020-08-08"):
+            power_supply.set_target_voltage(8)
+            power_supply.set_target_current(3)
+            power_supply.set_output_on(True)
+            self.assertAlmostEqual(power_supply.get_actual_voltage(), 0.0)
+            time.sleep(1.0)
+            self.assertAlmostEqual(power_supply.get_actual_voltage(), 2.0)
+            self.assertEqual(power_supply.get_mode(), PowerSupplyMode.CONSTANT_VOLTAGE)
+            time.sleep(3.0)
+            self.assertAlmostEqual(power_supply.get_actual_voltage(), 8.0)
+
+            # ramps down from wherever it was
+            power_supply.set_target_voltage(4)
+            time.sleep(1.0)
+            self.assertAlmostEqual(power_supply.get_actual_voltage(), 6.0)
+            self.assertAlmostEqual(power_supply.get_target_voltage(), 4.0)
+
+    def test_noise(self) -> None:
+        power_supply = PowerSupply(4, voltage_noise=0.1, seed=1)
+        power_supply.set_target_voltage(8)
+        power_supply.set_target_current(3)
+        power_supply.set_output_on(True)
+        voltages = [power_supply.get_actual_voltage() for _i in range(1000)]
+        self.assertAlmostEqual(statistics.mean(voltages), 8.0, delta=0.02)
+        self.assertAlmostEqual(statistics.stdev(voltages), 0.1, delta=0.02)
+        self.assertAlmostEqual(power_supply.get_actual_current(), 2.0)
+
+    def test_failure_injection(self) -> None:
+        power_supply = PowerSupply(4, garbage_probability=1.0)
+        power_supply.set_target_voltage(8)
+        with self.assertRaisesRegex(HardwareIOError, "Could not parse response"):
+            power_supply.get_actual_voltage()
+
+        power_supply = PowerSupply(4, timeout_probability=1.0, timeout_ms=500.0)
+        with patch_time("2020-08-08"):
+            start_time = time.time()
+            with self.assertRaisesRegex(HardwareIOError, "Timed out"):
+                power_supply.set_target_voltage(8)
+            self.assertAlmostEqual(time.time() - start_time, 0.5)
+
+    def test_failures_are_reproducible(self) -> None:
+        def _failures(seed: int) -> List[bool]:
+            power_supply = PowerSupply(4, garbage_probability=0.5, seed=seed)
+            failures: List[bool] = []
+            for _i in range(20):
+                try:
+                    power_supply.get_actual_current()
+                    failures.append(False)
+                except HardwareIOError:
+                    failures.append(True)
+            return failures
+
+        self.assertEqual(_failures(42), _failures(42))
+        self.assertIn(True, _failures(42))
+        self.assertIn(False, _failures(42))
+
+
 class BrokenPowerSupplyTest(TestCase):
     def test_power_supply_initial_state(self) -> None:
         power_supply = BrokenPowerSupply(42)
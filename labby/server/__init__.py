@@ -20,6 +20,8 @@ from pynng import Rep0
 
 from labby.config import Config
 from labby.experiment.runner import ExperimentSequenceStatus
+from labby.hw.core.sessions import DeviceSessionPool
+from labby.server.health import DeviceHealthMonitor
 from labby.server.logging import logger
 from labby.utils.typing import get_args
 
@@ -78,11 +80,18 @@ class ServerRequest(Generic[TResponse], DataClassMessagePackMixin, ABC):
 
 class Server:
     config: Config
+    sessions: DeviceSessionPool
+    health: DeviceHealthMonitor
     _experiment_sequence_status_lock: threading.Lock
     _experiment_sequence_status: Optional[ExperimentSequenceStatus]
 
     def __init__(self, config: Config) -> None:
         self.config = config
+        # devices are opened the first time a request or an experiment needs
+        # them and kept open from then on
+        self.sessions = DeviceSessionPool()
+        # only runs in the server process, see start()
+        self.health = DeviceHealthMonitor(self.sessions, config.devices)
         self._experiment_sequence_status = None
         self._experiment_sequence_status_lock = threading.Lock()
 
@@ -99,6 +108,8 @@ class Server:
             self._create_pid_file(child_pid)
             return ServerInfo(address=address, existing=False, pid=child_pid)
 
+        # threads do not survive the fork, so the monitor starts on the child
+        self.health.start()
         with Rep0(listen=address) as rep:
             self._run(rep)
 
@@ -107,6 +118,8 @@ class Server:
 
     def stop(self) -> None:
         logger.info(f"Stopping server (pid: {os.getpid()})")
+        self.health.stop()
+        self.sessions.close()
         sys.exit(0)
 
     @classmethod
@@ -0,0 +1,202 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Sequence
+
+from labby.hw.core import Device
+from labby.hw.core.deadline import io_deadline
+from labby.hw.core.retry import RetryPolicy
+from labby.hw.core.serial import SerialDevice
+from labby.hw.core.sessions import DeviceSessionPool
+
+
+# racks with thousands of devices would otherwise get a thread each
+MAX_PROBE_THREADS = 32
+# how often devices that answered their last check are checked again
+HEALTHY_INTERVAL_S = 30.0
+# devices that did not answer are checked again after 5 s, then 10 s, 20 s and
+# so on, so that a rack full of unplugged devices does not keep the ports busy
+FAILURE_BACKOFF = RetryPolicy(initial_backoff_ms=5000.0, max_backoff_ms=600000.0)
+# nobody is waiting on the background checks, so they can afford to be patient
+MONITOR_PROBE_TIMEOUT_MS = 5000.0
+
+
+@dataclass(frozen=True)
+class DeviceHealth:
+    is_available: bool
+    # as returned by time.time()
+    checked_at: float
+    last_seen_at: Optional[float] = None
+    error_type: Optional[str] = None
+    error_message: Optional[str] = None
+    consecutive_failures: int = 0
+
+
+def _group_by_port(devices: Sequence[Device]) -> List[List[Device]]:
+    # devices on the same port can only be talked to one at a time anyway
+    groups: Dict[object, List[Device]] = {}
+    for device in devices:
+        key = device.port if isinstance(device, SerialDevice) else id(device)
+        groups.setdefault(key, []).append(device)
+    return list(groups.values())
+
+
+def _probe_device(sessions: DeviceSessionPool, device: Device) -> DeviceHealth:
+    try:
+        with sessions.session() as session:
+            session.acquire(device).test_connection()
+        now = time.time()
+        return DeviceHealth(is_available=True, checked_at=now, last_seen_at=now)
+    except Exception as ex:
+        return DeviceHealth(
+            is_available=False,
+            checked_at=time.time(),
+            error_type=type(ex).__name__,
+            error_message=str(ex),
+        )
+
+
+def _probe_group(
+    sessions: DeviceSessionPool,
+    group: Sequence[Device],
+    deadline: float,
+    results: Dict[int, DeviceHealth],
+    results_lock: threading.Lock,
+) -> None:
+    with io_deadline(deadline):
+        for device in group:
+            # nobody is waiting for devices that are reached too late, and
+            # they are reported as timed out anyway
+            if time.time() >= deadline:
+                return
+            health = _probe_device(sessions, device)
+            with results_lock:
+                results[id(device)] = health
+
+
+def probe_devices(
+    sessions: DeviceSessionPool, devices: Sequence[Device], timeout_ms: float
+) -> Dict[int, DeviceHealth]:
+    deadline = time.time() + timeout_ms / 1000.0
+    results: Dict[int, DeviceHealth] = {}
+    results_lock = threading.Lock()
+
+    groups = _group_by_port(devices)
+    executor = ThreadPoolExecutor(
+        max_workers=max(1, min(len(groups), MAX_PROBE_THREADS))
+    )
+    futures = [
+        executor.submit(_probe_group, sessions, group, deadline, results, results_lock)
+        for group in groups
+    ]
+    wait(futures, timeout=max(0.0, deadline - time.time()))
+    # groups that have not started are dropped, and the ones that have stop
+    # after the device they are waiting on
+    for future in futures:
+        future.cancel()
+    executor.shutdown(wait=False)
+
+    with results_lock:
+        for device in devices:
+            if id(device) not in results:
+                results[id(device)] = DeviceHealth(
+                    is_available=False,
+                    checked_at=time.time(),
+                    error_type="TimeoutError",
+                    error_message=f"No response within {timeout_ms:.0f} ms",
+                )
+        return dict(results)
+
+
+class DeviceHealthMonitor(threading.Thread):
+    sessions: DeviceSessionPool
+    devices: Sequence[Device]
+    interval_s: float
+    backoff: RetryPolicy
+    probe_timeout_ms: float
+
+    _lock: threading.Lock
+    _health: Dict[int, DeviceHealth]
+    _next_check_at: Dict[int, float]
+    _stopped: threading.Event
+
+    def __init__(
+        self,
+        sessions: DeviceSessionPool,
+        devices: Sequence[Device],
+        interval_s: float = HEALTHY_INTERVAL_S,
+        backoff: RetryPolicy = FAILURE_BACKOFF,
+        probe_timeout_ms: float = MONITOR_PROBE_TIMEOUT_MS,
+    ) -> None:
+        super().__init__(name="device-health-monitor", daemon=True)
+        self.sessions = sessions
+        self.devices = devices
+        self.interval_s = interval_s
+        self.backoff = backoff
+        self.probe_timeout_ms = probe_timeout_ms
+        self._lock = threading.Lock()
+        self._health = {}
+        self._next_check_at = {}
+        self._stopped = threading.Event()
+
+    def get_health(self, device: Device) -> Optional[DeviceHealth]:
+        with self._lock:
+            return self._health.get(id(device))
+
+    def get_next_check_at(self, device: Device) -> Optional[float]:
+        with self._lock:
+            return self._next_check_at.get(id(device))
+
+    def _record(self, device: Device, health: DeviceHealth) -> DeviceHealth:
+        previous = self._health.get(id(device))
+        if health.is_available:
+            delay_s = self.interval_s
+        else:
+            failures = 1 if previous is None else previous.consecutive_failures + 1
+            health = replace(
+                health,
+                consecutive_failures=failures,
+                last_seen_at=None if previous is None else previous.last_seen_at,
+            )
+            delay_s = self.backoff.get_backoff_ms(failures - 1) / 1000.0
+        self._health[id(device)] = health
+        self._next_check_at[id(device)] = health.checked_at + delay_s
+        return health
+
+    def check(
+        self, devices: Sequence[Device], timeout_ms: Optional[float] = None
+    ) -> List[DeviceHealth]:
+        results = probe_devices(
+            self.sessions,
+            devices,
+            self.probe_timeout_ms if timeout_ms is None else timeout_ms,
+        )
+        with self._lock:
+            return [self._record(device, results[id(device)]) for device in devices]
+
+    def _get_due_devices(self, now: float) -> List[Device]:
+        with self._lock:
+            return [
+                device
+                for device in self.devices
+                if self._next_check_at.get(id(device), 0.0) <= now
+            ]
+
+    def _get_time_to_next_check(self, now: float) -> float:
+        with self._lock:
+            next_check_at = min(
+                (self._next_check_at.get(id(device), now) for device in self.devices),
+                default=now + self.interval_s,
+            )
+        return max(0.0, next_check_at - now)
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            due_devices = self._get_due_devices(time.time())
+            if due_devices:
+                self.check(due_devices)
+            self._stopped.wait(self._get_time_to_next_check(time.time()))
+
+    def stop(self) -> None:
+        self._stopped.set()
@@ -14,6 +14,8 @@ class PowerSupplyInfo(ServerResponseComponent):
     target_current: float
     actual_voltage: float
     actual_current: float
+    # how often a setpoint was found changed outside of labby
+    setpoint_drift_count: int = 0
 
 
 @dataclass(frozen=True)
@@ -30,13 +32,15 @@ class DeviceInfoRequest(ServerRequest[DeviceInfoResponse]):
     device_name: str
 
     def _get_power_supply_info(self, power_supply: PowerSupply) -> PowerSupplyInfo:
+        snapshot = power_supply.get_snapshot()
         return PowerSupplyInfo(
-            is_output_on=power_supply.is_output_on(),
-            mode=power_supply.get_mode(),
-            target_voltage=power_supply.get_target_voltage(),
-            target_current=power_supply.get_target_current(),
-            actual_voltage=power_supply.get_actual_voltage(),
-            actual_current=power_supply.get_actual_current(),
+            is_output_on=snapshot.is_output_on,
+            mode=snapshot.mode,
+            target_voltage=snapshot.target_voltage,
+            target_current=snapshot.target_current,
+            actual_voltage=snapshot.actual_voltage,
+            actual_current=snapshot.actual_current,
+            setpoint_drift_count=power_supply.get_setpoint_drift_count(),
         )
 
     def _get_device_info(self, device: Device) -> ServerResponseComponent:
@@ -63,8 +67,8 @@ class DeviceInfoRequest(ServerRequest[DeviceInfoResponse]):
             return DeviceInfoResponse(device_type=None, is_connected=False)
 
         try:
-            device.open()
-            device_info = self._get_device_info(device)
+            with server.sessions.session() as session:
+                device_info = self._get_device_info(session.acquire(device))
             is_connected = True
             error_type = None
             error_message = None
@@ -73,8 +77,6 @@ class DeviceInfoRequest(ServerRequest[DeviceInfoResponse]):
             error_type = type(ex).__name__
             error_message = str(ex)
             is_connected = False
-        finally:
-            device.close()
 
         return DeviceInfoResponse(
             device_type=device.device_type,
@@ -1,16 +1,24 @@
 from dataclasses import dataclass
-from typing import Optional, Sequence
+from typing import List, Optional, Sequence
+
+from pyre_extensions import none_throws
 
-from labby.hw.core import Device
 from labby.server import Server, ServerRequest, ServerResponse, ServerResponseComponent
 
 
+# leaves some room for the response within the client's 1000 ms timeout
+PROBE_TIMEOUT_MS = 800.0
+
+
 @dataclass(frozen=True)
 class DeviceStatus(ServerResponseComponent):
     name: str
     is_available: bool
     error_type: Optional[str] = None
     error_message: Optional[str] = None
+    # as returned by time.time() on the server
+    last_checked_at: Optional[float] = None
+    last_seen_at: Optional[float] = None
 
 
 @dataclass(frozen=True)
@@ -20,24 +28,32 @@ class ListDevicesResponse(ServerResponse):
 
 @dataclass(frozen=True)
 class ListDevicesRequest(ServerRequest[ListDevicesResponse]):
-    def _get_device_status(self, device: Device) -> DeviceStatus:
-        try:
-            device.open()
-            device.test_connection()
-            return DeviceStatus(name=str(device.name), is_available=True)
-        except Exception as ex:
-            return DeviceStatus(
-                name=str(device.name),
-                is_available=False,
-                error_type=type(ex).__name__,
-                error_message=str(ex),
-            )
-        finally:
-            device.close()
+    # probes every device rather than answering from the health monitor
+    refresh: bool = False
 
     def handle(self, server: "Server") -> ListDevicesResponse:
-        return ListDevicesResponse(
-            devices=[
-                self._get_device_status(device) for device in server.config.devices
+        devices = server.config.devices
+        unchecked_devices = (
+            devices
+            if self.refresh
+            else [
+                device for device in devices if server.health.get_health(device) is None
             ]
         )
+        if unchecked_devices:
+            server.health.check(unchecked_devices, timeout_ms=PROBE_TIMEOUT_MS)
+
+        statuses: List[DeviceStatus] = []
+        for device in devices:
+            health = none_throws(server.health.get_health(device))
+            statuses.append(
+                DeviceStatus(
+                    name=str(device.name),
+                    is_available=health.is_available,
+                    error_type=health.error_type,
+                    error_message=health.error_message,
+                    last_checked_at=health.checked_at,
+                    last_seen_at=health.last_seen_at,
+                )
+            )
+        return ListDevicesResponse(devices=statuses)
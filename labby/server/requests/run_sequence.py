@@ -20,7 +20,7 @@ class RunSequenceRequest(ServerRequest[None]):
         with open(self.sequence_filename, "r") as sequence_fd:
             sequence = ExperimentSequence(self.sequence_filename, sequence_fd.read())
 
-        runner = ExperimentRunner(server.config, sequence)
+        runner = ExperimentRunner(server.config, sequence, server.sessions)
         monitor = ExperimentMonitor(server, sequence, runner.subscription_address)
 
         monitor.start()
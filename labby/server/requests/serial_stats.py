@@ -0,0 +1,16 @@
+from dataclasses import dataclass
+from typing import Sequence
+
+from labby.hw.core.stats import SerialCommandStats, get_serial_stats
+from labby.server import Server, ServerRequest, ServerResponse
+
+
+@dataclass(frozen=True)
+class SerialStatsResponse(ServerResponse):
+    commands: Sequence[SerialCommandStats]
+
+
+@dataclass(frozen=True)
+class SerialStatsRequest(ServerRequest[SerialStatsResponse]):
+    def handle(self, server: Server) -> SerialStatsResponse:
+        return SerialStatsResponse(commands=get_serial_stats())
@@ -1,4 +1,5 @@
 import re
+import time
 import unittest
 from dataclasses import dataclass
 from typing import List, Tuple
@@ -10,10 +11,12 @@ from pynng.exceptions import Timeout
 from labby import cli
 from labby.hw.core import DeviceType
 from labby.hw.core.power_supply import PowerSupplyMode
+from labby.hw.core.stats import ALL_COMMANDS, LatencySummary, SerialCommandStats
 from labby.server import Server, ServerInfo
 from labby.server.requests.device_info import DeviceInfoResponse, PowerSupplyInfo
 from labby.server.requests.experiment_status import ExperimentStatusResponse
 from labby.server.requests.list_devices import DeviceStatus, ListDevicesResponse
+from labby.server.requests.serial_stats import SerialStatsResponse
 from labby.experiment import (
     BaseInputParameters,
     BaseOutputData,
@@ -68,7 +71,6 @@ class TestExperiment(Experiment[InputParameters, OutputData]):
         power_supply.set_target_voltage(15)
         power_supply.set_target_current(4)
         power_supply.set_output_on(True)
-        power_supply.open()
 
     def measure(self) -> OutputData:
         power_supply = self.get_power_supply("virtual-power-supply")
@@ -77,7 +79,7 @@ class TestExperiment(Experiment[InputParameters, OutputData]):
 
     def stop(self) -> None:
         power_supply = self.get_power_supply("virtual-power-supply")
-        power_supply.close()
+        power_supply.set_output_on(False)
 
 
 def _strip_colors(output: str) -> str:
@@ -183,6 +185,27 @@ class CommandLineTest(TestCase):
             (rc, stdout, stderr) = self.main(["devices"])
         self.assertEqual(rc, 0)
         self.assertIn("[x] broken-power-supply", stdout)
+        self.assertNotIn("Last seen", stdout)
+        self.client_mock.list_devices.assert_called_once_with(refresh=False)
+
+    def test_refresh_devices(self) -> None:
+        self.client_mock.list_devices.return_value = ListDevicesResponse(
+            devices=[
+                DeviceStatus(
+                    name="broken-power-supply",
+                    is_available=False,
+                    error_type="Unavailable",
+                    error_message="Device is unavailable",
+                    last_checked_at=time.time(),
+                    last_seen_at=time.mktime((2020, 1, 1, 12, 0, 0, 0, 0, -1)),
+                )
+            ]
+        )
+        with labby_config(LABBY_CONFIG):
+            (rc, stdout, stderr) = self.main(["devices", "--refresh"])
+        self.assertEqual(rc, 0)
+        self.assertIn("Last seen at 2020-01-01 12:00:00", stdout)
+        self.client_mock.list_devices.assert_called_once_with(refresh=True)
 
     def test_run_without_sequence_file(self) -> None:
         with labby_config(LABBY_CONFIG):
@@ -232,6 +255,25 @@ class CommandLineTest(TestCase):
         self.assertEqual(rc, 0)
         self.assertIn("Connection       [+] OK", stdout)
 
+    def test_setpoint_drift_is_shown(self) -> None:
+        self.client_mock.device_info.return_value = DeviceInfoResponse(
+            device_type=DeviceType.POWER_SUPPLY,
+            is_connected=True,
+            power_supply_info=PowerSupplyInfo(
+                is_output_on=True,
+                mode=PowerSupplyMode.CONSTANT_VOLTAGE,
+                actual_current=0.0,
+                actual_voltage=5.0,
+                target_current=1.0,
+                target_voltage=5.0,
+                setpoint_drift_count=2,
+            ),
+        )
+        with labby_config(LABBY_CONFIG):
+            (rc, stdout, stderr) = self.main(["device-info", "virtual-power-supply"])
+        self.assertEqual(rc, 0)
+        self.assertIn("Setpoint Drift   2 detected", stdout)
+
     def test_device_that_cannot_be_opened(self) -> None:
         self.client_mock.device_info.return_value = DeviceInfoResponse(
             device_type=DeviceType.POWER_SUPPLY,
@@ -250,6 +292,49 @@ class CommandLineTest(TestCase):
         self.assertEqual(rc, 0)
         self.assertIn("Connection   [x] Error", stdout)
 
+    def test_serial_stats(self) -> None:
+        latency = LatencySummary(
+            count=3, mean_ms=2.0, p50_ms=1.5, p99_ms=4.25, max_ms=4.25
+        )
+        self.client_mock.serial_stats.return_value = SerialStatsResponse(
+            commands=[
+                SerialCommandStats(
+                    port="/dev/ttyUSB0",
+                    command=ALL_COMMANDS,
+                    queue_wait=latency,
+                    write=latency,
+                    read=latency,
+                    missed_deadlines=2,
+                    retries=1,
+                ),
+                SerialCommandStats(
+                    port="/dev/ttyUSB0",
+                    command=":VOL?",
+                    queue_wait=latency,
+                    write=latency,
+                    read=latency,
+                    missed_deadlines=0,
+                    retries=0,
+                ),
+            ]
+        )
+        with labby_config(LABBY_CONFIG):
+            (rc, stdout, stderr) = self.main(["serial-stats"])
+        self.client_mock.serial_stats.assert_called_once_with()
+        self.assertEqual(rc, 0)
+        self.assertIn("/dev/ttyUSB0", stdout)
+        self.assertIn("(all)", stdout)
+        self.assertIn(":VOL?", stdout)
+        self.assertIn("1.5 / 4.2", stdout)
+        self.assertRegex(stdout, r"\(all\).* 2 +1\n")
+
+    def test_serial_stats_without_any_io(self) -> None:
+        self.client_mock.serial_stats.return_value = SerialStatsResponse(commands=[])
+        with labby_config(LABBY_CONFIG):
+            (rc, stdout, stderr) = self.main(["serial-stats"])
+        self.assertEqual(rc, 0)
+        self.assertEqual(stdout, "No serial I/O has been recorded yet.\n")
+
     def test_experiment_status_without_any_experiments_running(self) -> None:
         self.client_mock.experiment_status.return_value = ExperimentStatusResponse(
             sequence_status=None,
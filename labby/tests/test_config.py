@@ -3,6 +3,7 @@ from unittest.mock import Mock
 
 from labby.config import Config
 from labby.hw import tdklambda
+from labby.hw.virtual.bank import BankPowerSupply
 from labby.tests.utils import fake_serial_port
 from labby.utils import auto_discover_drivers
 
@@ -34,3 +35,25 @@ devices:
         self.assertEqual(device.port, "/dev/ttyUSB0")
         self.assertEqual(device.baudrate, 9600)
         self.assertEqual(device.address, 1)
+
+    def test_channels(self) -> None:
+        config = Config(
+            """
+---
+devices:
+  - name: "rack"
+    type: power_supply
+    driver: labby.hw.virtual.bank.BankPowerSupply
+    channels: 3
+    args:
+      bank: "test_channels"
+      load_in_ohms: 2
+        """
+        )
+
+        devices = config.get_devices()
+        self.assertEqual([d.name for d in devices], ["rack-0", "rack-1", "rack-2"])
+        for channel, device in enumerate(devices):
+            assert isinstance(device, BankPowerSupply)
+            self.assertEqual(device.channel, channel)
+            self.assertAlmostEqual(float(device.bank.load_in_ohms[channel]), 2.0)
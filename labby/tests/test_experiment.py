@@ -42,7 +42,6 @@ class TestExperiment(Experiment[InputParameters, OutputData]):
         power_supply.set_target_voltage(15)
         power_supply.set_target_current(4)
         power_supply.set_output_on(True)
-        power_supply.open()
 
     def measure(self) -> OutputData:
         power_supply = self.get_power_supply("virtual-power-supply")
@@ -51,7 +50,7 @@ class TestExperiment(Experiment[InputParameters, OutputData]):
 
     def stop(self) -> None:
         power_supply = self.get_power_supply("virtual-power-supply")
-        power_supply.close()
+        power_supply.set_output_on(False)
 
 
 LABBY_CONFIG_YAML = """
@@ -103,6 +102,30 @@ class ExperimentRunnerTest(TestCase):
             ]
         )
 
+    def test_devices_are_opened_by_the_session(self) -> None:
+        config = Config(LABBY_CONFIG_YAML)
+        sequence = ExperimentSequence("./sequences/seq.yaml", SEQUENCE_YAML)
+        runner = ExperimentRunner(config, sequence)
+        power_supply = config.get_devices()[0]
+
+        with patch_time("2020-08-08"), patch_file_contents("output/seq/000.csv"), patch(
+            "os.makedirs"
+        ), patch.object(power_supply, "open") as open_mock, patch.object(
+            power_supply, "close"
+        ) as close_mock:
+            runner.start()
+            runner.join()
+
+        open_mock.assert_called_once_with()
+        close_mock.assert_called_once_with()
+        self.assertEqual(runner.sessions.get_refcount(power_supply), 0)
+
+    def test_devices_can_not_be_used_outside_of_a_run(self) -> None:
+        experiment = TestExperiment("test_experiment", InputParameters())
+        experiment.config = Config(LABBY_CONFIG_YAML)
+        with self.assertRaisesRegex(AssertionError, "while the experiment runs"):
+            experiment.get_power_supply("virtual-power-supply")
+
     def test_published_messages(self) -> None:
         config = Config(LABBY_CONFIG_YAML)
         sequence = ExperimentSequence("./sequences/seq.yaml", SEQUENCE_YAML)
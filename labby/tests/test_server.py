@@ -1,8 +1,8 @@
 import time
 import unittest
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from pathlib import PosixPath
-from typing import cast
+from typing import List, cast
 from unittest import TestCase
 from unittest.mock import MagicMock, call, patch
 
@@ -16,11 +16,23 @@ from labby.experiment import (
     Experiment,
 )
 from labby.hw.core import DeviceType
+from labby.hw.core.retry import RetryPolicy
 from labby.hw.core.power_supply import PowerSupplyMode
+from labby.hw.core.stats import (
+    LatencySummary,
+    SerialCommandStats,
+    get_serial_port_stats,
+)
+from labby.hw.tdklambda.power_supply import ZUP
 from labby.server import Server, ServerRequest
+from labby.server.health import DeviceHealthMonitor
 from labby.server.requests.device_info import DeviceInfoResponse, PowerSupplyInfo
 from labby.server.requests.halt import HaltRequest
-from labby.server.requests.list_devices import DeviceStatus, ListDevicesResponse
+from labby.server.requests.list_devices import (
+    DeviceStatus,
+    ListDevicesRequest,
+    ListDevicesResponse,
+)
 from labby.tests.utils import patch_file_contents, patch_time
 from labby.utils import auto_discover_drivers
 
@@ -28,6 +40,15 @@ from labby.utils import auto_discover_drivers
 FAKE_PID = 42
 
 
+def _without_times(response: ListDevicesResponse) -> ListDevicesResponse:
+    return ListDevicesResponse(
+        devices=[
+            replace(status, last_checked_at=None, last_seen_at=None)
+            for status in response.devices
+        ]
+    )
+
+
 LABBY_CONFIG_YAML = """
 ---
 devices:
@@ -90,6 +111,191 @@ class ServerTest(TestCase):
             self.assertEqual(server_info.pid, 12345)
 
 
+class ListDevicesTest(TestCase):
+    def setUp(self) -> None:
+        auto_discover_drivers()
+
+    def _device(self, name: str, port: str, delay: float) -> MagicMock:
+        device = MagicMock(spec=ZUP)
+        device.name = name
+        device.port = port
+        device.test_connection.side_effect = lambda: time.sleep(delay)
+        return device
+
+    def _handle(self, *devices: MagicMock) -> ListDevicesResponse:
+        server = Server(Config(LABBY_CONFIG_YAML))
+        server.config.devices = devices
+        return ListDevicesRequest().handle(server)
+
+    def test_devices_on_different_ports_are_probed_in_parallel(self) -> None:
+        start_time = time.time()
+        response = self._handle(
+            *[self._device(f"zup-{i}", f"/dev/ttyUSB{i}", 0.3) for i in range(4)]
+        )
+        self.assertLess(time.time() - start_time, 0.6)
+        self.assertTrue(all(status.is_available for status in response.devices))
+        self.assertEqual(
+            [status.name for status in response.devices],
+            ["zup-0", "zup-1", "zup-2", "zup-3"],
+        )
+
+    def test_devices_on_the_same_port_are_probed_one_at_a_time(self) -> None:
+        probing: List[int] = []
+
+        def _probe() -> None:
+            probing.append(1)
+            self.assertEqual(len(probing), 1)
+            time.sleep(0.05)
+            probing.pop()
+
+        devices = [self._device(f"zup-{i}", "/dev/ttyUSB0", 0.0) for i in range(3)]
+        for device in devices:
+            device.test_connection.side_effect = _probe
+        response = self._handle(*devices)
+        self.assertTrue(all(status.is_available for status in response.devices))
+
+    def test_rack_sized_installations(self) -> None:
+        server = Server(
+            Config(
+                """
+devices:
+  - name: "rack"
+    type: power_supply
+    driver: labby.hw.virtual.bank.BankPowerSupply
+    channels: 2000
+    args:
+      bank: "test_rack_sized_installations"
+"""
+            )
+        )
+        start_time = time.time()
+        response = ListDevicesRequest().handle(server)
+        self.assertLess(time.time() - start_time, 1.0)
+        self.assertEqual(len(response.devices), 2000)
+        self.assertTrue(all(status.is_available for status in response.devices))
+
+    def test_slow_devices_time_out(self) -> None:
+        start_time = time.time()
+        response = self._handle(
+            self._device("fast", "/dev/ttyUSB0", 0.0),
+            self._device("slow", "/dev/ttyUSB1", 2.0),
+        )
+        self.assertLess(time.time() - start_time, 1.0)
+        self.assertEqual(
+            _without_times(response).devices,
+            [
+                DeviceStatus(name="fast", is_available=True),
+                DeviceStatus(
+                    name="slow",
+                    is_available=False,
+                    error_type="TimeoutError",
+                    error_message="No response within 800 ms",
+                ),
+            ],
+        )
+
+    def test_probes_stop_at_the_deadline(self) -> None:
+        slow = self._device("slow", "/dev/ttyUSB0", 1.0)
+        queued = self._device("queued", "/dev/ttyUSB0", 0.0)
+        response = self._handle(slow, queued)
+        self.assertFalse(any(status.is_available for status in response.devices))
+        # the device behind the slow one is not probed once the answer is out
+        time.sleep(0.4)
+        slow.test_connection.assert_called_once_with()
+        queued.test_connection.assert_not_called()
+
+    def test_answers_from_the_last_check(self) -> None:
+        server = Server(Config(LABBY_CONFIG_YAML))
+        device = self._device("zup", "/dev/ttyUSB0", 0.0)
+        server.config.devices = [device]
+        ListDevicesRequest().handle(server)
+        ListDevicesRequest().handle(server)
+        self.assertEqual(device.test_connection.call_count, 1)
+        ListDevicesRequest(refresh=True).handle(server)
+        self.assertEqual(device.test_connection.call_count, 2)
+
+    def test_reports_when_devices_were_last_seen(self) -> None:
+        server = Server(Config(LABBY_CONFIG_YAML))
+        device = self._device("zup", "/dev/ttyUSB0", 0.0)
+        server.config.devices = [device]
+        with patch_time("2020-01-01 12:00:00"):
+            ListDevicesRequest().handle(server)
+        device.test_connection.side_effect = Exception("Unavailable device")
+        with patch_time("2020-01-01 12:01:00"):
+            response = ListDevicesRequest(refresh=True).handle(server)
+        self.assertEqual(
+            response.devices,
+            [
+                DeviceStatus(
+                    name="zup",
+                    is_available=False,
+                    error_type="Exception",
+                    error_message="Unavailable device",
+                    last_checked_at=1577880060.0,
+                    last_seen_at=1577880000.0,
+                )
+            ],
+        )
+
+
+class DeviceHealthMonitorTest(TestCase):
+    def _device(self, name: str) -> MagicMock:
+        device = MagicMock(spec=ZUP)
+        device.name = name
+        device.port = f"/dev/{name}"
+        return device
+
+    def _monitor(self, *devices: MagicMock) -> DeviceHealthMonitor:
+        return DeviceHealthMonitor(
+            Server(Config(LABBY_CONFIG_YAML)).sessions,
+            devices,
+            interval_s=30.0,
+            backoff=RetryPolicy(initial_backoff_ms=5000.0, max_backoff_ms=15000.0),
+        )
+
+    def test_failing_devices_back_off(self) -> None:
+        device = self._device("zup")
+        monitor = self._monitor(device)
+        with patch_time("2020-01-01 12:00:00"):
+            monitor.check([device])
+            self.assertEqual(monitor.get_next_check_at(device), time.time() + 30.0)
+
+        device.test_connection.side_effect = Exception("Unavailable device")
+        for delay in (5.0, 10.0, 15.0, 15.0):
+            with patch_time("2020-01-01 12:10:00"):
+                monitor.check([device])
+                self.assertEqual(monitor.get_next_check_at(device), time.time() + delay)
+        health = monitor.get_health(device)
+        assert health is not None
+        self.assertFalse(health.is_available)
+        self.assertEqual(health.consecutive_failures, 4)
+        self.assertEqual(health.last_seen_at, 1577880000.0)
+
+        device.test_connection.side_effect = None
+        monitor.check([device])
+        health = monitor.get_health(device)
+        assert health is not None
+        self.assertTrue(health.is_available)
+        self.assertEqual(health.consecutive_failures, 0)
+
+    def test_checks_devices_in_the_background(self) -> None:
+        devices = [self._device("zup-0"), self._device("zup-1")]
+        monitor = self._monitor(*devices)
+        monitor.start()
+        try:
+            deadline = time.time() + 1.0
+            while time.time() < deadline and any(
+                monitor.get_health(device) is None for device in devices
+            ):
+                time.sleep(0.01)
+        finally:
+            monitor.stop()
+            monitor.join(timeout=1.0)
+        self.assertFalse(monitor.is_alive())
+        for device in devices:
+            device.test_connection.assert_called_once_with()
+
+
 @dataclass(frozen=True)
 class OutputData(BaseOutputData):
     voltage: float
@@ -109,7 +315,6 @@ class TestExperiment(Experiment[InputParameters, OutputData]):
         power_supply.set_target_voltage(15)
         power_supply.set_target_current(4)
         power_supply.set_output_on(True)
-        power_supply.open()
 
     def measure(self) -> OutputData:
         power_supply = self.get_power_supply("virtual-power-supply")
@@ -118,18 +323,20 @@ class TestExperiment(Experiment[InputParameters, OutputData]):
 
     def stop(self) -> None:
         power_supply = self.get_power_supply("virtual-power-supply")
-        power_supply.close()
+        power_supply.set_output_on(False)
 
 
 class ClientTest(TestCase):
     req_patch: unittest.mock._patch
     req_mock: MagicMock
     client: Client
+    server: Server
 
     def setUp(self) -> None:
         auto_discover_drivers()
         config: Config = Config(LABBY_CONFIG_YAML)
         server: Server = Server(config)
+        self.server = server
 
         def _handle(msg: EncodedData) -> None:
             response_bytes = ServerRequest.handle_from_msgpack(server, msg)
@@ -159,7 +366,7 @@ class ClientTest(TestCase):
     def test_list_devices(self) -> None:
         response = self.client.list_devices()
         self.assertEqual(
-            response,
+            _without_times(response),
             ListDevicesResponse(
                 devices=[
                     DeviceStatus(name="virtual-power-supply", is_available=True),
@@ -191,6 +398,18 @@ class ClientTest(TestCase):
             ),
         )
 
+    def test_devices_stay_open_between_requests(self) -> None:
+        power_supply = self.server.config.devices[0]
+        with patch.object(power_supply, "open") as open_mock, patch.object(
+            power_supply, "close"
+        ) as close_mock:
+            self.client.device_info("virtual-power-supply")
+            self.client.list_devices()
+            self.client.device_info("virtual-power-supply")
+            open_mock.assert_called_once()
+            close_mock.assert_not_called()
+            self.assertEqual(self.server.sessions.get_refcount(power_supply), 0)
+
     def test_device_info_for_unavailable_device(self) -> None:
         device_info = self.client.device_info("broken-power-supply")
         self.assertEqual(
@@ -203,6 +422,29 @@ class ClientTest(TestCase):
             ),
         )
 
+    def test_serial_stats(self) -> None:
+        stats = get_serial_port_stats("/dev/ttyFAKE")
+        stats.record_write(b":VOL?;", 0.05)
+        response = self.client.serial_stats()
+        self.assertIn(
+            SerialCommandStats(
+                port="/dev/ttyFAKE",
+                command=":VOL?",
+                queue_wait=LatencySummary(
+                    count=0, mean_ms=0.0, p50_ms=0.0, p99_ms=0.0, max_ms=0.0
+                ),
+                write=LatencySummary(
+                    count=1, mean_ms=50.0, p50_ms=50.0, p99_ms=50.0, max_ms=50.0
+                ),
+                read=LatencySummary(
+                    count=0, mean_ms=0.0, p50_ms=0.0, p99_ms=0.0, max_ms=0.0
+                ),
+                missed_deadlines=0,
+                retries=0,
+            ),
+            response.commands,
+        )
+
     def test_device_info_for_unknown_device(self) -> None:
         device_info = self.client.device_info("foobar")
         self.assertEqual(
@@ -68,6 +68,7 @@ TReturn = TypeVar("TReturn")
 
 def fake_serial_port(func: Callable[..., TReturn]) -> Callable[..., TReturn]:
     serial_port_mock: Mock = Mock()
+    serial_port_mock.in_waiting = 0
 
     def wrapper(*args: object, **kwargs: object) -> TReturn:
         with patch("labby.hw.core.serial.fcntl.flock"), patch(
@@ -119,11 +120,22 @@ def patch_time(
 
         t: Ticker = Ticker()
 
+        class MonotonicClock:
+            # freezegun leaves time.monotonic() alone, so it is kept separately
+            # and only moves when sleeping, just like the frozen wall clock
+            now: float = time.monotonic()
+
+        clock: MonotonicClock = MonotonicClock()
+
+        def _monotonic() -> float:
+            return clock.now
+
         def _sleep(seconds: float) -> None:
             sleep_orig(1e-10)
             frozen_time.tick(timedelta(seconds=seconds))
+            clock.now += seconds
             t.tick()
 
-        with patch("time.sleep", _sleep):
+        with patch("time.sleep", _sleep), patch("time.monotonic", _monotonic):
             t.tick()
             yield
@@ -0,0 +1,31 @@
+# numpy only ships type information from 1.20 on, so this covers the parts
+# of it that labby uses
+from typing import Sequence, Tuple, Type, Union, overload
+
+from numpy import testing as testing
+
+class generic:
+    def __bool__(self) -> bool: ...
+    def __int__(self) -> int: ...
+    def __float__(self) -> float: ...
+
+class ndarray:
+    shape: Tuple[int, ...]
+    def __len__(self) -> int: ...
+    @overload
+    def __getitem__(self, key: int) -> generic: ...
+    @overload
+    def __getitem__(self, key: slice) -> ndarray: ...
+    def __setitem__(self, key: int, value: float) -> None: ...
+    def __mul__(self, other: Union[ndarray, float]) -> ndarray: ...
+    def __truediv__(self, other: Union[ndarray, float]) -> ndarray: ...
+    def copy(self) -> ndarray: ...
+
+def zeros(shape: int, dtype: Type[object] = ...) -> ndarray: ...
+def ones(shape: int, dtype: Type[object] = ...) -> ndarray: ...
+def concatenate(arrays: Sequence[ndarray]) -> ndarray: ...
+def where(
+    condition: ndarray, x: Union[ndarray, float], y: Union[ndarray, float]
+) -> ndarray: ...
+def minimum(x1: ndarray, x2: ndarray) -> ndarray: ...
+def isclose(a: ndarray, b: ndarray) -> ndarray: ...
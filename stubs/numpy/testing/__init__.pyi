@@ -0,0 +1,7 @@
+from typing import Union
+
+from numpy import ndarray
+
+def assert_allclose(
+    actual: Union[ndarray, float], desired: Union[ndarray, float], rtol: float = ...
+) -> None: ...